@@ -0,0 +1,67 @@
+"""Synthetic inputs for the hot-path benchmarks. Deterministic for a given seed."""
+import json
+import random
+from typing import Any, Dict, List
+
+_WORDS = (
+    "design system research metrics onboarding activation flow prototype usability "
+    "stakeholders roadmap hypothesis interview component accessibility handoff "
+    "дизайн исследование метрики сценарий прототип команда продукт решение"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_text(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentences.append(_sentence(rng, length))
+        remaining -= length
+    return " ".join(sentences)
+
+
+def make_history(turns: int, answer_words: int = 120, seed: int = 0) -> List[Dict[str, str]]:
+    """Alternating assistant questions and user answers, `turns` pairs."""
+    rng = random.Random(seed)
+    history: List[Dict[str, str]] = []
+    for turn in range(turns):
+        history.append({"role": "assistant", "content": _sentence(rng, 15).rstrip(".") + "?"})
+        history.append({"role": "user", "content": make_text(answer_words, seed=seed + turn)})
+    return history
+
+
+def make_llm_reply(detail_words: int, wrapped: bool = True, seed: int = 0) -> str:
+    """A grading-style JSON reply, optionally surrounded by prose as models often do."""
+    payload = {
+        "grade": "Senior",
+        "summary": make_text(60, seed=seed),
+        "strengths": [make_text(12, seed=seed + i) for i in range(5)],
+        "weaknesses": [make_text(12, seed=seed + 10 + i) for i in range(5)],
+        "recommendations": [make_text(15, seed=seed + 20 + i) for i in range(6)],
+        "materials": [{"title": make_text(5, seed=seed + 30 + i), "url": f"https://example.com/{i}"} for i in range(5)],
+        "detailed_report": make_text(detail_words, seed=seed + 40),
+    }
+    body = json.dumps(payload, ensure_ascii=False, indent=2)
+    if not wrapped:
+        return body
+    return f"Here is the assessment you asked for:\n```json\n{body}\n```\nLet me know if you need more."
+
+
+def make_report(detail_words: int, seed: int = 0) -> Dict[str, Any]:
+    return json.loads(make_llm_reply(detail_words, wrapped=False, seed=seed))
+
+
+def make_user_state_map(records: int) -> Dict[str, Dict[str, Any]]:
+    return {
+        str(100000 + index): {
+            "paid": index % 7 == 0,
+            "free_used": index % 3 != 0,
+            "updated_at": "2026-01-01T00:00:00.000000",
+        }
+        for index in range(records)
+    }
@@ -0,0 +1,166 @@
+"""
+Micro-benchmarks for the bot's pure-Python hot paths.
+
+    python -m bench.hot_paths                   # run and print
+    python -m bench.hot_paths --save            # run and store bench/baseline.json
+    python -m bench.hot_paths --compare         # fail if slower than baseline
+    python -m bench.hot_paths --json-sizes 10000,100000,1000000 --filter json_map
+
+Timings are the best per-call time over several repeats. Baselines are
+machine-specific: re-save them on the machine that runs --compare.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("TRACE_EXPORTER", "none")
+
+from bench.data import make_history, make_llm_reply, make_report, make_user_state_map  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+_MIN_RUN_SECONDS = 0.2
+_REPEATS = 5
+
+Benchmark = Tuple[str, Callable[[], Any]]
+
+
+def _timed(func: Callable[[], Any]) -> float:
+    """Best seconds per call: calibrates the loop count, then takes the min of repeats."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= _MIN_RUN_SECONDS or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(_MIN_RUN_SECONDS / elapsed) + 1))
+
+    best = elapsed / number
+    for _ in range(_REPEATS - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def _benchmarks(json_sizes: List[int], workdir: str) -> List[Benchmark]:
+    import main
+    from core.dialog_engine import _extract_json, _format_history
+    from utils.db import _load_json_map, _save_json_map
+    from utils.matrices import load_competency_context
+    from utils.pdf_report import _build_pdf, _wrap_text
+
+    benchmarks: List[Benchmark] = []
+
+    for turns in (10, 100):
+        history = make_history(turns)
+        benchmarks.append((f"format_history/{turns}_turns", lambda history=history: _format_history(history)))
+
+    for words in (500, 5000):
+        reply = make_llm_reply(words)
+        benchmarks.append((f"extract_json/wrapped_{words}_words", lambda reply=reply: _extract_json(reply)))
+        bare = make_llm_reply(words, wrapped=False)
+        benchmarks.append((f"extract_json/bare_{words}_words", lambda bare=bare: _extract_json(bare)))
+
+    benchmarks.append(("load_competency_context", load_competency_context))
+
+    long_text = make_report(3000)["detailed_report"]
+    benchmarks.append(("wrap_text/3000_words", lambda: _wrap_text(long_text, "Helvetica", 11, 495)))
+
+    pdf_path = os.path.join(workdir, "reports", "bench.pdf")
+    for words in (500, 3000):
+        report = make_report(words)
+        benchmarks.append((f"build_pdf/{words}_words", lambda report=report: _build_pdf(report, "@bench", pdf_path)))
+
+    summary_report = make_report(500)
+    benchmarks.append(("format_summary", lambda: main._format_summary(summary_report, "ru")))
+
+    for size in json_sizes:
+        path = os.path.join(workdir, f"user_state_{size}.json")
+        data = make_user_state_map(size)
+        _save_json_map(path, data)
+        benchmarks.append((f"json_map/save_{size}", lambda path=path, data=data: _save_json_map(path, data)))
+        benchmarks.append((f"json_map/load_{size}", lambda path=path: _load_json_map(path)))
+
+    return benchmarks
+
+
+def run(json_sizes: List[int], name_filter: Optional[str]) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, func in _benchmarks(json_sizes, workdir):
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = _timed(func)
+            print(f"{name:<40}{results[name] * 1e6:>14.1f} us", flush=True)
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    regressions = []
+    print(f"\n{'benchmark':<40}{'baseline us':>14}{'now us':>12}{'ratio':>8}")
+    for name, seconds in results.items():
+        if name not in baseline:
+            print(f"{name:<40}{'-':>14}{seconds * 1e6:>12.1f}{'new':>8}")
+            continue
+        ratio = seconds / baseline[name]
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<40}{baseline[name] * 1e6:>14.1f}{seconds * 1e6:>12.1f}{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark pure-Python hot paths.")
+    parser.add_argument("--save", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--json-sizes", default="10000,100000", help="record counts for the JSON storage helpers")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    import logging
+
+    logging.disable(logging.INFO)
+    json_sizes = [int(size) for size in args.json_sizes.split(",") if size.strip()]
+    results = run(json_sizes, args.filter)
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save first", file=sys.stderr)
+            sys.exit(2)
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.save:
+        existing: Dict[str, float] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as file:
+                existing = json.load(file).get("results", {})
+        existing.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(
+                {"python": sys.version.split()[0], "results": dict(sorted(existing.items()))},
+                file,
+                indent=2,
+            )
+            file.write("\n")
+        print(f"\nSaved {len(results)} result(s) to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
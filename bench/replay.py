@@ -0,0 +1,520 @@
+"""
+Replays captured webhook updates (see CAPTURE_UPDATES_DIR) against a local app
+process, with Telegram and OpenAI replaced by in-process stand-ins.
+
+    python -m bench.replay data/capture/updates-*.ndjson.gz --speed 10
+    python -m bench.replay capture.ndjson.gz --speed 100 --llm-latency 2.0 --json
+
+Original gaps between updates are divided by --speed (and capped by --max-gap).
+Reports time to first bot reply per update kind, webhook status codes and
+CPU/RSS of the app process tree for the replay and drain phases. Extra app
+settings (SHARD_WORKERS, JOB_QUEUE, ...) are taken from the environment.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+_SAMPLE_INTERVAL = 0.5
+_CHAT_ID_FIELD = re.compile(rb'name="chat_id"\r\n\r\n(-?\d+)')
+
+
+def load_capture(paths: List[str]) -> List[Tuple[float, Dict[str, Any]]]:
+    entries: List[Tuple[float, Dict[str, Any]]] = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(row, dict) and isinstance(row.get("update"), dict):
+                    entries.append((float(row.get("ts", 0.0)), row["update"]))
+    entries.sort(key=lambda item: item[0])
+    return entries
+
+
+def schedule(entries: List[Tuple[float, Dict[str, Any]]], speed: float, max_gap: float) -> List[float]:
+    """Offsets in seconds from the replay start for each entry."""
+    offsets: List[float] = []
+    offset = 0.0
+    previous: Optional[float] = None
+    for ts, _ in entries:
+        if previous is not None:
+            offset += min(max(0.0, ts - previous), max_gap) / speed
+        offsets.append(offset)
+        previous = ts
+    return offsets
+
+
+def update_kind(update: Dict[str, Any]) -> str:
+    text = str((update.get("message") or {}).get("text") or "").strip()
+    if text.startswith("/"):
+        return text.split()[0].lower()
+    return "answer" if text else "other"
+
+
+def _percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class _Replies:
+    """Matches bot replies to the oldest unanswered update of the same chat."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.pending: Dict[int, Deque[Tuple[str, float]]] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.messages = 0
+        self.documents = 0
+        self.last_reply = time.monotonic()
+
+    def expect(self, chat_id: int, kind: str) -> None:
+        with self.lock:
+            self.pending.setdefault(chat_id, deque()).append((kind, time.monotonic()))
+
+    def reply(self, chat_id: Optional[int], document: bool) -> None:
+        now = time.monotonic()
+        with self.lock:
+            self.last_reply = now
+            if document:
+                self.documents += 1
+            else:
+                self.messages += 1
+            waiting = self.pending.get(chat_id) if chat_id is not None else None
+            if waiting:
+                kind, sent_at = waiting.popleft()
+                self.latencies.setdefault(kind, []).append(now - sent_at)
+
+    def unanswered(self) -> int:
+        with self.lock:
+            return sum(len(items) for items in self.pending.values())
+
+
+def _telegram_handler(replies: _Replies) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            method = self.path.rsplit("/", 1)[-1]
+            chat_id: Optional[int] = None
+            if method == "sendMessage":
+                try:
+                    chat_id = int(json.loads(body).get("chat_id"))
+                except (ValueError, TypeError, AttributeError):
+                    pass
+                replies.reply(chat_id, document=False)
+            elif method == "sendDocument":
+                match = _CHAT_ID_FIELD.search(body)
+                replies.reply(int(match.group(1)) if match else None, document=True)
+            payload = b'{"ok":true,"result":true}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def _llm_text(prompt: str, answers_to_finish: int) -> str:
+    if "You are a lead product designer" in prompt:
+        return json.dumps(
+            {
+                "grade": "Middle",
+                "summary": "Replay summary.",
+                "strengths": ["research"],
+                "weaknesses": ["metrics"],
+                "recommendations": ["practice"],
+                "materials": [],
+                "detailed_report": "Replay detailed report. " * 40,
+            }
+        )
+    if "feedback question" in prompt:
+        return "What could we improve?"
+    answers = prompt.count("\nUser: ")
+    done = answers >= answers_to_finish
+    return json.dumps(
+        {
+            "done": done,
+            "next_question": "" if done else f"Replay question {answers + 1}?",
+            "assessment": {
+                "provisional_grade": "Middle",
+                "competencies": [{"id": "research_insights", "level": "middle", "evidence": "replay"}],
+            },
+        }
+    )
+
+
+def _cached_tokens(prompt: str, seen: Deque[str]) -> int:
+    # Mimics the provider: prefixes of 1024+ tokens are cached in 128-token steps.
+    shared = max((len(os.path.commonprefix([prompt, other])) for other in seen), default=0) // 4
+    return shared - shared % 128 if shared >= 1024 else 0
+
+
+def _openai_handler(latency: float, answers_to_finish: int) -> type:
+    seen: Deque[str] = deque(maxlen=32)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            prompt = body.get("input") if isinstance(body.get("input"), str) else json.dumps(body.get("input"))
+            if latency:
+                time.sleep(random.uniform(0.5, 1.5) * latency)
+            text = _llm_text(prompt, answers_to_finish)
+            with lock:
+                cached = _cached_tokens(prompt, seen)
+                seen.append(prompt)
+            payload = json.dumps(
+                {
+                    "id": "resp_replay",
+                    "object": "response",
+                    "created_at": int(time.time()),
+                    "model": body.get("model", "replay"),
+                    "status": "completed",
+                    "output": [
+                        {
+                            "type": "message",
+                            "id": "msg_replay",
+                            "status": "completed",
+                            "role": "assistant",
+                            "content": [{"type": "output_text", "text": text, "annotations": []}],
+                        }
+                    ],
+                    "usage": {
+                        "input_tokens": len(prompt) // 4,
+                        "input_tokens_details": {"cached_tokens": cached},
+                        "output_tokens": len(text) // 4,
+                        "total_tokens": 0,
+                    },
+                }
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def _serve(handler: type) -> Tuple[ThreadingHTTPServer, int]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _proc_stat(pid: int) -> Optional[Tuple[int, float, int]]:
+    """(parent pid, cpu seconds, rss bytes) from /proc, or None if gone."""
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="ascii") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm", "r", encoding="ascii") as file:
+            rss_pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return int(fields[1]), (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _tree_usage(root: int) -> Tuple[float, int]:
+    """CPU seconds and RSS summed over `root` and its descendants (shard workers)."""
+    stats: Dict[int, Tuple[int, float, int]] = {}
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            stat = _proc_stat(int(name))
+            if stat is not None:
+                stats[int(name)] = stat
+    tree = {root}
+    changed = True
+    while changed:
+        changed = False
+        for pid, (parent, _, _) in stats.items():
+            if parent in tree and pid not in tree:
+                tree.add(pid)
+                changed = True
+    return sum(stats[pid][1] for pid in tree if pid in stats), sum(stats[pid][2] for pid in tree if pid in stats)
+
+
+class _Sampler:
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.phase = "startup"
+        self.samples: List[Tuple[str, float, float, int]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            cpu, rss = _tree_usage(self.pid)
+            self.samples.append((self.phase, time.monotonic(), cpu, rss))
+            self._stop.wait(_SAMPLE_INTERVAL)
+
+    def mark(self, phase: str) -> None:
+        """Switches phase, sampling at the boundary so both phases cover it."""
+        now = time.monotonic()
+        cpu, rss = _tree_usage(self.pid)
+        self.samples.append((self.phase, now, cpu, rss))
+        self.phase = phase
+        self.samples.append((phase, now, cpu, rss))
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        cpu, rss = _tree_usage(self.pid)
+        self.samples.append((self.phase, time.monotonic(), cpu, rss))
+
+    def phases(self) -> Dict[str, Dict[str, float]]:
+        result: Dict[str, Dict[str, float]] = {}
+        for phase in ("replay", "drain"):
+            rows = [sample for sample in self.samples if sample[0] == phase]
+            if len(rows) < 2:
+                continue
+            wall = rows[-1][1] - rows[0][1]
+            cpu = rows[-1][2] - rows[0][2]
+            result[phase] = {
+                "seconds": round(wall, 2),
+                "cpu_seconds": round(cpu, 2),
+                "cpu_cores_avg": round(cpu / wall, 3) if wall > 0 else 0.0,
+                "rss_peak_mb": round(max(row[3] for row in rows) / (1024 * 1024), 1),
+            }
+        return result
+
+
+async def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError("app process exited during startup")
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("app did not become healthy")
+
+
+async def _feed(
+    base_url: str, entries: List[Tuple[float, Dict[str, Any]]], offsets: List[float], replies: _Replies
+) -> Dict[str, Any]:
+    statuses: Dict[int, int] = {}
+    ack_ms: List[float] = []
+    lag: List[float] = []
+    inline = 0
+
+    async with httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=200)) as client:
+
+        async def post(update: Dict[str, Any]) -> None:
+            nonlocal inline
+            chat_id = (update.get("message") or {}).get("chat", {}).get("id")
+            if chat_id is not None:
+                replies.expect(chat_id, update_kind(update))
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/webhook", json=update)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            ack_ms.append((time.perf_counter() - started) * 1000)
+            if status == 200:
+                # Cheap replies come back in the webhook response instead of a Bot API call.
+                try:
+                    reply = response.json()
+                except ValueError:
+                    reply = None
+                if isinstance(reply, dict) and reply.get("method") == "sendMessage":
+                    inline += 1
+                    replies.reply(reply.get("chat_id", chat_id), document=False)
+            statuses[status] = statuses.get(status, 0) + 1
+
+        tasks = []
+        started = time.monotonic()
+        for (_, update), offset in zip(entries, offsets):
+            delay = started + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag.append(max(0.0, -delay))
+            tasks.append(asyncio.create_task(post(update)))
+        await asyncio.gather(*tasks)
+
+    return {
+        "statuses": statuses,
+        "inline_replies": inline,
+        "ack_p50_ms": round(_percentile(ack_ms, 0.5), 2),
+        "ack_p99_ms": round(_percentile(ack_ms, 0.99), 2),
+        "schedule_lag_max_ms": round(max(lag, default=0.0) * 1000, 2),
+    }
+
+
+async def _drain(replies: _Replies, quiet: float, limit: float) -> None:
+    deadline = time.monotonic() + limit
+    while time.monotonic() < deadline:
+        if replies.unanswered() == 0 or time.monotonic() - replies.last_reply > quiet:
+            return
+        await asyncio.sleep(0.2)
+
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    entries = load_capture(args.paths)
+    if args.limit:
+        entries = entries[: args.limit]
+    if not entries:
+        raise SystemExit("capture is empty")
+    offsets = schedule(entries, args.speed, args.max_gap)
+
+    replies = _Replies()
+    telegram, telegram_port = _serve(_telegram_handler(replies))
+    openai_stub, openai_port = _serve(_openai_handler(args.llm_latency, args.answers))
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    env = dict(os.environ)
+    env.pop("DATABASE_URL", None)
+    if os.getenv("REPLAY_DATABASE_URL"):
+        env["DATABASE_URL"] = os.environ["REPLAY_DATABASE_URL"]
+    data_dir = tempfile.mkdtemp(prefix="replay-")
+    env.update(
+        TELEGRAM_BOT_TOKEN="replay",
+        TELEGRAM_WEBHOOK_SECRET="",
+        TELEGRAM_API_BASE=f"http://127.0.0.1:{telegram_port}",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{openai_port}/v1",
+        OPENAI_API_KEY="replay",
+        ADMIN_TOKEN="replay",
+        DATA_DIR=data_dir,
+        AUTO_SET_WEBHOOK="false",
+        CAPTURE_UPDATES_DIR="",
+        TENANTS_FILE="",
+    )
+    log = open(os.path.join(data_dir, "app.log"), "w", encoding="utf-8")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    sampler = _Sampler(process.pid)
+    try:
+        await _wait_ready(base_url, process)
+        sampler.mark("replay")
+        sampler.start()
+        fed = await _feed(base_url, entries, offsets, replies)
+        sampler.mark("drain")
+        await _drain(replies, args.drain, args.drain_limit)
+        sampler.stop()
+        async with httpx.AsyncClient() as client:
+            app_metrics = (await client.get(f"{base_url}/metrics", headers={"X-Admin-Token": "replay"})).json()
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        telegram.shutdown()
+        openai_stub.shutdown()
+
+    kinds = {}
+    for kind, values in sorted(replies.latencies.items()):
+        kinds[kind] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 0.5) * 1000, 1),
+            "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(max(values) * 1000, 1),
+        }
+    return {
+        "updates": len(entries),
+        "speed": args.speed,
+        "replay_seconds": round(offsets[-1], 2),
+        "webhook": fed,
+        "first_reply": kinds,
+        "unanswered": replies.unanswered(),
+        "bot_messages": replies.messages,
+        "bot_documents": replies.documents,
+        "resources": sampler.phases(),
+        "app_metrics": app_metrics,
+        "app_log": os.path.join(data_dir, "app.log"),
+    }
+
+
+def _print(result: Dict[str, Any]) -> None:
+    print(
+        f"updates={result['updates']} speed=x{result['speed']:g} replay={result['replay_seconds']}s "
+        f"statuses={result['webhook']['statuses']} unanswered={result['unanswered']}"
+    )
+    print(
+        f"webhook ack p50={result['webhook']['ack_p50_ms']}ms p99={result['webhook']['ack_p99_ms']}ms "
+        f"schedule lag max={result['webhook']['schedule_lag_max_ms']}ms"
+    )
+    print(f"\n{'kind':<12}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, row in result["first_reply"].items():
+        print(f"{kind:<12}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    print(f"\n{'phase':<10}{'seconds':>9}{'cpu s':>8}{'cores':>8}{'rss MB':>9}")
+    for phase, row in result["resources"].items():
+        print(f"{phase:<10}{row['seconds']:>9}{row['cpu_seconds']:>8}{row['cpu_cores_avg']:>8}{row['rss_peak_mb']:>9}")
+    print(f"\napp log: {result['app_log']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured webhook updates against a local app.")
+    parser.add_argument("paths", nargs="+", help="capture files (.ndjson or .ndjson.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression factor, 1-100")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="cap for one original gap, seconds")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N updates")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="mean stand-in LLM latency, seconds")
+    parser.add_argument("--answers", type=int, default=4, help="answers after which the stand-in ends an interview")
+    parser.add_argument("--drain", type=float, default=5.0, help="stop after this many quiet seconds")
+    parser.add_argument("--drain-limit", type=float, default=120.0, help="longest drain phase, seconds")
+    parser.add_argument("--json", action="store_true", help="print the full result as JSON")
+    args = parser.parse_args()
+    if not 1.0 <= args.speed <= 100.0:
+        parser.error("--speed must be between 1 and 100")
+
+    result = asyncio.run(replay(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        _print(result)
+
+
+if __name__ == "__main__":
+    main()
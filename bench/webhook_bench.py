@@ -0,0 +1,152 @@
+"""
+Measures /webhook ingestion overhead in-process, without sockets, for the
+FastAPI route and the raw ASGI fast path:
+
+    python -m bench.webhook_bench --requests 20000
+
+Each mode runs in a fresh interpreter because FAST_WEBHOOK is read at import.
+Dispatch is replaced by a counter, so only ingestion is measured.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+SECRET = "bench-secret"
+
+
+def _sample_update(update_id: int) -> bytes:
+    return json.dumps(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "from": {"id": 1000 + update_id % 500, "is_bot": False, "first_name": "Bench", "username": "bench"},
+                "chat": {"id": 1000 + update_id % 500, "type": "private"},
+                "date": 1700000000,
+                "text": "I led the redesign of our onboarding flow and measured activation. " * 4,
+            },
+        }
+    ).encode("utf-8")
+
+
+class _CountingPool:
+    def __init__(self) -> None:
+        self.dispatched = 0
+
+    def dispatch(self, user_id: Any, update: Dict[str, Any]) -> bool:
+        self.dispatched += 1
+        return True
+
+
+async def _call(app: Any, body: bytes) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/webhook",
+        "raw_path": b"/webhook",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"x-telegram-bot-api-secret-token", SECRET.encode("ascii")),
+        ],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+    sent = False
+    status = 0
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _measure(requests: int) -> Dict[str, Any]:
+    import main
+
+    pool = _CountingPool()
+    main.SHARD_POOL = pool
+    bodies: List[bytes] = [_sample_update(index) for index in range(256)]
+
+    for index in range(min(500, requests)):
+        await _call(main.app, bodies[index % len(bodies)])
+
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    for index in range(requests):
+        status = await _call(main.app, bodies[index % len(bodies)])
+        if status != 200:
+            raise RuntimeError(f"unexpected status {status}")
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    return {
+        "fast_path": main.FAST_WEBHOOK,
+        "requests": requests,
+        "requests_per_sec": round(requests / wall, 1),
+        "cpu_us_per_request": round(cpu / requests * 1e6, 1),
+    }
+
+
+def _run_mode(fast: bool, requests: int) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.update(
+        FAST_WEBHOOK="true" if fast else "false",
+        TELEGRAM_WEBHOOK_SECRET=SECRET,
+        OPENAI_API_KEY=env.get("OPENAI_API_KEY", "bench"),
+        TRACE_EXPORTER="none",
+    )
+    output = subprocess.run(
+        [sys.executable, "-m", "bench.webhook_bench", "--child", "--requests", str(requests)],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark webhook ingestion.")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import logging
+
+        logging.disable(logging.INFO)
+        print(json.dumps(asyncio.run(_measure(args.requests))))
+        return
+
+    before = _run_mode(False, args.requests)
+    after = _run_mode(True, args.requests)
+    print(f"{'mode':<12}{'req/s':>12}{'cpu us/req':>14}")
+    for label, result in (("fastapi", before), ("fast path", after)):
+        print(f"{label:<12}{result['requests_per_sec']:>12}{result['cpu_us_per_request']:>14}")
+    print(f"speedup x{after['requests_per_sec'] / before['requests_per_sec']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,29 @@
-import asyncio
 import json
 import logging
 import os
 import re
 from typing import Any, Dict, List, Optional
 
-from openai import OpenAI
+from logic.assessment import ASSESSMENT_PROMPT, format_assessment, merge_assessment
+from logic.prompts import build_prompt
+from utils.env import env_int
+from utils.llm import CircuitOpenError, complete
+from utils.tracing import traced
 
 logger = logging.getLogger("designer_grade_bot.dialog")
 
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
-try:
-    MIN_USER_ANSWERS = max(1, int(os.getenv("MIN_USER_ANSWERS", "4")))
-except ValueError:
-    MIN_USER_ANSWERS = 4
+MIN_USER_ANSWERS = env_int("MIN_USER_ANSWERS", 4, 1)
 
-SYSTEM_PROMPT = (
+TASK_PROMPT = (
     "You are a senior product design consultant. "
     "Your goal is to gather enough information to assess a designer's grade. "
     "Ask one open question at a time and adapt to answers. "
     "If you have enough information, return JSON: {{\"done\": true, \"next_question\": \"\"}}. "
     "Otherwise return JSON: {{\"done\": false, \"next_question\": \"...\"}}. "
-    "Do not finish the interview before at least {min_user_answers} substantive user answers. "
-    "Language: {language}."
+    "Do not finish the interview before at least {min_user_answers} substantive user answers."
 )
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 
 def _format_history(history: List[Dict[str, str]]) -> str:
     lines = []
@@ -81,29 +78,41 @@ def _fallback_question(user_answer_count: int, language: str) -> str:
     return questions[index]
 
 
+@traced("llm.dialog")
 async def generate_next_question(
-    history: List[Dict[str, str]], matrix_context: str, language: str = "ru"
+    history: List[Dict[str, str]],
+    matrix_context: str,
+    language: str = "ru",
+    assessment: Optional[Dict[str, Any]] = None,
 ) -> Optional[str]:
-    prompt = SYSTEM_PROMPT.format(
-        language=language, min_user_answers=MIN_USER_ANSWERS
-    )
+    """
+    Returns the next question, "" when the interview is complete, or None on
+    failure. When `assessment` is given, the model's per-turn assessment
+    update is merged into it in place.
+    """
+    task = TASK_PROMPT.format(min_user_answers=MIN_USER_ANSWERS)
     transcript = _format_history(history)
     user_answer_count = _user_answer_count(history)
-    if matrix_context:
-        prompt = f"{prompt}\n\nCompetency matrices:\n{matrix_context}"
-    if transcript:
-        prompt = f"{prompt}\n\nConversation:\n{transcript}"
-
-    def _call_openai() -> str:
-        response = client.responses.create(
-            model=OPENAI_MODEL,
-            input=prompt,
-            temperature=0.6,
-        )
-        return response.output_text
+    running = ""
+    if assessment is not None:
+        task = f"{task} {ASSESSMENT_PROMPT}"
+        if user_answer_count:
+            running = format_assessment(assessment) or "(empty)"
+    prompt = build_prompt(
+        task,
+        language,
+        matrix_context,
+        [("Running assessment so far", running), ("Conversation", transcript)],
+    )
 
     try:
-        text = await asyncio.to_thread(_call_openai)
+        text = await complete("dialog", OPENAI_MODEL, prompt, temperature=0.6)
+    except CircuitOpenError:
+        if user_answer_count >= MIN_USER_ANSWERS:
+            # Enough answers: move on to grading, which handles the outage itself.
+            return ""
+        logger.warning("OpenAI is unavailable; serving a local question")
+        return _fallback_question(user_answer_count, language)
     except Exception:
         logger.exception("OpenAI dialog generation failed")
         return None
@@ -112,6 +121,8 @@ async def generate_next_question(
         return ""
 
     data = _extract_json(text)
+    if data is not None and assessment is not None and user_answer_count:
+        merge_assessment(assessment, data.get("assessment"))
     if data is not None:
         next_question = str(data.get("next_question") or "").strip()
         done = bool(data.get("done"))
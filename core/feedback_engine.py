@@ -1,21 +1,20 @@
-import asyncio
 import logging
 import os
 from typing import Dict, List, Optional
 
-from openai import OpenAI
+from logic.prompts import build_prompt
+from utils.llm import CircuitOpenError, complete
+from utils.tracing import traced
 
 logger = logging.getLogger("designer_grade_bot.feedback_prompt")
 
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
 
-SYSTEM_PROMPT = (
+TASK_PROMPT = (
     "Generate a single short feedback question for the user about the experience. "
-    "It should be specific and helpful. Output only the question. Language: {language}."
+    "It should be specific and helpful. Output only the question."
 )
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 
 def _format_history(history: List[Dict[str, str]]) -> str:
     lines = []
@@ -29,24 +28,17 @@ def _format_history(history: List[Dict[str, str]]) -> str:
     return "\n".join(lines)
 
 
+@traced("llm.feedback")
 async def generate_feedback_question(
     history: List[Dict[str, str]], language: str = "ru"
 ) -> Optional[str]:
-    prompt = SYSTEM_PROMPT.format(language=language)
-    transcript = _format_history(history)
-    if transcript:
-        prompt = f"{prompt}\n\nConversation:\n{transcript}"
-
-    def _call_openai() -> str:
-        response = client.responses.create(
-            model=OPENAI_MODEL,
-            input=prompt,
-            temperature=0.5,
-        )
-        return response.output_text
+    prompt = build_prompt(TASK_PROMPT, language, sections=[("Conversation", _format_history(history))])
 
     try:
-        text = await asyncio.to_thread(_call_openai)
+        text = await complete("feedback", OPENAI_MODEL, prompt, temperature=0.5)
+    except CircuitOpenError:
+        logger.warning("OpenAI is unavailable; feedback skipped")
+        return None
     except Exception:
         logger.exception("OpenAI feedback prompt failed")
         return None
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from core.dialog_engine import generate_next_question
+from core.feedback_engine import generate_feedback_question
+from logic.prompts import static_matrix
+from utils.env import env_float, env_int
+from utils.llm import llm_available
+from utils.llm_scheduler import llm_priority
+
+logger = logging.getLogger("designer_grade_bot.prefetch")
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+OPENING_POOL_SIZE = env_int("OPENING_POOL_SIZE", 3, 1)
+# How long /feedback waits for a prefetch that is still queued or running
+# before making its own call at the higher "feedback" priority.
+FEEDBACK_PREFETCH_WAIT = env_float("FEEDBACK_PREFETCH_WAIT", 1.0)
+
+# (language, matrix version) -> ready opening questions. Each question is
+# handed out once and the pool is topped up in the background.
+_OPENING: Dict[Tuple[str, str], Deque[str]] = {}
+_REFILLS: Dict[Tuple[str, str], asyncio.Task] = {}
+PREFETCH_STATS: Dict[str, int] = {
+    "opening_hits": 0,
+    "opening_misses": 0,
+    "feedback_hits": 0,
+    "feedback_misses": 0,
+    "feedback_abandoned": 0,
+}
+
+
+def matrix_version(matrix_context: str) -> str:
+    # The static matrix differs between tenants even when nothing is retrieved.
+    material = f"{static_matrix()}\0{matrix_context}"
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()[:12]
+
+
+async def _refill_opening(key: Tuple[str, str], language: str, matrix_context: str) -> None:
+    pool = _OPENING.setdefault(key, deque())
+    while len(pool) < OPENING_POOL_SIZE and llm_available():
+        with llm_priority("prefetch"):
+            question = await generate_next_question([], matrix_context, language)
+        # While the breaker is open the engine answers with a local question;
+        # those are not worth caching.
+        if not question or not llm_available():
+            break
+        pool.append(question)
+
+
+def schedule_opening_refill(language: str, matrix_context: str) -> None:
+    if not PREFETCH_ENABLED:
+        return
+    key = (language, matrix_version(matrix_context))
+    task = _REFILLS.get(key)
+    if task is not None and not task.done():
+        return
+    _REFILLS[key] = asyncio.create_task(_refill_opening(key, language, matrix_context))
+
+
+def warm_opening_questions(languages: List[str], matrix_context: str) -> None:
+    for language in languages:
+        schedule_opening_refill(language, matrix_context)
+
+
+def take_opening_question(language: str, matrix_context: str) -> Optional[str]:
+    """
+    Returns a pre-generated opening question for an empty interview, or None
+    on a miss. Either way the pool is refilled in the background.
+    """
+    if not PREFETCH_ENABLED:
+        return None
+    pool = _OPENING.get((language, matrix_version(matrix_context)))
+    question = pool.popleft() if pool else None
+    PREFETCH_STATS["opening_hits" if question else "opening_misses"] += 1
+    schedule_opening_refill(language, matrix_context)
+    return question
+
+
+async def _generate_feedback(history: List[Dict[str, str]], language: str) -> Optional[str]:
+    with llm_priority("prefetch"):
+        return await generate_feedback_question(history, language)
+
+
+def prefetch_feedback_question(session: Dict[str, Any]) -> None:
+    """Starts generating the user's feedback question right after grading."""
+    if not PREFETCH_ENABLED:
+        return
+    history = list(session.get("history") or [])
+    session["feedback_prefetch"] = asyncio.create_task(_generate_feedback(history, session.get("language", "ru")))
+
+
+async def take_feedback_question(session: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns the prefetched feedback question. A generation that is still
+    running gets FEEDBACK_PREFETCH_WAIT seconds; after that it is cancelled
+    and None tells the caller to make a live call, since the prefetch waits
+    in the lowest scheduler class.
+    """
+    task = session.pop("feedback_prefetch", None)
+    question = None
+    if task is not None and not task.done():
+        await asyncio.wait({task}, timeout=FEEDBACK_PREFETCH_WAIT)
+        if not task.done():
+            task.cancel()
+            PREFETCH_STATS["feedback_abandoned"] += 1
+            task = None
+    if task is not None:
+        try:
+            question = None if task.cancelled() else task.result()
+        except Exception:
+            logger.exception("Prefetched feedback question failed")
+    PREFETCH_STATS["feedback_hits" if question else "feedback_misses"] += 1
+    return question
+
+
+def prefetch_metrics() -> Dict[str, Any]:
+    return {
+        "stats": dict(PREFETCH_STATS),
+        "opening_pool": {f"{language}:{version}": len(pool) for (language, version), pool in _OPENING.items()},
+    }
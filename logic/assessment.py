@@ -0,0 +1,76 @@
+import os
+from typing import Any, Dict, List
+
+INCREMENTAL_ASSESSMENT = os.getenv("INCREMENTAL_ASSESSMENT", "true").lower() == "true"
+
+MAX_EVIDENCE_PER_COMPETENCY = 4
+MAX_EVIDENCE_CHARS = 240
+
+ASSESSMENT_PROMPT = (
+    "Also maintain a running assessment. Add an \"assessment\" field to the JSON that reflects "
+    "only what the latest user answer revealed: "
+    "{\"provisional_grade\": \"...\", \"competencies\": [{\"id\": \"...\", \"level\": \"...\", \"evidence\": \"...\"}]}. "
+    "Use competency and level ids from the matrices, keep evidence to one short factual sentence, "
+    "and return an empty competencies list if the answer added nothing."
+)
+
+
+def new_assessment() -> Dict[str, Any]:
+    return {"provisional_grade": "", "competencies": {}, "turns": 0}
+
+
+def _updates(raw: Any) -> List[Dict[str, Any]]:
+    if isinstance(raw, list):
+        return [item for item in raw if isinstance(item, dict)]
+    if isinstance(raw, dict):
+        # {"research_insights": {"level": ..., "evidence": ...}}
+        return [dict(value, id=key) for key, value in raw.items() if isinstance(value, dict)]
+    return []
+
+
+def merge_assessment(state: Dict[str, Any], update: Any) -> Dict[str, Any]:
+    """
+    Folds one turn's assessment update from the dialog model into `state` in
+    place. Evidence is capped per competency so the state stays small no
+    matter how long the interview runs.
+    """
+    state["turns"] = int(state.get("turns", 0)) + 1
+    if not isinstance(update, dict):
+        return state
+
+    grade = str(update.get("provisional_grade") or "").strip()
+    if grade:
+        state["provisional_grade"] = grade
+
+    competencies = state.setdefault("competencies", {})
+    for item in _updates(update.get("competencies")):
+        competency_id = str(item.get("id") or "").strip()
+        if not competency_id:
+            continue
+        entry = competencies.setdefault(competency_id, {"level": "", "evidence": []})
+        level = str(item.get("level") or "").strip()
+        if level:
+            entry["level"] = level
+        evidence = item.get("evidence")
+        for text in evidence if isinstance(evidence, list) else [evidence]:
+            text = str(text or "").strip()[:MAX_EVIDENCE_CHARS]
+            if text and text not in entry["evidence"]:
+                entry["evidence"].append(text)
+        del entry["evidence"][:-MAX_EVIDENCE_PER_COMPETENCY]
+    return state
+
+
+def has_evidence(state: Dict[str, Any]) -> bool:
+    return any(entry.get("evidence") for entry in (state.get("competencies") or {}).values())
+
+
+def format_assessment(state: Dict[str, Any]) -> str:
+    lines: List[str] = []
+    if state.get("provisional_grade"):
+        lines.append(f"Provisional grade: {state['provisional_grade']}")
+    for competency_id in sorted(state.get("competencies") or {}):
+        entry = state["competencies"][competency_id]
+        lines.append(f"- {competency_id}: {entry.get('level') or 'unknown'}")
+        for text in entry.get("evidence") or []:
+            lines.append(f"  * {text}")
+    return "\n".join(lines)
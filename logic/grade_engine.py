@@ -1,32 +1,33 @@
-import asyncio
 import json
 import logging
 import os
 import re
 from typing import Any, Dict, List, Optional
 
-from openai import OpenAI
+from logic.assessment import format_assessment
+from logic.prompts import GRADE_OPTIONS, build_prompt
+from utils.llm import CircuitOpenError, complete
+from utils.tracing import traced
 
 logger = logging.getLogger("designer_grade_bot.grade")
 
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
 
-GRADE_OPTIONS = (
-    "Junior, Middle, Senior, Lead, Head/Art Director, Design Director"
-)
-
-SYSTEM_PROMPT = (
+TASK_PROMPT = (
     "You are a lead product designer. Using the interview history and competency matrices, "
     "assess the designer and return JSON with: "
     "grade, summary, strengths (list), weaknesses (list), recommendations (list), "
-    "materials (list of {{title, url}}), detailed_report. "
+    "materials (list of {title, url}), detailed_report. "
     "The detailed_report must be significantly longer and more specific than summary. "
     "Choose grade only from: "
-    f"{GRADE_OPTIONS}. "
-    "Language: {language}."
+    f"{GRADE_OPTIONS}."
 )
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+ASSESSMENT_GRADE_PROMPT = (
+    "The interview is finished. Instead of the transcript you get the running assessment "
+    "collected during it: per-competency levels with supporting evidence and a provisional grade. "
+    "Base the report on this evidence."
+)
 
 
 def _format_history(history: List[Dict[str, str]]) -> str:
@@ -73,23 +74,33 @@ def _normalize_report(data: Dict[str, Any]) -> Dict[str, Any]:
 async def grade_user_from_history(
     history: List[Dict[str, str]], matrix_context: str, language: str = "ru"
 ) -> Optional[Dict[str, Any]]:
-    prompt = SYSTEM_PROMPT.format(language=language)
-    transcript = _format_history(history)
-    if matrix_context:
-        prompt = f"{prompt}\n\nCompetency matrices:\n{matrix_context}"
-    if transcript:
-        prompt = f"{prompt}\n\nConversation:\n{transcript}"
-
-    def _call_openai() -> str:
-        response = client.responses.create(
-            model=OPENAI_MODEL,
-            input=prompt,
-            temperature=0.4,
-        )
-        return response.output_text
+    prompt = build_prompt(TASK_PROMPT, language, matrix_context, [("Conversation", _format_history(history))])
+    return await _grade(prompt)
 
+
+async def grade_user_from_assessment(
+    assessment: Dict[str, Any], matrix_context: str, language: str = "ru"
+) -> Optional[Dict[str, Any]]:
+    """
+    Turns the running assessment built during the interview into a report.
+    The prompt carries the compact evidence instead of the full transcript.
+    """
+    prompt = build_prompt(
+        f"{TASK_PROMPT} {ASSESSMENT_GRADE_PROMPT}",
+        language,
+        matrix_context,
+        [("Running assessment", format_assessment(assessment))],
+    )
+    return await _grade(prompt)
+
+
+@traced("llm.grade")
+async def _grade(prompt: str) -> Optional[Dict[str, Any]]:
     try:
-        text = await asyncio.to_thread(_call_openai)
+        text = await complete("grade", OPENAI_MODEL, prompt, temperature=0.4)
+    except CircuitOpenError:
+        logger.warning("OpenAI is unavailable; grade skipped")
+        return None
     except Exception:
         logger.exception("OpenAI grading failed")
         return None
@@ -0,0 +1,54 @@
+from typing import Sequence, Tuple
+
+from utils.tenants import current_tenant
+
+GRADE_OPTIONS = (
+    "Junior, Middle, Senior, Lead, Head/Art Director, Design Director"
+)
+
+# The same bytes open every prompt of every engine, language and user, followed
+# by the tenant's static matrix. The provider caches prompt prefixes from 1024
+# tokens on, so nothing that varies per call may come before the task.
+SHARED_PREFIX = (
+    "You are part of a Telegram bot that interviews product designers and assesses their grade "
+    "against competency matrices. "
+    f"Grades from lowest to highest: {GRADE_OPTIONS}. "
+    "Judge only by what the designer actually said and never invent experience they did not describe. "
+    "Use competency and level ids exactly as the matrices name them. "
+    "When the task asks for JSON, return a single JSON object and nothing else. "
+    "Write all text meant for the user in the language given at the end of the task."
+)
+
+
+def static_matrix() -> str:
+    """
+    The current tenant's query-independent matrix: the pinned overview and
+    competency summary of its index, or the whole truncated matrix without one.
+    """
+    tenant = current_tenant()
+    if tenant.index is None:
+        return tenant.context
+    return tenant.index.static_context()
+
+
+def build_prompt(
+    task: str,
+    language: str,
+    matrix_context: str = "",
+    sections: Sequence[Tuple[str, str]] = (),
+) -> str:
+    """
+    Lays a prompt out from the most to the least stable part: the shared
+    prefix and static matrix, the engine's task and language, the matrix
+    sections retrieved for this call, then the per-call sections as
+    (title, body); empty ones are skipped.
+    """
+    parts = [SHARED_PREFIX]
+    matrix = static_matrix()
+    if matrix:
+        parts.append(f"Competency matrices:\n{matrix}")
+    parts.append(f"Task:\n{task}\nLanguage: {language}.")
+    for title, body in [("Relevant matrix details", matrix_context), *sections]:
+        if body:
+            parts.append(f"{title}:\n{body}")
+    return "\n\n".join(parts)
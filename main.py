@@ -1,25 +1,98 @@
 import asyncio
+import hmac
 import logging
 import os
+import threading
+import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
 from core.dialog_engine import generate_next_question
 from core.feedback_engine import generate_feedback_question
-from logic.grade_engine import grade_user_from_history
+from core.prefetch import (
+    prefetch_feedback_question,
+    prefetch_metrics,
+    take_feedback_question,
+    take_opening_question,
+    warm_opening_questions,
+)
+from logic.assessment import INCREMENTAL_ASSESSMENT, has_evidence, new_assessment
+from logic.grade_engine import grade_user_from_assessment, grade_user_from_history
+from utils.analytics import (
+    analytics_metrics,
+    analytics_report,
+    close_analytics,
+    start_analytics,
+    track,
+    track_grade,
+)
+from utils.capture import capture_metrics, capture_update, close_capture
+from utils.coalesce import COALESCER
 from utils.db import (
+    close_db,
     init_db,
     ensure_schema,
+    get_last_report,
+    get_pool_metrics,
     get_user_state,
+    record_event,
     save_feedback,
+    save_last_report,
     upsert_user_state,
 )
-from utils.matrices import load_competency_context
+from utils.fast_webhook import FastWebhookMiddleware
+from utils.jobs import (
+    JOB_WORKERS,
+    JobWorkers,
+    cancel_job,
+    enqueue_job,
+    init_jobs,
+    job_metrics,
+    job_status,
+    jobs_enabled,
+    register_job,
+)
+from utils.executors import executor_metrics, shutdown_executors
+from utils.export import EXPORT_FIELDS, EXPORT_FORMATS, export_busy, parse_date, stream_export
+from utils.llm import llm_available, llm_metrics
+from utils.llm_cache import LLM_CACHE
+from utils.llm_scheduler import LLM_SCHEDULER, llm_priority
+from utils.memdebug import (
+    recent_samples,
+    rss_bytes,
+    session_report,
+    start_memory_sampler,
+    stop_tracing,
+    take_snapshot_diff,
+    tracemalloc_status,
+)
+from utils.matrices import MATRIX_TOP_K, load_competency_context, load_matrix_index
 from utils.pdf_report import generate_pdf_report
-from utils.telegram import send_document, send_message, set_webhook
+from utils.profiler import loop_lag_report, profile, start_loop_lag_monitor, stop_loop_lag_monitor
+from utils.sharding import SHARD_WORKERS, ShardPool
+from utils.telegram import (
+    accept_inline_reply,
+    close_client,
+    inline_reply_slot,
+    release_inline_reply,
+    send_document,
+    send_message,
+    set_webhook,
+    telegram_metrics,
+    wait_inline_reply,
+)
+from utils.tenants import (
+    DEFAULT_TENANT,
+    all_tenants,
+    current_tenant,
+    get_tenant,
+    tenant_metrics,
+    use_tenant,
+)
+from utils.tracing import start_trace, traced
 from utils.paths import data_path
 
 app = FastAPI(title="Designer Grade Bot")
@@ -30,45 +103,277 @@ logging.basicConfig(
 )
 logger = logging.getLogger("designer_grade_bot")
 
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
-TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
 PUBLIC_URL = os.getenv("PUBLIC_URL", "")
 AUTO_SET_WEBHOOK = os.getenv("AUTO_SET_WEBHOOK", "false").lower() == "true"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+FAST_WEBHOOK = os.getenv("FAST_WEBHOOK", "true").lower() == "true"
+# Number of latest user answers used as the retrieval query for the next question.
+MATRIX_QUERY_TURNS = 3
 
-# In-memory session store
-USER_SESSIONS: Dict[int, Dict[str, Any]] = {}
-COMPETENCY_CONTEXT: str = ""
+# In-memory session store, keyed by (tenant id, user id)
+USER_SESSIONS: Dict[Tuple[str, int], Dict[str, Any]] = {}
 DB_POOL = None
+SHARD_POOL: Optional[ShardPool] = None
+JOB_POOL: Optional[JobWorkers] = None
 
 
 @app.get("/health")
-async def health() -> Dict[str, str]:
-    return {"status": "ok"}
+async def health() -> JSONResponse:
+    if SHARD_POOL is None:
+        return JSONResponse({"status": "ok"})
+    healthy = SHARD_POOL.healthy()
+    return JSONResponse(
+        {"status": "ok" if healthy else "degraded", "shards": SHARD_POOL.status()},
+        status_code=200 if healthy else 503,
+    )
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    # Tenant ids double as webhook paths, so the metrics are for admins only.
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    return {
+        "db": get_pool_metrics(DB_POOL),
+        "llm": llm_metrics(),
+        "llm_scheduler": LLM_SCHEDULER.metrics(),
+        "llm_cache": LLM_CACHE.metrics(),
+        "prefetch": prefetch_metrics(),
+        "tenants": tenant_metrics(),
+        "jobs": job_metrics(),
+        "capture": capture_metrics(),
+        "analytics": analytics_metrics(),
+        "coalescing": COALESCER.metrics(),
+        "telegram": telegram_metrics(),
+        "executors": executor_metrics(),
+    }
+
+
+def _is_admin(request: Request) -> bool:
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get("X-Admin-Token", "")
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+@app.get("/admin/export/{kind}")
+async def admin_export(
+    kind: str,
+    request: Request,
+    format: str = "ndjson",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    language: Optional[str] = None,
+    tenant: Optional[str] = None,
+):
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    if kind not in EXPORT_FIELDS or format not in EXPORT_FORMATS:
+        return JSONResponse({"ok": False, "error": "unsupported kind or format"}, status_code=400)
+    try:
+        since_at = parse_date(since)
+        until_at = parse_date(until)
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "invalid date"}, status_code=400)
+    if export_busy():
+        return JSONResponse({"ok": False, "error": "too many exports running"}, status_code=429)
+
+    return StreamingResponse(
+        stream_export(DB_POOL, kind, format, since=since_at, until=until_at, language=language, tenant=tenant),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'},
+    )
+
+
+@app.get("/admin/analytics")
+async def admin_analytics(
+    request: Request,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    tenant: Optional[str] = None,
+    granularity: str = "day",
+) -> JSONResponse:
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    if granularity not in {"hour", "day", "total"}:
+        return JSONResponse({"ok": False, "error": "unsupported granularity"}, status_code=400)
+    try:
+        since_at = parse_date(since)
+        until_at = parse_date(until)
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "invalid date"}, status_code=400)
+    try:
+        report = await analytics_report(since_at, until_at, tenant, granularity)
+    except Exception:
+        logger.exception("Failed to build analytics report")
+        return JSONResponse({"ok": False}, status_code=500)
+    return JSONResponse(report)
+
+
+@app.get("/admin/debug/memory")
+async def admin_memory(request: Request, top: int = 10) -> JSONResponse:
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    if SHARD_POOL is not None:
+        # Sessions live in the shard worker processes, which this endpoint cannot reach.
+        sessions: Dict[str, Any] = {"available": False, "reason": "sessions are held by shard workers"}
+    else:
+        # Serializing every report and assessment is too slow for the event loop.
+        sessions = await asyncio.to_thread(session_report, USER_SESSIONS, max(1, min(top, 100)))
+    return JSONResponse(
+        {
+            "pid": os.getpid(),
+            "rss_bytes": rss_bytes(),
+            "sessions": sessions,
+            "tracemalloc": tracemalloc_status(),
+            "samples": recent_samples(),
+        }
+    )
+
+
+@app.post("/admin/debug/memory/snapshot")
+async def admin_memory_snapshot(request: Request, top: int = 20, frames: int = 1) -> JSONResponse:
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    result = await asyncio.to_thread(take_snapshot_diff, max(1, min(top, 200)), max(1, min(frames, 25)))
+    return JSONResponse(result)
+
+
+@app.delete("/admin/debug/memory/snapshot")
+async def admin_memory_stop(request: Request) -> JSONResponse:
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    stop_tracing()
+    return JSONResponse({"ok": True})
+
+
+@app.get("/admin/debug/profile")
+async def admin_profile(request: Request, seconds: float = 10.0, interval_ms: float = 5.0, format: str = "collapsed"):
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    result = await asyncio.to_thread(
+        profile,
+        max(0.1, seconds),
+        max(1.0, interval_ms) / 1000,
+        asyncio.get_running_loop(),
+        threading.get_ident(),
+    )
+    if result is None:
+        return JSONResponse({"ok": False, "error": "a profile is already running"}, status_code=409)
+    if format == "json":
+        return JSONResponse(dict(result, pid=os.getpid()))
+    return PlainTextResponse(result["collapsed"])
+
+
+@app.get("/admin/debug/loop-lag")
+async def admin_loop_lag(request: Request) -> JSONResponse:
+    if not _is_admin(request):
+        return JSONResponse({"ok": False}, status_code=403)
+    return JSONResponse(dict(loop_lag_report(), pid=os.getpid()))
 
 
 @app.post("/webhook")
 async def telegram_webhook(request: Request) -> JSONResponse:
+    return await _receive_webhook(request, DEFAULT_TENANT)
+
+
+@app.post("/webhook/{tenant_id}")
+async def tenant_webhook(tenant_id: str, request: Request) -> JSONResponse:
+    return await _receive_webhook(request, tenant_id)
+
+
+async def _receive_webhook(request: Request, tenant_id: str) -> JSONResponse:
+    tenant = get_tenant(tenant_id)
+    if tenant is None:
+        return JSONResponse({"ok": False}, status_code=404)
     try:
-        if TELEGRAM_WEBHOOK_SECRET:
+        if tenant.webhook_secret:
             secret_header = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
-            if secret_header != TELEGRAM_WEBHOOK_SECRET:
+            if secret_header != tenant.webhook_secret:
                 logger.warning("Invalid Telegram webhook secret")
                 return JSONResponse({"ok": False}, status_code=403)
 
         update = await request.json()
         logger.info("Incoming webhook update_id=%s", update.get("update_id"))
-        asyncio.create_task(_safe_handle_update(update))
-        return JSONResponse({"ok": True})
+        with inline_reply_slot() as slot:
+            status = _dispatch_update(update, tenant.id)
+        reply = await wait_inline_reply(slot) if status == 200 else None
+        if reply is not None:
+            return JSONResponse(reply)
+        return JSONResponse({"ok": status == 200}, status_code=status)
     except Exception:
         logger.exception("Webhook error")
         return JSONResponse({"ok": False}, status_code=500)
 
 
-async def _safe_handle_update(update: Dict[str, Any]) -> None:
-    try:
-        await handle_update(update)
-    except Exception:
-        logger.exception("Update handling failed")
+def _update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    message = update.get("message") or update.get("edited_message") or {}
+    return message.get("from", {}).get("id")
+
+
+def _webhook_secret(tenant_id: str) -> Optional[str]:
+    tenant = get_tenant(tenant_id)
+    return tenant.webhook_secret if tenant is not None else None
+
+
+def _dispatch_update(update: Dict[str, Any], tenant_id: str = DEFAULT_TENANT) -> int:
+    """Schedules an update for its tenant and returns the webhook status code."""
+    tenant = get_tenant(tenant_id)
+    if tenant is None:
+        return 404
+    tenant.stats["updates"] += 1
+    capture_update(update, tenant.id)
+    if not tenant.admit():
+        # Telegram redelivers updates answered with an error, so throttled
+        # updates are delayed rather than lost.
+        tenant.stats["throttled"] += 1
+        return 429
+    if SHARD_POOL is not None:
+        if not SHARD_POOL.dispatch(_update_user_id(update), (tenant.id, update)):
+            tenant.stats["rejected"] += 1
+            return 503
+        return 200
+    # Only in-process handlers can answer inline in the webhook response.
+    accept_inline_reply()
+    asyncio.create_task(_safe_handle_update(update, tenant.id))
+    return 200
+
+
+if FAST_WEBHOOK:
+    # Answers POST /webhook and /webhook/{tenant} before FastAPI routing; the
+    # routes above remain as the fallback when the fast path is disabled.
+    app.add_middleware(
+        FastWebhookMiddleware,
+        path="/webhook",
+        resolve=_webhook_secret,
+        dispatch=_dispatch_update,
+    )
+
+
+async def _safe_handle_update(update: Dict[str, Any], tenant_id: str = DEFAULT_TENANT) -> None:
+    tenant = get_tenant(tenant_id)
+    if tenant is None:
+        logger.warning("Update for unknown tenant %s was ignored", tenant_id)
+        return
+    with use_tenant(tenant), start_trace("update", update_id=update.get("update_id", 0), tenant=tenant.id):
+        try:
+            await handle_update(update)
+        except Exception:
+            logger.exception("Update handling failed")
+        finally:
+            release_inline_reply()
+
+
+async def _handle_routed_update(item: Tuple[str, Dict[str, Any]]) -> None:
+    tenant_id, update = item
+    await _safe_handle_update(update, tenant_id)
+
+
+def _bot_token() -> str:
+    return current_tenant().token
 
 
 def _user_display_name(user: Dict[str, Any]) -> str:
@@ -105,6 +410,24 @@ def _pdf_locked_message(language: str) -> str:
     return "The full PDF report is available after payment."
 
 
+def _no_report_message(language: str) -> str:
+    if language == "ru":
+        return "Отчёта пока нет. Напишите /start, чтобы пройти интервью."
+    return "No report yet. Send /start to take the interview."
+
+
+def _grading_message(language: str) -> str:
+    if language == "ru":
+        return "Ответы приняты, готовим оценку. Результат придёт в этот чат."
+    return "Answers received, preparing your grade. The result will arrive in this chat."
+
+
+def _llm_busy_message(language: str) -> str:
+    if language == "ru":
+        return "Сервис оценки сейчас перегружен. Попробуйте ещё раз через минуту."
+    return "The assessment service is overloaded right now. Please try again in a minute."
+
+
 def _summary_header(language: str) -> str:
     return "Краткое резюме" if language == "ru" else "Summary"
 
@@ -121,6 +444,7 @@ def _weaknesses_label(language: str) -> str:
     return "Зоны роста" if language == "ru" else "Growth areas"
 
 
+@traced("bot.handle_update")
 async def handle_update(update: Dict[str, Any]) -> None:
     message = update.get("message") or update.get("edited_message")
     if not message:
@@ -152,6 +476,13 @@ async def handle_update(update: Dict[str, Any]) -> None:
     if text.strip().lower() in {"пройти заново", "retake"}:
         text = "/start"
 
+    if session.get("state") == "grading":
+        # /start and /reset supersede the pending grade instead of waiting for it.
+        restarting = text.strip().lower().split()[:1] in (["/start"], ["/reset"])
+        superseded = restarting and await _cancel_grading(session, user_id)
+        if not superseded and await _grading_in_progress(session, chat_id, user_id):
+            return
+
     # language selection flow
     if session.get("awaiting_language") and not text.startswith("/"):
         await _handle_language_selection(session, chat_id, text)
@@ -171,19 +502,22 @@ async def handle_update(update: Dict[str, Any]) -> None:
         return
 
     await send_message(
-        TELEGRAM_BOT_TOKEN,
+        _bot_token(),
         chat_id,
         "Напишите /start, чтобы начать тест." if session["language"] == "ru" else "Send /start to begin.",
+        inline=True,
     )
 
 
 async def _get_or_create_session(user_id: int, user: Dict[str, Any]) -> Dict[str, Any]:
-    session = USER_SESSIONS.get(user_id)
+    tenant = current_tenant()
+    key = (tenant.id, user_id)
+    session = USER_SESSIONS.get(key)
     if session is None:
-        flags = await get_user_state(DB_POOL, user_id)
+        flags = await get_user_state(DB_POOL, user_id, tenant=tenant.id)
         session = {
             "history": [],
-            "language": "ru",
+            "language": tenant.language,
             "paid": bool(flags.get("paid", False)),
             "free_used": bool(flags.get("free_used", False)),
             "state": "idle",
@@ -191,8 +525,10 @@ async def _get_or_create_session(user_id: int, user: Dict[str, Any]) -> Dict[str
             "awaiting_feedback": False,
             "username": _user_display_name(user),
             "last_report": None,
+            "assessment": new_assessment(),
         }
-        USER_SESSIONS[user_id] = session
+        USER_SESSIONS[key] = session
+        tenant.stats["sessions"] += 1
     else:
         session["username"] = _user_display_name(user)
     return session
@@ -207,129 +543,439 @@ async def _handle_command(session: Dict[str, Any], chat_id: int, user_id: int, t
 
     if command == "/reset":
         session["history"] = []
+        session["assessment"] = new_assessment()
         session["state"] = "idle"
         session["awaiting_language"] = False
         session["awaiting_feedback"] = False
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Прогресс сброшен." if session["language"] == "ru" else "Progress reset.")
+        await send_message(
+            _bot_token(), chat_id, "Прогресс сброшен." if session["language"] == "ru" else "Progress reset.", inline=True
+        )
         return
 
     if command == "/language":
         session["awaiting_language"] = True
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, _language_prompt(session["language"]))
+        await send_message(_bot_token(), chat_id, _language_prompt(session["language"]), inline=True)
         return
 
     if command == "/feedback":
+        release_inline_reply()
         session["awaiting_feedback"] = True
-        question = await generate_feedback_question(session["history"], session["language"])
+        question = await take_feedback_question(session)
+        if not question:
+            with llm_priority("feedback"):
+                question = await generate_feedback_question(session["history"], session["language"])
         if not question:
             question = "Что можно улучшить?" if session["language"] == "ru" else "What could be improved?"
         session["last_feedback_question"] = question
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, question)
+        await send_message(_bot_token(), chat_id, question)
         return
 
     if command == "/pay":
         # payment hook placeholder
         session["paid"] = True
-        await upsert_user_state(DB_POOL, user_id, paid=True, free_used=session.get("free_used", False))
+        await upsert_user_state(
+            DB_POOL, user_id, paid=True, free_used=session.get("free_used", False), tenant=current_tenant().id
+        )
+        await record_event(DB_POOL, user_id, "paid", tenant=current_tenant().id)
+        track("payments")
         await send_message(
-            TELEGRAM_BOT_TOKEN,
+            _bot_token(),
             chat_id,
             "Оплата подтверждена (эмуляция)." if session["language"] == "ru" else "Payment confirmed (simulated).",
         )
         # If a report exists, deliver PDF now
-        if session.get("last_report"):
+        if await _load_last_report(session, user_id):
             await _send_pdf_report(session, chat_id, user_id)
         return
 
-    await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Неизвестная команда." if session["language"] == "ru" else "Unknown command.")
+    if command == "/report":
+        await _resend_report(session, chat_id, user_id)
+        return
+
+    await send_message(
+        _bot_token(), chat_id, "Неизвестная команда." if session["language"] == "ru" else "Unknown command.", inline=True
+    )
 
 
 async def _start_dialog(session: Dict[str, Any], chat_id: int, user_id: int) -> None:
     if session.get("free_used") and not session.get("paid"):
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, _free_locked_message(session["language"]))
+        await send_message(_bot_token(), chat_id, _free_locked_message(session["language"]), inline=True)
         return
 
     session["history"] = []
+    session["assessment"] = new_assessment()
+    session.pop("feedback_prefetch", None)
     session["state"] = "collecting"
     session["awaiting_language"] = False
     session["awaiting_feedback"] = False
     session["last_report"] = None
+    session["interview_id"] = uuid.uuid4().hex
+    await record_event(DB_POOL, user_id, "interview_started", {"language": session["language"]}, tenant=current_tenant().id)
+    track("interviews_started", session["language"])
 
     intro = (
         "Начинаем интервью. Отвечайте развернуто." if session["language"] == "ru" else "Starting interview. Please answer in detail."
     )
-    await send_message(TELEGRAM_BOT_TOKEN, chat_id, intro)
+    await send_message(_bot_token(), chat_id, intro)
 
-    next_question = await generate_next_question(session["history"], COMPETENCY_CONTEXT, session["language"])
+    matrix_context = _matrix_context(session["history"])
+    next_question = take_opening_question(session["language"], matrix_context)
+    if next_question is None:
+        with llm_priority("new_interview"):
+            next_question = await generate_next_question(
+                session["history"], matrix_context, session["language"], _assessment(session)
+            )
     if next_question is None:
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Не удалось сгенерировать вопрос." if session["language"] == "ru" else "Failed to generate a question.")
+        await send_message(_bot_token(), chat_id, "Не удалось сгенерировать вопрос." if session["language"] == "ru" else "Failed to generate a question.")
         session["state"] = "idle"
         return
 
     if next_question:
         session["history"].append({"role": "assistant", "content": next_question})
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, next_question)
+        await send_message(_bot_token(), chat_id, next_question)
         return
 
     await _finalize_grade(session, chat_id, user_id)
 
 
-async def _handle_dialog_message(session: Dict[str, Any], chat_id: int, user_id: int, text: str) -> None:
-    session["history"].append({"role": "user", "content": text})
+def _assessment(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not INCREMENTAL_ASSESSMENT:
+        return None
+    return session.setdefault("assessment", new_assessment())
+
+
+def _matrix_context(history: List[Dict[str, str]], final: bool = False) -> str:
+    """
+    Picks the current tenant's matrix sections relevant to the latest answers
+    (all answers for the final grade). The static part of the matrix is added
+    to every prompt by logic.prompts, so without an index there is nothing to pick.
+    """
+    tenant = current_tenant()
+    if tenant.index is None:
+        return ""
+
+    answers = [item.get("content", "") for item in history if item.get("role") == "user"]
+    if final:
+        return tenant.index.context_for(" ".join(answers), MATRIX_TOP_K * 2)
+    return tenant.index.context_for(" ".join(answers[-MATRIX_QUERY_TURNS:]), MATRIX_TOP_K)
 
-    next_question = await generate_next_question(session["history"], COMPETENCY_CONTEXT, session["language"])
+
+async def _handle_dialog_message(session: Dict[str, Any], chat_id: int, user_id: int, text: str) -> None:
+    # The next question needs the model, so the webhook is not held for it.
+    release_inline_reply()
+    # Messages sent in quick succession are answered as one turn.
+    interview_id = session.get("interview_id")
+
+    async def generate(answer: str) -> Optional[str]:
+        history = session["history"] + [{"role": "user", "content": answer}]
+        with llm_priority("interview"):
+            return await generate_next_question(
+                history, _matrix_context(history), session["language"], _assessment(session)
+            )
+
+    async def deliver(answer: str, next_question: Optional[str]) -> None:
+        if session.get("state") != "collecting" or session.get("interview_id") != interview_id:
+            # The interview was reset or restarted while the turn was pending.
+            return
+        await _answer_turn(session, chat_id, user_id, answer, next_question)
+
+    await COALESCER.submit((current_tenant().id, user_id), text, generate, deliver)
+
+
+async def _answer_turn(
+    session: Dict[str, Any], chat_id: int, user_id: int, answer: str, next_question: Optional[str]
+) -> None:
+    session["history"].append({"role": "user", "content": answer})
+    track("answers", session["language"])
     if next_question is None:
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Не удалось продолжить." if session["language"] == "ru" else "Failed to continue.")
+        if not llm_available():
+            await send_message(_bot_token(), chat_id, _llm_busy_message(session["language"]))
+            return
+        await send_message(_bot_token(), chat_id, "Не удалось продолжить." if session["language"] == "ru" else "Failed to continue.")
         return
 
     if next_question:
         session["history"].append({"role": "assistant", "content": next_question})
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, next_question)
+        await send_message(_bot_token(), chat_id, next_question)
         return
 
     await _finalize_grade(session, chat_id, user_id)
 
 
+async def _grade(
+    history: List[Dict[str, str]], assessment: Optional[Dict[str, Any]], language: str, paid: bool
+) -> Optional[Dict[str, Any]]:
+    matrix_context = _matrix_context(history, final=True)
+    # Paid users are committed customers; unpaid grading still finishes an
+    # interview that is already in progress.
+    with llm_priority("grade_paid" if paid else "interview"):
+        if assessment is not None and has_evidence(assessment):
+            return await grade_user_from_assessment(assessment, matrix_context, language)
+        return await grade_user_from_history(history, matrix_context, language)
+
+
+async def _record_grade(user_id: int, report: Dict[str, Any], language: str, answers: int, paid: bool) -> None:
+    tenant_id = current_tenant().id
+    await save_last_report(DB_POOL, user_id, report, tenant=tenant_id)
+    await upsert_user_state(DB_POOL, user_id, paid=paid, free_used=True, tenant=tenant_id)
+    await record_event(
+        DB_POOL,
+        user_id,
+        "graded",
+        {"grade": report.get("grade"), "language": language, "answers": answers},
+        tenant=tenant_id,
+    )
+    track_grade(str(report.get("grade") or "Unknown"), language, answers)
+
+
+def _job_key(step: str, user_id: int, ref: str) -> str:
+    return f"{step}:{current_tenant().id}:{user_id}:{ref}"
+
+
+@traced("bot.finalize_grade")
 async def _finalize_grade(session: Dict[str, Any], chat_id: int, user_id: int) -> None:
-    report = await grade_user_from_history(session["history"], COMPETENCY_CONTEXT, session["language"])
+    if jobs_enabled():
+        interview_id = session.get("interview_id", "")
+        session["state"] = "grading"
+        queued = await enqueue_job(
+            "grade",
+            _job_key("grade", user_id, interview_id),
+            {
+                "tenant": current_tenant().id,
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "ref": interview_id,
+                "language": session["language"],
+                "paid": bool(session.get("paid")),
+                "username": session.get("username", "Unknown"),
+                "history": session["history"],
+                "assessment": _assessment(session),
+            },
+        )
+        if queued:
+            await send_message(_bot_token(), chat_id, _grading_message(session["language"]))
+            return
+        # The queue is unreachable; grade inline rather than lose the interview.
+        session["state"] = "collecting"
+
+    report = await _grade(session["history"], _assessment(session), session["language"], bool(session.get("paid")))
     if report is None:
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Не удалось определить грейд." if session["language"] == "ru" else "Failed to determine grade.")
+        if not llm_available():
+            # Keep the collected answers so the user can retry grading later.
+            await send_message(_bot_token(), chat_id, _llm_busy_message(session["language"]))
+            return
+        await send_message(_bot_token(), chat_id, "Не удалось определить грейд." if session["language"] == "ru" else "Failed to determine grade.")
         session["state"] = "idle"
         return
 
     session["last_report"] = report
+    session["free_used"] = True
+    session["state"] = "completed"
+    await _record_grade(user_id, report, session["language"], _answer_count(session["history"]), bool(session.get("paid")))
+    prefetch_feedback_question(session)
 
     summary_text = _format_summary(report, session["language"])
-    await send_message(TELEGRAM_BOT_TOKEN, chat_id, summary_text)
+    await send_message(_bot_token(), chat_id, summary_text)
 
     if session.get("paid"):
         await _send_pdf_report(session, chat_id, user_id)
     else:
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, _pdf_locked_message(session["language"]))
+        await send_message(_bot_token(), chat_id, _pdf_locked_message(session["language"]))
+
+    await _send_retake_button(session["language"], chat_id)
+
+
+async def _grading_in_progress(session: Dict[str, Any], chat_id: int, user_id: int) -> bool:
+    """
+    Catches up a session whose grade job may have run in another process.
+    Returns True (after telling the user) while the job is still pending.
+    """
+    status, result = await job_status(_job_key("grade", user_id, session.get("interview_id", "")))
+    if status in {"queued", "running"}:
+        await send_message(_bot_token(), chat_id, _grading_message(session["language"]))
+        return True
+    if status == "done" and (result or {}).get("ok"):
+        session["last_report"] = await get_last_report(DB_POOL, user_id, tenant=current_tenant().id)
+        session["free_used"] = True
+        session["state"] = "completed"
+    else:
+        session["state"] = "idle"
+    return False
 
-    session["free_used"] = True
-    session["state"] = "completed"
-    await upsert_user_state(DB_POOL, user_id, paid=session.get("paid", False), free_used=True)
 
-    await _send_retake_button(session, chat_id)
+async def _cancel_grading(session: Dict[str, Any], user_id: int) -> bool:
+    """Cancels the session's pending grade job. Returns False if it already finished."""
+    if not await cancel_job(_job_key("grade", user_id, session.get("interview_id", ""))):
+        return False
+    session["state"] = "idle"
+    return True
+
+
+def _job_session(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Only a session of this process that is still on the same interview.
+    session = USER_SESSIONS.get((payload["tenant"], payload["user_id"]))
+    if session is None or session.get("interview_id") != payload["ref"]:
+        return None
+    return session
+
+
+async def _run_grade_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    tenant = get_tenant(payload["tenant"])
+    if tenant is None:
+        return {"ok": False}
+    with use_tenant(tenant):
+        user_id, chat_id, language = payload["user_id"], payload["chat_id"], payload["language"]
+        report = await _grade(payload["history"], payload.get("assessment"), language, payload["paid"])
+        status, _ = await job_status(_job_key("grade", user_id, payload["ref"]))
+        if status == "cancelled":
+            # The user restarted or reset while the grade was being computed.
+            return {"ok": False}
+        if report is None:
+            if not llm_available():
+                raise RuntimeError("LLM is unavailable")
+            await send_message(tenant.token, chat_id, "Не удалось определить грейд." if language == "ru" else "Failed to determine grade.")
+            session = _job_session(payload)
+            if session is not None:
+                session["state"] = "idle"
+            return {"ok": False}
+
+        await _record_grade(user_id, report, language, _answer_count(payload["history"]), payload["paid"])
+        session = _job_session(payload)
+        if session is not None:
+            session["last_report"] = report
+            session["free_used"] = True
+            session["state"] = "completed"
+            prefetch_feedback_question(session)
+
+        summary = {key: payload[key] for key in ("tenant", "user_id", "chat_id", "ref", "language", "paid", "username")}
+        if not await enqueue_job("deliver_summary", _job_key("summary", user_id, payload["ref"]), dict(summary, report=report)):
+            raise RuntimeError("Failed to enqueue summary delivery")
+        return {"ok": True}
+
+
+async def _grade_job_dead(payload: Dict[str, Any]) -> None:
+    tenant = get_tenant(payload["tenant"])
+    if tenant is None:
+        return
+    language = payload["language"]
+    await send_message(tenant.token, payload["chat_id"], "Не удалось определить грейд." if language == "ru" else "Failed to determine grade.")
+    session = _job_session(payload)
+    if session is not None:
+        session["state"] = "idle"
+
+
+async def _run_summary_job(payload: Dict[str, Any]) -> None:
+    tenant = get_tenant(payload["tenant"])
+    if tenant is None:
+        return
+    with use_tenant(tenant):
+        chat_id, language = payload["chat_id"], payload["language"]
+        if not await send_message(tenant.token, chat_id, _format_summary(payload["report"], language)):
+            raise RuntimeError("Summary was not delivered")
+        if payload["paid"]:
+            if not await enqueue_job("render_pdf", _job_key("render", payload["user_id"], payload["ref"]), payload):
+                raise RuntimeError("Failed to enqueue PDF rendering")
+        else:
+            await send_message(tenant.token, chat_id, _pdf_locked_message(language))
+        await _send_retake_button(language, chat_id)
+
+
+def _report_file(payload: Dict[str, Any]) -> str:
+    return data_path("reports", f"report_{payload['chat_id']}_{payload['ref']}.pdf")
+
+
+async def _run_render_job(payload: Dict[str, Any]) -> None:
+    tenant = get_tenant(payload["tenant"])
+    if tenant is None:
+        return
+    with use_tenant(tenant):
+        file_path = _report_file(payload)
+        if not os.path.exists(file_path) and not await generate_pdf_report(payload["report"], payload["username"], file_path):
+            raise RuntimeError("PDF rendering failed")
+        if not await enqueue_job("deliver_pdf", _job_key("pdf", payload["user_id"], payload["ref"]), payload):
+            raise RuntimeError("Failed to enqueue PDF delivery")
+
+
+async def _run_deliver_pdf_job(payload: Dict[str, Any]) -> None:
+    tenant = get_tenant(payload["tenant"])
+    if tenant is None:
+        return
+    with use_tenant(tenant):
+        file_path = _report_file(payload)
+        # The file is missing when rendering ran on another host without a shared volume.
+        if not os.path.exists(file_path) and not await generate_pdf_report(payload["report"], payload["username"], file_path):
+            raise RuntimeError("PDF rendering failed")
+        caption = "Ваш PDF-отчёт" if payload["language"] == "ru" else "Your PDF report"
+        if not await send_document(tenant.token, payload["chat_id"], file_path, caption=caption):
+            raise RuntimeError("PDF was not delivered")
+
+
+async def _pdf_job_dead(payload: Dict[str, Any]) -> None:
+    tenant = get_tenant(payload["tenant"])
+    if tenant is not None:
+        language = payload["language"]
+        await send_message(tenant.token, payload["chat_id"], "Не удалось сформировать PDF." if language == "ru" else "Failed to generate PDF.")
+
 
+register_job("grade", _run_grade_job, _grade_job_dead)
+register_job("deliver_summary", _run_summary_job)
+register_job("render_pdf", _run_render_job, _pdf_job_dead)
+register_job("deliver_pdf", _run_deliver_pdf_job, _pdf_job_dead)
 
+
+async def _load_last_report(session: Dict[str, Any], user_id: int) -> Optional[Dict[str, Any]]:
+    # The session is the in-memory cache; storage survives restarts.
+    report = session.get("last_report")
+    if report is None:
+        report = await get_last_report(DB_POOL, user_id, tenant=current_tenant().id)
+        session["last_report"] = report
+    return report
+
+
+async def _resend_report(session: Dict[str, Any], chat_id: int, user_id: int) -> None:
+    report = await _load_last_report(session, user_id)
+    if not report:
+        await send_message(_bot_token(), chat_id, _no_report_message(session["language"]))
+        return
+
+    await send_message(_bot_token(), chat_id, _format_summary(report, session["language"]))
+    if session.get("paid"):
+        await _send_pdf_report(session, chat_id, user_id)
+    else:
+        await send_message(_bot_token(), chat_id, _pdf_locked_message(session["language"]))
+
+
+@traced("bot.send_pdf_report")
 async def _send_pdf_report(session: Dict[str, Any], chat_id: int, user_id: int) -> None:
     report = session.get("last_report")
     if not report:
         return
 
+    if jobs_enabled():
+        ref = uuid.uuid4().hex
+        payload = {
+            "tenant": current_tenant().id,
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "ref": ref,
+            "language": session["language"],
+            "username": session.get("username", "Unknown"),
+            "report": report,
+        }
+        if await enqueue_job("render_pdf", _job_key("render", user_id, ref), payload):
+            return
+
     user_display_name = session.get("username", "Unknown")
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     file_path = data_path("reports", f"report_{chat_id}_{timestamp}.pdf")
 
     pdf_path = await generate_pdf_report(report, user_display_name, file_path)
     if not pdf_path:
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Не удалось сформировать PDF." if session["language"] == "ru" else "Failed to generate PDF.")
+        await send_message(_bot_token(), chat_id, "Не удалось сформировать PDF." if session["language"] == "ru" else "Failed to generate PDF.")
         return
 
     await send_document(
-        TELEGRAM_BOT_TOKEN,
+        _bot_token(),
         chat_id,
         pdf_path,
         caption="Ваш PDF-отчёт" if session["language"] == "ru" else "Your PDF report",
@@ -344,12 +990,22 @@ async def _handle_language_selection(session: Dict[str, Any], chat_id: int, text
         language = "en"
 
     if language not in {"ru", "en"}:
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Поддерживаются только ru или en." if session["language"] == "ru" else "Only ru or en supported.")
+        await send_message(
+            _bot_token(),
+            chat_id,
+            "Поддерживаются только ru или en." if session["language"] == "ru" else "Only ru or en supported.",
+            inline=True,
+        )
         return
 
     session["language"] = language
     session["awaiting_language"] = False
-    await send_message(TELEGRAM_BOT_TOKEN, chat_id, f"Язык установлен: {language}." if language == "ru" else f"Language set: {language}.")
+    await send_message(
+        _bot_token(),
+        chat_id,
+        f"Язык установлен: {language}." if language == "ru" else f"Language set: {language}.",
+        inline=True,
+    )
 
 
 async def _handle_feedback(session: Dict[str, Any], chat_id: int, user_id: int, text: str) -> None:
@@ -362,29 +1018,43 @@ async def _handle_feedback(session: Dict[str, Any], chat_id: int, user_id: int,
         language=session.get("language", "ru"),
         question=question,
         answer=text,
+        tenant=current_tenant().id,
     )
     if saved:
-        await send_message(TELEGRAM_BOT_TOKEN, chat_id, _feedback_thanks(session["language"]))
+        await record_event(
+            DB_POOL, user_id, "feedback_submitted", {"language": session.get("language", "ru")}, tenant=current_tenant().id
+        )
+        track("feedback", session.get("language", "ru"))
+        await send_message(_bot_token(), chat_id, _feedback_thanks(session["language"]), inline=True)
         return
 
-    await send_message(TELEGRAM_BOT_TOKEN, chat_id, "Не удалось сохранить отзыв." if session["language"] == "ru" else "Failed to save feedback.")
+    await send_message(
+        _bot_token(),
+        chat_id,
+        "Не удалось сохранить отзыв." if session["language"] == "ru" else "Failed to save feedback.",
+        inline=True,
+    )
 
 
-async def _send_retake_button(session: Dict[str, Any], chat_id: int) -> None:
-    button_text = _retake_text(session["language"])
+async def _send_retake_button(language: str, chat_id: int) -> None:
+    button_text = _retake_text(language)
     reply_markup = {
         "keyboard": [[{"text": button_text}]],
         "resize_keyboard": True,
         "one_time_keyboard": True,
     }
     await send_message(
-        TELEGRAM_BOT_TOKEN,
+        _bot_token(),
         chat_id,
-        "Готовы пройти заново?" if session["language"] == "ru" else "Ready to retake?",
+        "Готовы пройти заново?" if language == "ru" else "Ready to retake?",
         reply_markup=reply_markup,
     )
 
 
+def _answer_count(history: List[Dict[str, str]]) -> int:
+    return sum(1 for item in history if item.get("role") == "user")
+
+
 def _format_summary(report: Dict[str, Any], language: str) -> str:
     grade = report.get("grade", "Unknown")
     summary = report.get("summary", "")
@@ -404,24 +1074,81 @@ def _format_summary(report: Dict[str, Any], language: str) -> str:
     return "\n".join(lines)
 
 
-@app.on_event("startup")
-async def on_startup() -> None:
-    global COMPETENCY_CONTEXT, DB_POOL
+def _load_tenant_matrices() -> None:
+    # Tenants that point at the same folder share one context and index.
+    loaded: Dict[str, Tuple[str, Any]] = {}
+    for tenant in all_tenants():
+        if tenant.matrices_dir not in loaded:
+            loaded[tenant.matrices_dir] = (
+                load_competency_context(tenant.matrices_dir),
+                load_matrix_index(tenant.matrices_dir),
+            )
+        tenant.context, tenant.index = loaded[tenant.matrices_dir]
+
+
+async def init_runtime(warm: bool = True) -> None:
+    global DB_POOL
 
-    COMPETENCY_CONTEXT = load_competency_context()
+    _load_tenant_matrices()
     DB_POOL = await init_db()
     await ensure_schema(DB_POOL)
+    init_jobs(DB_POOL)
+    start_analytics(DB_POOL)
+    if warm:
+        for tenant in all_tenants():
+            with use_tenant(tenant):
+                warm_opening_questions(["ru", "en"], _matrix_context([]))
+    start_memory_sampler(lambda: USER_SESSIONS)
+    start_loop_lag_monitor()
 
-    if not TELEGRAM_BOT_TOKEN:
-        logger.warning("TELEGRAM_BOT_TOKEN is not set")
+
+@app.on_event("startup")
+async def on_startup() -> None:
+    global SHARD_POOL, JOB_POOL
+
+    # The front process keeps its own runtime for admin endpoints and runs
+    # migrations once before any shard worker starts.
+    await init_runtime(warm=SHARD_WORKERS == 0)
+    if SHARD_WORKERS > 0:
+        # Sessions live in the worker processes; the front process only routes.
+        SHARD_POOL = ShardPool(SHARD_WORKERS, init_runtime, _handle_routed_update)
+        SHARD_POOL.start()
+    if jobs_enabled() and JOB_WORKERS > 0:
+        # Set JOB_WORKERS=0 to leave the jobs to `python worker.py`.
+        JOB_POOL = JobWorkers(JOB_WORKERS)
+        JOB_POOL.start()
+
+    for tenant in all_tenants():
+        if not tenant.token:
+            if tenant.id == DEFAULT_TENANT:
+                logger.warning("TELEGRAM_BOT_TOKEN is not set")
+            else:
+                logger.warning("Tenant %s has no bot token", tenant.id)
     if not os.getenv("OPENAI_API_KEY"):
         logger.warning("OPENAI_API_KEY is not set")
 
-    if AUTO_SET_WEBHOOK and TELEGRAM_BOT_TOKEN and PUBLIC_URL:
-        webhook_url = f"{PUBLIC_URL.rstrip('/')}/webhook"
-        webhook_ok = await set_webhook(
-            TELEGRAM_BOT_TOKEN,
-            webhook_url,
-            TELEGRAM_WEBHOOK_SECRET,
-        )
-        logger.info("Webhook registration result=%s url=%s", webhook_ok, webhook_url)
+    if AUTO_SET_WEBHOOK and PUBLIC_URL:
+        for tenant in all_tenants():
+            if not tenant.token:
+                continue
+            webhook_url = f"{PUBLIC_URL.rstrip('/')}{tenant.webhook_path()}"
+            webhook_ok = await set_webhook(
+                tenant.token,
+                webhook_url,
+                tenant.webhook_secret,
+            )
+            logger.info("Webhook registration result=%s url=%s", webhook_ok, webhook_url)
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    if JOB_POOL is not None:
+        await JOB_POOL.stop()
+    if SHARD_POOL is not None:
+        await SHARD_POOL.stop()
+    await close_analytics()
+    await close_db(DB_POOL)
+    await close_client()
+    close_capture()
+    stop_loop_lag_monitor()
+    shutdown_executors()
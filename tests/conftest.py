@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Modules read their settings at import time, so the environment is fixed
+# before any of them is imported. Nothing here talks to the network.
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="designer-grade-bot-tests-"))
+os.environ.pop("DATABASE_URL", None)
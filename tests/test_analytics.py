@@ -0,0 +1,99 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+import utils.analytics as analytics
+
+
+def _hour(days_ago: float = 0) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H")
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(analytics, "_POOL", None)
+    monkeypatch.setattr(analytics, "_PENDING", analytics.defaultdict(int))
+    monkeypatch.setattr(analytics, "_IN_FLIGHT", {})
+    return tmp_path
+
+
+def test_merge_local_adds_to_stored_counters(tmp_path: Path) -> None:
+    path = str(tmp_path / "analytics.json")
+    hour = _hour()
+    analytics._merge_local(path, {(hour, "default", "answers", ""): 2, (hour, "default", "graded", "ru"): 1})
+    analytics._merge_local(path, {(hour, "default", "answers", ""): 3, (hour, "acme", "answers", ""): 1})
+
+    assert analytics._load_local(path) == {
+        (hour, "default", "answers", ""): 5,
+        (hour, "default", "graded", "ru"): 1,
+        (hour, "acme", "answers", ""): 1,
+    }
+
+
+def test_merge_local_folds_old_hours_into_days(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(analytics, "ANALYTICS_HOURLY_DAYS", 2)
+    path = str(tmp_path / "analytics.json")
+    old_day = _hour(days_ago=5).split("T", 1)[0]
+    recent = _hour()
+    analytics._merge_local(path, {(f"{old_day}T01", "default", "answers", ""): 2})
+    analytics._merge_local(path, {(f"{old_day}T02", "default", "answers", ""): 3, (recent, "default", "answers", ""): 1})
+
+    assert analytics._load_local(path) == {
+        (old_day, "default", "answers", ""): 5,
+        (recent, "default", "answers", ""): 1,
+    }
+
+
+def test_merge_local_starts_over_on_a_corrupt_file(tmp_path: Path) -> None:
+    path = tmp_path / "analytics.json"
+    path.write_text("{not json", encoding="utf-8")
+    hour = _hour()
+    analytics._merge_local(str(path), {(hour, "default", "answers", ""): 1})
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {f"{hour}|default|answers|": 1}
+
+
+def test_report_sums_flushed_and_pending_counters(data_dir: Path) -> None:
+    async def scenario() -> None:
+        analytics.track("interviews_started", "ru")
+        analytics.track("interviews_started", "en")
+        analytics.track_grade("Senior", "ru", answers=6)
+        await analytics.flush_analytics()
+        assert not analytics._PENDING
+
+        analytics.track("payments", "ru")
+        report = await analytics.analytics_report(granularity="day")
+        assert report["funnel"]["interviews_started"] == 2
+        assert report["funnel"]["graded"] == 1
+        assert report["funnel"]["payments"] == 1
+        assert report["funnel"]["completion_rate"] == 0.5
+        assert report["funnel"]["answers_per_interview"] == 6.0
+        assert report["totals"]["answers_per_interview"] == {"6-8": 1}
+        assert report["totals"]["grades"] == {"Senior/ru": 1}
+        assert len(report["series"]) == 1 and "T" not in report["series"][0]["bucket"]
+
+        other = await analytics.analytics_report(tenant="acme", granularity="total")
+        assert other["funnel"]["interviews_started"] == 0
+        assert "series" not in other
+
+    asyncio.run(scenario())
+    assert (data_dir / "analytics.json").exists()
+
+
+def test_failed_flush_keeps_counters(data_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def broken(path: str, deltas: dict) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(analytics, "_merge_local", broken)
+
+    async def scenario() -> None:
+        analytics.track("answers", amount=4)
+        await analytics.flush_analytics()
+        assert sum(analytics._PENDING.values()) == 4
+        assert (await analytics.analytics_report(granularity="total"))["funnel"]["answers"] == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+from logic.assessment import (
+    MAX_EVIDENCE_CHARS,
+    MAX_EVIDENCE_PER_COMPETENCY,
+    format_assessment,
+    has_evidence,
+    merge_assessment,
+    new_assessment,
+)
+
+
+def test_merge_accumulates_levels_and_evidence() -> None:
+    state = new_assessment()
+    merge_assessment(
+        state,
+        {
+            "provisional_grade": "Middle",
+            "competencies": [{"id": "research_insights", "level": "middle", "evidence": "Runs user interviews"}],
+        },
+    )
+    merge_assessment(
+        state,
+        {
+            "provisional_grade": "",
+            "competencies": [
+                {"id": "research_insights", "level": "senior", "evidence": ["Runs user interviews", "Built a panel"]},
+                {"id": "visual_ui", "level": "", "evidence": "Owns the UI kit"},
+            ],
+        },
+    )
+
+    assert state["turns"] == 2
+    # An empty grade does not erase the previous one.
+    assert state["provisional_grade"] == "Middle"
+    assert state["competencies"]["research_insights"] == {
+        "level": "senior",
+        "evidence": ["Runs user interviews", "Built a panel"],
+    }
+    assert state["competencies"]["visual_ui"] == {"level": "", "evidence": ["Owns the UI kit"]}
+    assert has_evidence(state)
+
+
+def test_merge_accepts_a_mapping_of_competencies() -> None:
+    state = merge_assessment(new_assessment(), {"competencies": {"ux_flows": {"level": "lead", "evidence": "Led IA"}}})
+    assert state["competencies"]["ux_flows"] == {"level": "lead", "evidence": ["Led IA"]}
+
+
+def test_merge_caps_evidence() -> None:
+    state = new_assessment()
+    for index in range(MAX_EVIDENCE_PER_COMPETENCY + 3):
+        merge_assessment(state, {"competencies": [{"id": "systems", "evidence": f"fact {index} " + "x" * 500}]})
+
+    evidence = state["competencies"]["systems"]["evidence"]
+    assert len(evidence) == MAX_EVIDENCE_PER_COMPETENCY
+    assert evidence[-1].startswith(f"fact {MAX_EVIDENCE_PER_COMPETENCY + 2} ")
+    assert all(len(text) <= MAX_EVIDENCE_CHARS for text in evidence)
+
+
+def test_merge_ignores_malformed_updates() -> None:
+    state = new_assessment()
+    merge_assessment(state, None)
+    merge_assessment(state, "not json")
+    merge_assessment(state, {"competencies": [{"level": "senior"}, "junk", {"id": " ", "evidence": "x"}]})
+    merge_assessment(state, {"competencies": "junk"})
+
+    assert state["turns"] == 4
+    assert state["competencies"] == {}
+    assert not has_evidence(state)
+    assert format_assessment(state) == ""
+
+
+def test_format_assessment_is_sorted_and_stable() -> None:
+    state = new_assessment()
+    merge_assessment(
+        state,
+        {
+            "provisional_grade": "Senior",
+            "competencies": [
+                {"id": "visual_ui", "level": "senior", "evidence": "UI kit"},
+                {"id": "research_insights", "evidence": "Interviews"},
+            ],
+        },
+    )
+    assert format_assessment(state) == (
+        "Provisional grade: Senior\n"
+        "- research_insights: unknown\n"
+        "  * Interviews\n"
+        "- visual_ui: senior\n"
+        "  * UI kit"
+    )
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, List, Tuple
+
+from utils.coalesce import MessageCoalescer
+
+
+def _recorder(delay: float = 0.0) -> Tuple[List[str], List[Tuple[str, Any]], Any, Any]:
+    generated: List[str] = []
+    delivered: List[Tuple[str, Any]] = []
+
+    async def generate(text: str) -> str:
+        generated.append(text)
+        await asyncio.sleep(delay)
+        return text.upper()
+
+    async def deliver(text: str, result: Any) -> None:
+        delivered.append((text, result))
+
+    return generated, delivered, generate, deliver
+
+
+def test_messages_within_window_form_one_turn() -> None:
+    async def scenario() -> None:
+        coalescer = MessageCoalescer(window=0.05, max_delay=1.0)
+        generated, delivered, generate, deliver = _recorder()
+        first = asyncio.create_task(coalescer.submit("u", "a", generate, deliver))
+        await asyncio.sleep(0.01)
+        await coalescer.submit("u", "b", generate, deliver)
+        await first
+
+        assert generated == ["a\nb"]
+        assert delivered == [("a\nb", "A\nB")]
+        assert coalescer.metrics()["merged"] == 1
+        assert coalescer.metrics()["open"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_message_during_generation_supersedes_it() -> None:
+    async def scenario() -> None:
+        coalescer = MessageCoalescer(window=0.01, max_delay=1.0)
+        generated, delivered, generate, deliver = _recorder(delay=0.1)
+        first = asyncio.create_task(coalescer.submit("u", "a", generate, deliver))
+        await asyncio.sleep(0.05)
+        await coalescer.submit("u", "b", generate, deliver)
+        await first
+
+        # The first generation was cancelled and restarted with the merged text.
+        assert generated == ["a", "a\nb"]
+        assert delivered == [("a\nb", "A\nB")]
+        assert coalescer.metrics()["superseded"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_turn() -> None:
+    async def scenario() -> None:
+        coalescer = MessageCoalescer(window=0.05, max_delay=1.0)
+        _, delivered, generate, deliver = _recorder()
+        caller = asyncio.create_task(coalescer.submit("u", "a", generate, deliver))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+
+        assert delivered == [("a", "A")]
+
+    asyncio.run(scenario())
+
+
+def test_keys_are_independent_and_disabled_window_answers_at_once() -> None:
+    async def scenario() -> None:
+        coalescer = MessageCoalescer(window=0.02, max_delay=1.0)
+        _, delivered, generate, deliver = _recorder()
+        await asyncio.gather(
+            coalescer.submit("u1", "a", generate, deliver),
+            coalescer.submit("u2", "b", generate, deliver),
+        )
+        assert sorted(delivered) == [("a", "A"), ("b", "B")]
+
+        direct = MessageCoalescer(window=0.0, max_delay=1.0)
+        _, delivered, generate, deliver = _recorder()
+        await direct.submit("u", "a", generate, deliver)
+        await direct.submit("u", "b", generate, deliver)
+        assert delivered == [("a", "A"), ("b", "B")]
+
+    asyncio.run(scenario())
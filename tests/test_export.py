@@ -0,0 +1,132 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import utils.db as db
+import utils.export as export
+from utils.db import _append_json_line, _save_json_map
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _collect(kind: str, fmt: str, **filters: object) -> List[str]:
+    async def scenario() -> List[str]:
+        return [piece async for piece in export.stream_export(None, kind, fmt, **filters)]
+
+    return asyncio.run(scenario())
+
+
+def _feedback(index: int, language: str = "ru", answer: str = "ok") -> dict:
+    return {
+        "tenant": "default",
+        "user_id": index,
+        "username": f"@user{index}",
+        "language": language,
+        "question": "How was it?",
+        "answer": answer,
+        "created_at": f"2026-01-{index % 28 + 1:02d}T12:00:00",
+    }
+
+
+def test_parse_date_treats_naive_values_as_utc() -> None:
+    assert export.parse_date("2026-01-02") == datetime(2026, 1, 2, tzinfo=timezone.utc)
+    assert export.parse_date("2026-01-02T10:00:00+03:00").utcoffset().total_seconds() == 3 * 3600
+    assert export.parse_date("") is None
+    with pytest.raises(ValueError):
+        export.parse_date("yesterday")
+
+
+def test_rows_are_streamed_in_chunks(data_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(export, "_CHUNK_ROWS", 3)
+    for index in range(7):
+        _append_json_line(str(data_dir / "feedback.jsonl"), _feedback(index))
+
+    pieces = _collect("feedback", "ndjson")
+    assert [piece.count("\n") for piece in pieces] == [3, 3, 1]
+    rows = [json.loads(line) for line in "".join(pieces).splitlines()]
+    assert [row["user_id"] for row in rows] == list(range(7))
+    assert list(rows[0]) == export.EXPORT_FIELDS["feedback"]
+
+
+def test_csv_has_a_header_and_escapes_values(data_dir: Path) -> None:
+    _append_json_line(str(data_dir / "feedback.jsonl"), _feedback(1, answer='Долго, но "полезно"\nспасибо'))
+    _append_json_line(str(data_dir / "feedback.jsonl"), dict(_feedback(2, language="en"), question=None))
+
+    rows = list(csv.reader(io.StringIO("".join(_collect("feedback", "csv")))))
+    assert rows[0] == export.EXPORT_FIELDS["feedback"]
+    assert rows[1][6] == 'Долго, но "полезно"\nспасибо'
+    # None becomes an empty cell rather than the string "None".
+    assert rows[2][5] == ""
+
+
+def test_filters_apply_to_local_feedback(data_dir: Path) -> None:
+    for index, language in enumerate(["ru", "en", "ru", "ru"]):
+        _append_json_line(str(data_dir / "feedback.jsonl"), _feedback(index, language))
+
+    pieces = _collect(
+        "feedback",
+        "ndjson",
+        since=export.parse_date("2026-01-02"),
+        until=export.parse_date("2026-01-04"),
+        language="ru",
+    )
+    assert [json.loads(line)["user_id"] for line in "".join(pieces).splitlines()] == [2]
+
+
+def test_local_user_states_are_read_entry_by_entry(data_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    states = {
+        str(index): {"free_used": True, "paid": index % 2 == 0, "updated_at": "2026-01-05T00:00:00"}
+        for index in range(5)
+    }
+    states["acme:7"] = {"free_used": False, "paid": True, "updated_at": "2026-01-05T00:00:00"}
+    _save_json_map(str(data_dir / "user_state.json"), states)
+    reads: List[int] = []
+    read_entries = db._read_json_map_entries
+
+    def counting(handle: object, limit: int) -> list:
+        entries = read_entries(handle, limit)
+        reads.append(len(entries))
+        return entries
+
+    monkeypatch.setattr(db, "_read_json_map_entries", counting)
+
+    async def scenario() -> list:
+        return [row async for row in db.iter_user_states(None, batch_size=2, tenant="default")]
+
+    rows = asyncio.run(scenario())
+    assert [row["user_id"] for row in rows] == [0, 1, 2, 3, 4]
+    assert rows[0] == {"tenant": "default", "user_id": 0, "free_used": True, "paid": True, "updated_at": "2026-01-05T00:00:00"}
+    assert reads == [2, 2, 2, 0]
+
+
+def test_legacy_user_state_file_is_still_exported(data_dir: Path) -> None:
+    (data_dir / "user_state.json").write_text(
+        json.dumps({"5": {"free_used": True, "paid": False, "updated_at": "2026-01-05T00:00:00"}}, indent=2),
+        encoding="utf-8",
+    )
+    pieces = _collect("user_state", "csv")
+    assert list(csv.reader(io.StringIO("".join(pieces))))[1] == ["default", "5", "True", "False", "2026-01-05T00:00:00"]
+
+
+def test_concurrent_exports_are_capped(data_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _append_json_line(str(data_dir / "feedback.jsonl"), _feedback(1))
+
+    async def scenario() -> None:
+        monkeypatch.setattr(export, "_EXPORT_SLOTS", asyncio.Semaphore(1))
+        stream = export.stream_export(None, "feedback", "csv")
+        await stream.__anext__()
+        assert export.export_busy()
+        assert [piece async for piece in stream]
+        assert not export.export_busy()
+
+    asyncio.run(scenario())
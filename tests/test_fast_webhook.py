@@ -0,0 +1,168 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+import utils.telegram as telegram
+from utils.fast_webhook import FastWebhookMiddleware
+from utils.telegram import accept_inline_reply, release_inline_reply, send_message
+
+SECRETS = {"": "top-secret", "acme": ""}
+
+
+class _App:
+    def __init__(self) -> None:
+        self.paths: List[str] = []
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        self.paths.append(scope["path"])
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+def _call(
+    middleware: FastWebhookMiddleware,
+    path: str = "/webhook",
+    body: bytes = b'{"update_id": 1}',
+    secret: Optional[str] = "top-secret",
+    method: str = "POST",
+) -> Tuple[int, bytes]:
+    headers = [(b"content-type", b"application/json")]
+    if secret is not None:
+        headers.append((b"x-telegram-bot-api-secret-token", secret.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+    # The body arrives in two parts to exercise more_body.
+    messages = [
+        {"type": "http.request", "body": body[:5], "more_body": True},
+        {"type": "http.request", "body": body[5:], "more_body": False},
+    ]
+    sent: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        return messages.pop(0)
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], sent[1].get("body", b"")
+
+
+def _middleware(dispatch: Any) -> Tuple[FastWebhookMiddleware, _App]:
+    app = _App()
+    return FastWebhookMiddleware(app, "/webhook", SECRETS.get, dispatch), app
+
+
+def test_wrong_or_missing_secret_is_rejected() -> None:
+    updates: List[Dict[str, Any]] = []
+    middleware, _ = _middleware(lambda update, name: updates.append(update) or 200)
+
+    assert _call(middleware, secret="wrong") == (403, b'{"ok":false}')
+    assert _call(middleware, secret=None)[0] == 403
+    assert updates == []
+
+    assert _call(middleware) == (200, b'{"ok":true}')
+    assert updates == [{"update_id": 1}]
+
+
+def test_bot_without_a_secret_accepts_any_request() -> None:
+    names: List[str] = []
+    middleware, _ = _middleware(lambda update, name: names.append(name) or 200)
+
+    assert _call(middleware, path="/webhook/acme", secret=None)[0] == 200
+    assert names == ["acme"]
+
+
+def test_other_requests_go_to_the_app() -> None:
+    middleware, app = _middleware(lambda update, name: 200)
+
+    assert _call(middleware, path="/webhook/unknown")[0] == 404
+    assert _call(middleware, method="GET")[0] == 404
+    assert _call(middleware, path="/webhook/acme/extra")[0] == 404
+    assert app.paths == ["/webhook/unknown", "/webhook", "/webhook/acme/extra"]
+
+
+def test_bad_bodies_and_dispatch_statuses() -> None:
+    middleware, _ = _middleware(lambda update, name: 429)
+    assert _call(middleware, body=b"not json")[0] == 400
+    assert _call(middleware, body=b"[1, 2]")[0] == 400
+    assert _call(middleware)[0] == 429
+
+    def broken(update: Dict[str, Any], name: str) -> int:
+        raise RuntimeError("queue is gone")
+
+    middleware, _ = _middleware(broken)
+    assert _call(middleware)[0] == 503
+
+
+def _handler(delay: float = 0.0, release: bool = False) -> Any:
+    """A dispatch that schedules an in-process handler answering with one inline message."""
+
+    async def handle(update: Dict[str, Any]) -> None:
+        await asyncio.sleep(delay)
+        if release:
+            release_inline_reply()
+        await send_message("token", 42, "Привет", inline=True)
+
+    def dispatch(update: Dict[str, Any], name: str) -> int:
+        accept_inline_reply()
+        asyncio.get_running_loop().create_task(handle(update))
+        return 200
+
+    return dispatch
+
+
+def test_inline_reply_is_returned_in_the_response(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(telegram, "INLINE_REPLY_BUDGET_MS", 500)
+    middleware, _ = _middleware(_handler())
+
+    status, body = _call(middleware)
+    assert status == 200
+    assert json.loads(body) == {"method": "sendMessage", "chat_id": 42, "text": "Привет"}
+
+
+def test_slow_or_released_handlers_get_a_plain_response(monkeypatch: pytest.MonkeyPatch) -> None:
+    sent: List[str] = []
+
+    class _Response:
+        def raise_for_status(self) -> None:
+            pass
+
+    class _Client:
+        async def post(self, url: str, json: Dict[str, Any]) -> _Response:
+            sent.append(json["text"])
+            return _Response()
+
+    monkeypatch.setattr(telegram, "INLINE_REPLY_BUDGET_MS", 20)
+    monkeypatch.setattr(telegram, "_client", _Client)
+    stats = dict(telegram._STATS)
+
+    async def scenario(dispatch: Any) -> Tuple[int, bytes]:
+        middleware, _ = _middleware(dispatch)
+        headers = [(b"x-telegram-bot-api-secret-token", b"top-secret")]
+        scope = {"type": "http", "method": "POST", "path": "/webhook", "headers": headers}
+        responses: List[Dict[str, Any]] = []
+
+        async def receive() -> Dict[str, Any]:
+            return {"type": "http.request", "body": b'{"update_id": 1}'}
+
+        async def send(message: Dict[str, Any]) -> None:
+            responses.append(message)
+
+        await middleware(scope, receive, send)
+        # Let the handler finish and send its message the regular way.
+        await asyncio.sleep(0.1)
+        return responses[0]["status"], responses[1]["body"]
+
+    assert asyncio.run(scenario(_handler(delay=0.05))) == (200, b'{"ok":true}')
+    assert asyncio.run(scenario(_handler(release=True))) == (200, b'{"ok":true}')
+    assert sent == ["Привет", "Привет"]
+    assert telegram._STATS["inline_timeouts"] == stats["inline_timeouts"] + 1
+    assert telegram._STATS["inline_released"] == stats["inline_released"] + 1
+
+
+def test_disabled_budget_answers_plainly(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(telegram, "INLINE_REPLY_BUDGET_MS", 0)
+    middleware, _ = _middleware(lambda update, name: 200)
+    assert _call(middleware) == (200, b'{"ok":true}')
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+import utils.jobs as jobs
+
+
+@pytest.fixture
+def backend(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> jobs._SqliteBackend:
+    backend = jobs._SqliteBackend(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_BACKEND", backend)
+    monkeypatch.setattr(jobs, "_STATS", {})
+    monkeypatch.setattr(jobs, "_backoff", lambda attempts: 0.0)
+    return backend
+
+
+def test_enqueue_is_idempotent_per_key(backend: jobs._SqliteBackend) -> None:
+    async def scenario() -> None:
+        assert await jobs.enqueue_job("grade", "k", {"n": 1})
+        assert await jobs.enqueue_job("grade", "k", {"n": 2})
+        job = await backend.claim(["grade"])
+        assert job.payload == {"n": 1}
+        assert await backend.claim(["grade"]) is None
+
+    asyncio.run(scenario())
+    assert jobs.job_metrics()["kinds"]["grade"]["duplicates"] == 1
+
+
+def test_expired_claim_is_reclaimed_and_the_old_worker_fenced(
+    backend: jobs._SqliteBackend, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(jobs, "JOB_VISIBILITY_TIMEOUT", 0.05)
+
+    async def scenario() -> None:
+        await jobs.enqueue_job("grade", "k", {})
+        first = await backend.claim(["grade"])
+        assert await backend.claim(["grade"]) is None
+
+        await asyncio.sleep(0.1)
+        second = await backend.claim(["grade"])
+        assert (second.id, second.attempts) == (first.id, 2)
+
+        # The first worker's late result must not overwrite the new attempt.
+        assert not await backend.finish(first, "done", '{"by": "first"}', None, 0.0)
+        assert await backend.finish(second, "done", '{"by": "second"}', None, 0.0)
+        assert await jobs.job_status("k") == ("done", {"by": "second"})
+
+    asyncio.run(scenario())
+
+
+def test_failures_retry_then_dead_letter(backend: jobs._SqliteBackend, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    dead: List[Dict[str, Any]] = []
+
+    async def handler(payload: Dict[str, Any]) -> None:
+        raise RuntimeError("upstream down")
+
+    async def on_dead(payload: Dict[str, Any]) -> None:
+        dead.append(payload)
+
+    monkeypatch.setitem(jobs._HANDLERS, "grade", (handler, on_dead))
+
+    async def scenario() -> None:
+        await jobs.enqueue_job("grade", "k", {"user_id": 1})
+        await jobs._execute(await backend.claim(["grade"]))
+        assert await jobs.job_status("k") == ("queued", None)
+        assert dead == []
+
+        await jobs._execute(await backend.claim(["grade"]))
+        assert await jobs.job_status("k") == ("dead", None)
+        assert await backend.claim(["grade"]) is None
+
+    asyncio.run(scenario())
+    assert dead == [{"user_id": 1}]
+    assert jobs.job_metrics()["kinds"]["grade"]["retried"] == 1
+    assert jobs.job_metrics()["kinds"]["grade"]["dead"] == 1
+
+
+def test_worker_that_died_on_the_last_attempt_is_dead_lettered(
+    backend: jobs._SqliteBackend, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(jobs, "JOB_VISIBILITY_TIMEOUT", 0.05)
+    calls: List[Dict[str, Any]] = []
+
+    async def handler(payload: Dict[str, Any]) -> None:
+        calls.append(payload)
+
+    monkeypatch.setitem(jobs._HANDLERS, "grade", (handler, None))
+
+    async def scenario() -> None:
+        await jobs.enqueue_job("grade", "k", {})
+        await backend.claim(["grade"])
+        await asyncio.sleep(0.1)
+        await jobs._execute(await backend.claim(["grade"]))
+        assert (await jobs.job_status("k"))[0] == "dead"
+
+    asyncio.run(scenario())
+    assert calls == []
+
+
+def test_cancelled_job_is_not_finished_or_dead_lettered(
+    backend: jobs._SqliteBackend, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+    dead: List[Dict[str, Any]] = []
+
+    async def on_dead(payload: Dict[str, Any]) -> None:
+        dead.append(payload)
+
+    async def scenario() -> None:
+        await jobs.enqueue_job("grade", "k", {})
+        job = await backend.claim(["grade"])
+
+        async def handler(payload: Dict[str, Any]) -> None:
+            assert await jobs.cancel_job("k")
+            raise RuntimeError("failed after the user reset")
+
+        monkeypatch.setitem(jobs._HANDLERS, "grade", (handler, on_dead))
+        await jobs._execute(job)
+        assert await jobs.job_status("k") == ("cancelled", None)
+        assert not await jobs.cancel_job("k")
+        assert await backend.claim(["grade"]) is None
+
+    asyncio.run(scenario())
+    assert dead == []
+
+
+def test_purge_keeps_pending_jobs(backend: jobs._SqliteBackend) -> None:
+    async def scenario() -> None:
+        for key in ("done", "cancelled", "queued"):
+            await jobs.enqueue_job("grade", key, {})
+        await backend.finish(await backend.claim(["grade"]), "done", None, None, 0.0)
+        await jobs.cancel_job("cancelled")
+        time.sleep(0.01)
+        await backend.purge(0.0)
+        assert await jobs.job_status("done") == (None, None)
+        assert await jobs.job_status("cancelled") == (None, None)
+        assert (await jobs.job_status("queued"))[0] == "queued"
+
+    asyncio.run(scenario())
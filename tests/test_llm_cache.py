@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+import utils.llm as llm
+from utils.llm_cache import LLMCache, LLMCacheMiss
+
+
+def _cache(tmp_path: Path, mode: str = "on", **overrides: int) -> LLMCache:
+    settings = {"ttl": 3600, "max_bytes": 1024 * 1024, "memory_items": 16}
+    settings.update(overrides)
+    return LLMCache(mode, {"grade"}, str(tmp_path / "cache.sqlite3"), **settings)
+
+
+def _age(cache: LLMCache, key: str, seconds: float) -> None:
+    created_at = time.time() - seconds
+    if key in cache._memory:
+        cache._memory[key] = (cache._memory[key][0], created_at)
+    cache._connect().execute("UPDATE llm_cache SET created_at = ? WHERE key = ?", (created_at, key))
+
+
+def test_key_depends_on_engine_model_prompt_and_temperature_bucket() -> None:
+    key = LLMCache.key("grade", "gpt", "prompt", 0.2)
+    assert key == LLMCache.key("grade", "gpt", "prompt", 0.21)
+    assert key != LLMCache.key("grade", "gpt", "prompt", 0.3)
+    assert key != LLMCache.key("feedback", "gpt", "prompt", 0.2)
+    assert key != LLMCache.key("grade", "gpt-mini", "prompt", 0.2)
+    assert key != LLMCache.key("grade", "gpt", "prompt!", 0.2)
+
+
+def test_enabled_engines_per_mode(tmp_path: Path) -> None:
+    assert _cache(tmp_path).enabled_for("grade")
+    assert not _cache(tmp_path).enabled_for("dialog")
+    assert _cache(tmp_path, "replay").enabled_for("dialog")
+    assert not _cache(tmp_path, "off").enabled_for("grade")
+
+
+def test_entries_expire_after_ttl(tmp_path: Path) -> None:
+    cache = _cache(tmp_path, ttl=60)
+
+    async def scenario() -> None:
+        await cache.put("grade", "k", "answer")
+        assert await cache.get("grade", "k") == "answer"
+        _age(cache, "k", 120)
+        assert await cache.get("grade", "k") is None
+
+    asyncio.run(scenario())
+    assert cache.metrics()["engines"]["grade"]["misses"] == 1
+
+
+def test_memory_lru_falls_back_to_disk(tmp_path: Path) -> None:
+    cache = _cache(tmp_path, memory_items=2)
+
+    async def scenario() -> None:
+        for key in ("a", "b", "c"):
+            await cache.put("grade", key, f"answer {key}")
+        assert list(cache._memory) == ["b", "c"]
+        assert await cache.get("grade", "a") == "answer a"
+        # The disk hit is remembered and pushes out the least recently used key.
+        assert list(cache._memory) == ["c", "a"]
+
+    asyncio.run(scenario())
+    stats = cache.metrics()["engines"]["grade"]
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 0)
+
+
+def test_store_is_trimmed_to_the_size_cap_by_last_access(tmp_path: Path) -> None:
+    cache = _cache(tmp_path, max_bytes=4000, memory_items=0)
+
+    async def scenario() -> None:
+        await cache.put("grade", "first", os.urandom(400).hex())
+        for index in range(10):
+            time.sleep(0.002)
+            await cache.put("grade", f"k{index}", os.urandom(400).hex())
+            if index % 3 == 0:
+                # Reading "first" keeps it recent, so the others go before it.
+                assert await cache.get("grade", "first") is not None
+        assert await cache.get("grade", "first") is not None
+        assert await cache.get("grade", "k0") is None
+
+    asyncio.run(scenario())
+    assert 0 < cache.metrics()["disk_bytes"] <= 4000
+
+
+def test_record_mode_only_writes_and_replay_never_expires(tmp_path: Path) -> None:
+    recorder = _cache(tmp_path, "record", ttl=60)
+
+    async def scenario() -> None:
+        await recorder.put("dialog", "k", "recorded")
+        assert await recorder.get("dialog", "k") is None
+
+        replay = _cache(tmp_path, "replay", ttl=60)
+        _age(replay, "k", 3600)
+        assert await replay.get("dialog", "k") == "recorded"
+        await replay.put("dialog", "other", "not stored")
+        assert await replay.get("dialog", "other") is None
+
+    asyncio.run(scenario())
+
+
+def test_replay_miss_fails_without_calling_the_model(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    class _Client:
+        class responses:
+            @staticmethod
+            def create(**kwargs: object) -> None:
+                raise AssertionError("the model must not be called while replaying")
+
+    monkeypatch.setattr(llm, "LLM_CACHE", _cache(tmp_path, "replay"))
+    monkeypatch.setattr(llm, "client", _Client())
+
+    with pytest.raises(LLMCacheMiss):
+        asyncio.run(llm.complete("grade", "gpt", "never recorded", 0.2))
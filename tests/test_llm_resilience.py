@@ -0,0 +1,126 @@
+import asyncio
+from typing import List, Tuple
+
+import httpx
+import openai
+import pytest
+
+import utils.llm as llm
+from utils.executors import ExecutorOverloaded
+
+_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/responses")
+
+
+def _status_error(status: int) -> openai.APIStatusError:
+    return openai.APIStatusError("error", response=httpx.Response(status, request=_REQUEST), body=None)
+
+
+class _Scheduler:
+    def __init__(self) -> None:
+        self.capacities: List[int] = []
+
+    def set_capacity(self, capacity: int) -> None:
+        self.capacities.append(capacity)
+
+
+@pytest.fixture
+def breaker(monkeypatch: pytest.MonkeyPatch) -> llm._CircuitBreaker:
+    monkeypatch.setattr(llm, "LLM_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(llm, "LLM_BREAKER_COOLDOWN", 30.0)
+    return llm._CircuitBreaker()
+
+
+def test_breaker_opens_after_consecutive_failures(breaker: llm._CircuitBreaker) -> None:
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert not breaker.available()
+    assert breaker.opened_count == 1
+
+
+def test_breaker_lets_one_probe_through_after_cooldown(breaker: llm._CircuitBreaker) -> None:
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.opened_at -= 31.0
+
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    # A cancelled probe hands its turn to the next caller.
+    breaker.release_probe()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened_count == 2
+
+    breaker.opened_at -= 31.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_stuck_probe_expires_after_call_timeout(breaker: llm._CircuitBreaker) -> None:
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.opened_at -= 31.0
+    assert breaker.allow()
+    breaker.probe_started -= llm.LLM_CALL_TIMEOUT + 1
+    assert breaker.allow()
+
+
+def test_adaptive_limit_decreases_on_overload_and_recovers(monkeypatch: pytest.MonkeyPatch) -> None:
+    scheduler = _Scheduler()
+    monkeypatch.setattr(llm, "LLM_SCHEDULER", scheduler)
+    monkeypatch.setattr(llm, "LLM_LATENCY_TARGET", 5.0)
+    limiter = llm._AdaptiveLimit(minimum=2, maximum=10)
+
+    limiter.on_overload()
+    assert limiter.limit == pytest.approx(7.0)
+    # A burst of failures within a second counts once.
+    limiter.on_overload()
+    assert limiter.limit == pytest.approx(7.0)
+
+    limiter._last_decrease -= 2.0
+    limiter.on_success(latency=6.0)
+    assert limiter.limit == pytest.approx(4.9)
+
+    for _ in range(3):
+        limiter._last_decrease -= 2.0
+        limiter.on_overload()
+    assert limiter.limit == 2.0
+
+    limiter.on_success(latency=0.1)
+    assert limiter.limit == pytest.approx(2.5)
+    for _ in range(200):
+        limiter.on_success(latency=0.1)
+    assert limiter.limit == 10.0
+    assert scheduler.capacities[:3] == [7, 4, 3]
+    assert scheduler.capacities[-1] == 10
+
+
+@pytest.mark.parametrize(
+    "exc, expected",
+    [
+        (asyncio.TimeoutError(), (True, True)),
+        (openai.APITimeoutError(request=_REQUEST), (True, True)),
+        (ExecutorOverloaded("llm"), (True, True)),
+        (openai.APIConnectionError(request=_REQUEST), (True, False)),
+        (_status_error(429), (True, True)),
+        (_status_error(503), (True, True)),
+        (_status_error(400), (False, False)),
+        (ValueError("bad prompt"), (False, False)),
+    ],
+)
+def test_classify(exc: Exception, expected: Tuple[bool, bool]) -> None:
+    assert llm._classify(exc) == expected
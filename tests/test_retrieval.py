@@ -0,0 +1,77 @@
+import json
+
+from utils.retrieval import MatrixIndex, build_chunks, build_index, tokenize
+
+_MARKDOWN = """# Matrix
+
+## Research
+Runs user interviews and usability testing, synthesises insights.
+
+## Visual design
+Builds typography, colour and layout for the UI kit.
+
+## Leadership
+Hires designers, runs one-on-ones and grows the team.
+
+## Metrics
+Defines product metrics and reads experiment results.
+"""
+
+_MATRIX = {
+    "levels": [{"id": "middle", "title_en": "Middle"}, {"id": "senior", "title_en": "Senior"}],
+    "competencies": [
+        {
+            "id": "research",
+            "title_en": "Research",
+            "expectations": {"middle": {"en": ["Runs interviews"]}, "senior": {"en": ["Plans research programs"]}},
+        }
+    ],
+    "specializations": {"en": ["Product", "Brand"]},
+}
+
+
+def _ids(chunks: list) -> list:
+    return [chunk["id"] for chunk in chunks]
+
+
+def test_tokenize_stems_and_drops_noise() -> None:
+    assert tokenize("Metrics, metric и метрики 2024 a") == ["metric", "metric", "метрик"]
+
+
+def test_search_ranks_matching_sections_first() -> None:
+    index = build_index([("matrix.md", _MARKDOWN)])
+
+    assert _ids(index.search("usability interviews", 2))[0] == "matrix.md#0.0"
+    assert _ids(index.search("hires designers for the team", 1)) == ["matrix.md#2.0"]
+    assert index.search("blockchain", 3) == []
+
+
+def test_rare_terms_outweigh_common_ones() -> None:
+    chunks = [
+        {"id": "a", "text": "design design design review", "pinned": False},
+        {"id": "b", "text": "design accessibility", "pinned": False},
+        {"id": "c", "text": "design process", "pinned": False},
+    ]
+    index = MatrixIndex(chunks)
+    assert _ids(index.search("design accessibility", 3))[0] == "b"
+
+
+def test_context_keeps_file_order_and_budget() -> None:
+    index = build_index([("matrix.md", _MARKDOWN)])
+
+    context = index.context_for("metrics research", 2)
+    assert context.index("Research") < context.index("Metrics")
+    assert index.context_for("metrics research", 2, max_chars=80).count("\n\n") == 0
+    assert index.context_for("   ", 2) == ""
+
+
+def test_structured_matrix_is_pinned_and_not_retrieved() -> None:
+    chunks = build_chunks([("unified.json", json.dumps(_MATRIX)), ("matrix.md", _MARKDOWN)])
+    index = MatrixIndex(chunks)
+
+    assert _ids(chunk for chunk in chunks if chunk["pinned"]) == ["unified.json#overview", "unified.json#summary"]
+    static = index.static_context()
+    assert "Research [research] — Middle [middle]: Runs interviews | Senior [senior]: Plans research programs" in static
+    assert "Specializations (en): Product, Brand" in static
+    # The summary already carries every expectation, so only Markdown is retrieved.
+    assert all(chunk["id"].startswith("matrix.md") for chunk in index.search("research interviews", 5))
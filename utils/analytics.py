@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, DefaultDict, Dict, Optional, Tuple
+
+import asyncpg
+
+from utils.db import _acquire
+from utils.env import env_float, env_int
+from utils.executors import STORAGE_EXECUTOR
+from utils.paths import data_path
+from utils.tenants import current_tenant
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no cross-process locking off POSIX
+    fcntl = None
+
+logger = logging.getLogger("designer_grade_bot.analytics")
+
+
+ANALYTICS_FLUSH_INTERVAL = env_float("ANALYTICS_FLUSH_INTERVAL", 10.0, 1.0)
+# The local file keeps hourly buckets this long and folds older ones into days.
+ANALYTICS_HOURLY_DAYS = env_int("ANALYTICS_HOURLY_DAYS", 14, 1)
+
+_ANSWER_BUCKETS = (3, 5, 8, 12, 20)
+_HOUR_FORMAT = "%Y-%m-%dT%H"
+_DAY_FORMAT = "%Y-%m-%d"
+
+# (hour bucket, tenant, metric, dimension) -> count not yet persisted.
+Key = Tuple[str, str, str, str]
+_PENDING: DefaultDict[Key, int] = defaultdict(int)
+# Counters being written by the current flush, still counted by reports.
+_IN_FLIGHT: Dict[Key, int] = {}
+_POOL: Optional[asyncpg.Pool] = None
+_TASK: Optional[asyncio.Task] = None
+_FLUSH_LOCK = asyncio.Lock()
+
+_UPSERT = """
+    INSERT INTO analytics_rollups (bucket, tenant, metric, dimension, value)
+    SELECT * FROM unnest($1::timestamptz[], $2::text[], $3::text[], $4::text[], $5::bigint[])
+    ON CONFLICT (tenant, metric, bucket, dimension)
+    DO UPDATE SET value = analytics_rollups.value + EXCLUDED.value
+"""
+
+
+def track(metric: str, dimension: str = "", amount: int = 1) -> None:
+    """Adds to a counter of the current tenant in the current hour; O(1), no I/O."""
+    bucket = datetime.now(timezone.utc).strftime(_HOUR_FORMAT)
+    _PENDING[(bucket, current_tenant().id, metric, dimension)] += amount
+
+
+def _answers_label(answers: int) -> str:
+    lower = 1
+    for bound in _ANSWER_BUCKETS:
+        if answers <= bound:
+            return f"{lower}-{bound}"
+        lower = bound + 1
+    return f"{lower}+"
+
+
+def track_grade(grade: str, language: str, answers: int) -> None:
+    track("graded", language)
+    track("grades", f"{grade}/{language}")
+    track("answers_per_interview", _answers_label(answers))
+    track("graded_answers", "", answers)
+
+
+def _parse_bucket(bucket: str) -> datetime:
+    fmt = _HOUR_FORMAT if "T" in bucket else _DAY_FORMAT
+    return datetime.strptime(bucket, fmt).replace(tzinfo=timezone.utc)
+
+
+def _merge_local(path: str, deltas: Dict[Key, int]) -> None:
+    # Shard workers share the file, so the read-merge-write runs under a file lock.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a", encoding="utf-8") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        data: Dict[str, int] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+            except json.JSONDecodeError:
+                logger.error("Analytics file %s is corrupt; starting over", path)
+        for key, value in deltas.items():
+            name = "|".join(key)
+            data[name] = data.get(name, 0) + value
+
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=ANALYTICS_HOURLY_DAYS)).strftime(_HOUR_FORMAT)
+        for name in [name for name in data if "T" in name.split("|", 1)[0] and name < cutoff]:
+            bucket, rest = name.split("|", 1)
+            day = f"{bucket.split('T', 1)[0]}|{rest}"
+            data[day] = data.get(day, 0) + data.pop(name)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+
+def _load_local(path: str) -> Dict[Key, int]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except json.JSONDecodeError:
+        return {}
+    rows: Dict[Key, int] = {}
+    for name, value in data.items():
+        parts = name.split("|", 3)
+        if len(parts) == 4:
+            rows[tuple(parts)] = int(value)
+    return rows
+
+
+async def flush_analytics() -> None:
+    """Persists pending counters; on failure they are kept for the next flush."""
+    async with _FLUSH_LOCK:
+        if not _PENDING:
+            return
+        deltas = dict(_PENDING)
+        _PENDING.clear()
+        _IN_FLIGHT.update(deltas)
+        try:
+            if _POOL is None:
+                await STORAGE_EXECUTOR.run(_merge_local, data_path("analytics.json"), deltas)
+            else:
+                keys = list(deltas)
+                async with _acquire(_POOL) as conn:
+                    await conn.execute(
+                        _UPSERT,
+                        [_parse_bucket(key[0]) for key in keys],
+                        [key[1] for key in keys],
+                        [key[2] for key in keys],
+                        [key[3] for key in keys],
+                        [deltas[key] for key in keys],
+                    )
+        except Exception:
+            logger.exception("Failed to persist %d analytics counter(s); will retry", len(deltas))
+            for key, value in deltas.items():
+                _PENDING[key] += value
+        finally:
+            _IN_FLIGHT.clear()
+
+
+async def _run_flusher() -> None:
+    while True:
+        await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+        await flush_analytics()
+
+
+def start_analytics(pool: Optional[asyncpg.Pool]) -> None:
+    global _POOL, _TASK, _FLUSH_LOCK
+
+    _POOL = pool
+    if _TASK is None:
+        _FLUSH_LOCK = asyncio.Lock()
+        _TASK = asyncio.create_task(_run_flusher())
+
+
+async def close_analytics() -> None:
+    global _TASK
+
+    if _TASK is not None:
+        _TASK.cancel()
+        _TASK = None
+    await flush_analytics()
+
+
+async def _stored_rows(
+    since: Optional[datetime], until: Optional[datetime], tenant: Optional[str]
+) -> Dict[Key, int]:
+    if _POOL is None:
+        return await STORAGE_EXECUTOR.run(_load_local, data_path("analytics.json"))
+    async with _acquire(_POOL) as conn:
+        rows = await conn.fetch(
+            """
+            SELECT bucket, tenant, metric, dimension, value FROM analytics_rollups
+            WHERE ($1::timestamptz IS NULL OR bucket >= $1)
+              AND ($2::timestamptz IS NULL OR bucket < $2)
+              AND ($3::text IS NULL OR tenant = $3)
+            """,
+            since,
+            until,
+            tenant,
+        )
+    return {
+        (row["bucket"].astimezone(timezone.utc).strftime(_HOUR_FORMAT), row["tenant"], row["metric"], row["dimension"]): row["value"]
+        for row in rows
+    }
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+async def analytics_report(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    tenant: Optional[str] = None,
+    granularity: str = "day",
+) -> Dict[str, Any]:
+    """
+    Sums the stored rollups and this process's unflushed counters. Counters of
+    other processes appear after their next flush. `granularity` is "hour",
+    "day" or "total" (no series).
+    """
+    rows = await _stored_rows(since, until, tenant)
+    for pending in (_IN_FLIGHT, _PENDING):
+        for key, value in pending.items():
+            rows[key] = rows.get(key, 0) + value
+
+    totals: DefaultDict[str, DefaultDict[str, int]] = defaultdict(lambda: defaultdict(int))
+    series: DefaultDict[str, DefaultDict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for (bucket, row_tenant, metric, dimension), value in rows.items():
+        if tenant is not None and row_tenant != tenant:
+            continue
+        at = _parse_bucket(bucket)
+        if (since is not None and at < since) or (until is not None and at >= until):
+            continue
+        totals[metric][dimension] += value
+        if granularity == "hour" and "T" in bucket:
+            series[bucket][metric] += value
+        elif granularity in {"hour", "day"}:
+            series[bucket.split("T", 1)[0]][metric] += value
+
+    def total(metric: str) -> int:
+        return sum(totals.get(metric, {}).values())
+
+    started, graded = total("interviews_started"), total("graded")
+    report: Dict[str, Any] = {
+        "totals": {metric: dict(dimensions) for metric, dimensions in sorted(totals.items())},
+        "funnel": {
+            "interviews_started": started,
+            "answers": total("answers"),
+            "graded": graded,
+            "payments": total("payments"),
+            "feedback": total("feedback"),
+            "completion_rate": _ratio(graded, started),
+            "payment_rate": _ratio(total("payments"), graded),
+            "feedback_rate": _ratio(total("feedback"), graded),
+            "answers_per_interview": _ratio(total("graded_answers"), graded),
+        },
+    }
+    if granularity in {"hour", "day"}:
+        report["series"] = [dict(metrics, bucket=bucket) for bucket, metrics in sorted(series.items())]
+    return report
+
+
+def analytics_metrics() -> Dict[str, Any]:
+    return {"pending": len(_PENDING), "backend": "file" if _POOL is None else "postgres"}
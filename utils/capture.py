@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from utils.env import env_float
+
+logger = logging.getLogger("designer_grade_bot.capture")
+
+# Directory for captured updates; empty disables capture.
+CAPTURE_UPDATES_DIR = os.getenv("CAPTURE_UPDATES_DIR", "")
+CAPTURE_SAMPLE_RATE = min(1.0, env_float("CAPTURE_SAMPLE_RATE", 1.0))
+# Keys the pseudonymous ids. A random per-process key keeps ids consistent
+# within one capture file but unlinkable across restarts.
+CAPTURE_SALT = (os.getenv("CAPTURE_SALT") or os.urandom(16).hex()).encode("utf-8")
+
+_MAX_QUEUED = 10000
+_FLUSH_INTERVAL = 1.0
+# Replies the bot matches literally; everything else is masked.
+_KEEP_TEXT = {"ru", "en", "русский", "english", "пройти заново", "retake"}
+
+
+def _pseudonym(value: Any) -> int:
+    digest = hmac.new(CAPTURE_SALT, str(value).encode("utf-8"), hashlib.sha256).digest()
+    return int.from_bytes(digest[:6], "big")
+
+
+def _mask_text(text: str) -> str:
+    """
+    Keeps commands and button replies; masks every other letter or digit while
+    preserving script, length and whitespace, so sizes stay realistic.
+    """
+    stripped = text.strip()
+    if stripped.startswith("/") or stripped.lower() in _KEEP_TEXT:
+        return text
+    masked = []
+    for char in text:
+        if char.isdigit():
+            masked.append("0")
+        elif char.isalpha():
+            masked.append("ж" if "Ѐ" <= char <= "ӿ" else "x")
+        else:
+            masked.append(char)
+    return "".join(masked)
+
+
+def anonymize_update(update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Reduces an update to the fields the bot reads, with ids and text anonymized."""
+    message = update.get("message") or update.get("edited_message")
+    if not isinstance(message, dict):
+        return None
+    user_id = (message.get("from") or {}).get("id")
+    chat_id = (message.get("chat") or {}).get("id")
+    if user_id is None or chat_id is None:
+        return None
+
+    result: Dict[str, Any] = {
+        "from": {"id": _pseudonym(user_id)},
+        "chat": {"id": _pseudonym(chat_id)},
+    }
+    text = message.get("text")
+    if isinstance(text, str):
+        result["text"] = _mask_text(text)
+    return {"update_id": update.get("update_id"), "message": result}
+
+
+def _sampled(update: Dict[str, Any]) -> bool:
+    if CAPTURE_SAMPLE_RATE >= 1.0:
+        return True
+    # Sampling by user keeps whole conversations together.
+    message = update.get("message") or update.get("edited_message") or {}
+    user_id = (message.get("from") or {}).get("id")
+    return _pseudonym(user_id) % 10000 < CAPTURE_SAMPLE_RATE * 10000
+
+
+class _Recorder:
+    """
+    Queues captured lines for a daemon thread that appends them to a gzip
+    NDJSON file, one file per process start.
+    """
+
+    def __init__(self, directory: str) -> None:
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(directory, f"updates-{stamp}-{os.getpid()}.ndjson.gz")
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=_MAX_QUEUED)
+        self._thread = threading.Thread(target=self._run, name="update-capture", daemon=True)
+        self.captured = 0
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+        logger.info("Capturing webhook updates to %s", self.path)
+
+    def submit(self, line: str) -> None:
+        try:
+            self._queue.put_nowait(line)
+            self.captured += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        with gzip.open(self.path, "at", encoding="utf-8") as file:
+            while True:
+                try:
+                    line = self._queue.get(timeout=_FLUSH_INTERVAL)
+                except queue.Empty:
+                    file.flush()
+                    continue
+                if line is None:
+                    break
+                file.write(line)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+
+_RECORDER: Optional[_Recorder] = None
+
+
+def capture_update(update: Dict[str, Any], tenant: str) -> None:
+    """Records an incoming update with its arrival time when capture is enabled."""
+    global _RECORDER
+
+    if not CAPTURE_UPDATES_DIR or not _sampled(update):
+        return
+    anonymized = anonymize_update(update)
+    if anonymized is None:
+        return
+    if _RECORDER is None:
+        _RECORDER = _Recorder(CAPTURE_UPDATES_DIR)
+    line = json.dumps({"ts": round(time.time(), 3), "tenant": tenant, "update": anonymized}, ensure_ascii=False)
+    _RECORDER.submit(line + "\n")
+
+
+def close_capture() -> None:
+    global _RECORDER
+
+    if _RECORDER is not None:
+        _RECORDER.close()
+        _RECORDER = None
+
+
+def capture_metrics() -> Dict[str, Any]:
+    if _RECORDER is None:
+        return {"enabled": bool(CAPTURE_UPDATES_DIR)}
+    return {"enabled": True, "file": _RECORDER.path, "captured": _RECORDER.captured, "dropped": _RECORDER.dropped}
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from utils.env import env_float
+
+logger = logging.getLogger("designer_grade_bot.coalesce")
+
+# Quiet period after the latest message before a turn is answered; 0 disables.
+COALESCE_WINDOW_SECONDS = env_float("COALESCE_WINDOW_SECONDS", 1.5)
+
+# Upper bound on the wait from the first message of a turn, so a user who
+# keeps typing still gets an answer.
+COALESCE_MAX_DELAY_SECONDS = env_float("COALESCE_MAX_DELAY_SECONDS", 6.0)
+
+GenerateFn = Callable[[str], Awaitable[Any]]
+DeliverFn = Callable[[str, Any], Awaitable[None]]
+
+
+class _Turn:
+    __slots__ = ("parts", "started", "task", "generating", "done")
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.started = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+        self.generating = False
+        self.done: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+
+
+class MessageCoalescer:
+    """
+    Merges text messages of one key that arrive within the quiet period into a
+    single turn. A turn is answered in two steps: `generate(text)` may be
+    cancelled and restarted with the merged text when more messages arrive,
+    `deliver(text, result)` runs once the turn is closed and is never cancelled.
+    """
+
+    def __init__(self, window: float, max_delay: float) -> None:
+        self._window = window
+        self._max_delay = max_delay
+        self._turns: Dict[Hashable, _Turn] = {}
+        self._stats = {"turns": 0, "messages": 0, "merged": 0, "superseded": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._window > 0
+
+    async def submit(self, key: Hashable, text: str, generate: GenerateFn, deliver: DeliverFn) -> None:
+        """Adds a message to the key's open turn and waits until that turn is answered."""
+        self._stats["messages"] += 1
+        if not self.enabled:
+            self._stats["turns"] += 1
+            await deliver(text, await generate(text))
+            return
+
+        turn = self._turns.get(key)
+        if turn is None:
+            turn = self._turns[key] = _Turn()
+            self._stats["turns"] += 1
+        else:
+            self._stats["merged"] += 1
+            if turn.generating:
+                self._stats["superseded"] += 1
+            turn.task.cancel()
+        turn.parts.append(text)
+        turn.task = asyncio.create_task(self._answer(key, turn, generate, deliver))
+        # Shielded so a cancelled caller does not cancel the shared turn.
+        await asyncio.shield(turn.done)
+
+    async def _answer(self, key: Hashable, turn: _Turn, generate: GenerateFn, deliver: DeliverFn) -> None:
+        turn.generating = False
+        try:
+            remaining = turn.started + self._max_delay - time.monotonic()
+            await asyncio.sleep(max(0.0, min(self._window, remaining)))
+            text = "\n".join(turn.parts)
+            turn.generating = True
+            result = await generate(text)
+            # From here on new messages open a new turn instead of cancelling this one.
+            self._turns.pop(key, None)
+            await deliver(text, result)
+        except asyncio.CancelledError:
+            if turn.task is asyncio.current_task():
+                # Cancelled from outside (shutdown), not superseded by a newer message.
+                self._close(key, turn)
+            raise
+        except Exception:
+            logger.exception("Coalesced turn failed")
+        self._close(key, turn)
+
+    def _close(self, key: Hashable, turn: _Turn) -> None:
+        if self._turns.get(key) is turn:
+            self._turns.pop(key)
+        if not turn.done.done():
+            turn.done.set_result(None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return dict(self._stats, open=len(self._turns), window_seconds=self._window)
+
+
+COALESCER = MessageCoalescer(COALESCE_WINDOW_SECONDS, COALESCE_MAX_DELAY_SECONDS)
@@ -2,18 +2,306 @@ import asyncio
 import json
 import logging
 import os
-from datetime import datetime
-from typing import Any, Dict, Optional
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
 
 import asyncpg
 
+from utils.env import env_float, env_int
+from utils.executors import STORAGE_EXECUTOR
 from utils.paths import data_path
+from utils.tenants import DEFAULT_TENANT
+from utils.tracing import traced
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no cross-process locking off POSIX
+    fcntl = None
 
 logger = logging.getLogger("designer_grade_bot.db")
 
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
 
+DB_POOL_MIN_SIZE = env_int("DB_POOL_MIN_SIZE", 1)
+DB_POOL_MAX_SIZE = max(DB_POOL_MIN_SIZE, env_int("DB_POOL_MAX_SIZE", 5, minimum=1))
+DB_ACQUIRE_TIMEOUT = env_float("DB_ACQUIRE_TIMEOUT", 5.0, minimum=0.1)
+DB_COMMAND_TIMEOUT = env_float("DB_COMMAND_TIMEOUT", 10.0, minimum=0.1)
+DB_STATEMENT_CACHE_SIZE = env_int("DB_STATEMENT_CACHE_SIZE", 100)
+DB_MAX_INACTIVE_LIFETIME = env_float("DB_MAX_INACTIVE_LIFETIME", 300.0)
+DB_BATCH_SIZE = env_int("DB_BATCH_SIZE", 200, minimum=1)
+DB_BATCH_MAX_PENDING = env_int("DB_BATCH_MAX_PENDING", 20000, minimum=1)
+DB_FLUSH_INTERVAL = env_float("DB_FLUSH_INTERVAL", 1.0, minimum=0.05)
+
+# Arbitrary constant shared by every process that runs migrations.
+_MIGRATION_LOCK_ID = 734_210_001
+
+MIGRATIONS: List[Tuple[int, str]] = [
+    (
+        1,
+        """
+        CREATE TABLE IF NOT EXISTS feedback (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            username TEXT,
+            language TEXT,
+            question TEXT,
+            answer TEXT,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS user_state (
+            user_id BIGINT PRIMARY KEY,
+            free_used BOOLEAN DEFAULT FALSE,
+            paid BOOLEAN DEFAULT FALSE,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """,
+    ),
+    (
+        2,
+        """
+        CREATE INDEX IF NOT EXISTS feedback_user_id_idx ON feedback (user_id);
+        CREATE INDEX IF NOT EXISTS feedback_created_at_idx ON feedback (created_at);
+        """,
+    ),
+    (
+        3,
+        """
+        CREATE TABLE IF NOT EXISTS events (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT,
+            event TEXT NOT NULL,
+            payload JSONB,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        );
+
+        CREATE INDEX IF NOT EXISTS events_event_created_at_idx ON events (event, created_at);
+        CREATE INDEX IF NOT EXISTS events_user_id_idx ON events (user_id);
+        """,
+    ),
+    (
+        4,
+        """
+        ALTER TABLE user_state ADD COLUMN IF NOT EXISTS last_report JSONB;
+        ALTER TABLE user_state ADD COLUMN IF NOT EXISTS report_updated_at TIMESTAMPTZ;
+        """,
+    ),
+    (
+        5,
+        """
+        ALTER TABLE user_state ADD COLUMN IF NOT EXISTS tenant TEXT NOT NULL DEFAULT 'default';
+        ALTER TABLE user_state DROP CONSTRAINT IF EXISTS user_state_pkey;
+        ALTER TABLE user_state ADD PRIMARY KEY (tenant, user_id);
+
+        ALTER TABLE feedback ADD COLUMN IF NOT EXISTS tenant TEXT NOT NULL DEFAULT 'default';
+        ALTER TABLE events ADD COLUMN IF NOT EXISTS tenant TEXT NOT NULL DEFAULT 'default';
+        CREATE INDEX IF NOT EXISTS events_tenant_created_at_idx ON events (tenant, created_at);
+        """,
+    ),
+    (
+        6,
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL UNIQUE,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            locked_until TIMESTAMPTZ,
+            last_error TEXT,
+            result JSONB,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+
+        CREATE INDEX IF NOT EXISTS jobs_ready_idx ON jobs (run_at) WHERE status IN ('queued', 'running');
+        """,
+    ),
+    (
+        7,
+        """
+        CREATE TABLE IF NOT EXISTS analytics_rollups (
+            bucket TIMESTAMPTZ NOT NULL,
+            tenant TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            dimension TEXT NOT NULL DEFAULT '',
+            value BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (tenant, metric, bucket, dimension)
+        );
+
+        CREATE INDEX IF NOT EXISTS analytics_rollups_bucket_idx ON analytics_rollups (bucket);
+        """,
+    ),
+]
+
+STATEMENTS: Dict[str, str] = {
+    "get_user_state": "SELECT free_used, paid FROM user_state WHERE tenant = $1 AND user_id = $2",
+    "upsert_user_state": """
+        INSERT INTO user_state (tenant, user_id, free_used, paid, updated_at)
+        VALUES ($1, $2, $3, $4, NOW())
+        ON CONFLICT (tenant, user_id)
+        DO UPDATE SET free_used = $3, paid = $4, updated_at = NOW()
+    """,
+    "get_last_report": "SELECT last_report FROM user_state WHERE tenant = $1 AND user_id = $2",
+    "save_last_report": """
+        INSERT INTO user_state (tenant, user_id, last_report, report_updated_at, updated_at)
+        VALUES ($1, $2, $3, NOW(), NOW())
+        ON CONFLICT (tenant, user_id)
+        DO UPDATE SET last_report = $3, report_updated_at = NOW()
+    """,
+}
+
+POOL_METRICS: Dict[str, float] = {
+    "acquired": 0,
+    "acquire_timeouts": 0,
+    "wait_total_ms": 0.0,
+    "wait_max_ms": 0.0,
+}
+
+
+@asynccontextmanager
+async def _acquire(pool: asyncpg.Pool) -> AsyncIterator[Any]:
+    started = time.perf_counter()
+    try:
+        conn = await pool.acquire(timeout=DB_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        POOL_METRICS["acquire_timeouts"] += 1
+        raise
+
+    wait_ms = (time.perf_counter() - started) * 1000
+    POOL_METRICS["acquired"] += 1
+    POOL_METRICS["wait_total_ms"] += wait_ms
+    POOL_METRICS["wait_max_ms"] = max(POOL_METRICS["wait_max_ms"], wait_ms)
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+@asynccontextmanager
+async def _export_connection() -> AsyncIterator[Any]:
+    # An export is paced by the client and may stay open for minutes, so it
+    # gets a connection of its own instead of holding one of the shared pool.
+    conn = await asyncpg.connect(DATABASE_URL, command_timeout=DB_COMMAND_TIMEOUT)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+# Errors caused by the rows themselves (bad encoding, constraints), as opposed
+# to the connection or the server being unavailable.
+_ROW_ERRORS = (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
+
+
+class _BatchWriter:
+    """
+    Buffers rows for one table and writes them with COPY, either when the
+    buffer reaches DB_BATCH_SIZE or every DB_FLUSH_INTERVAL seconds. A batch
+    the server rejects is split in halves until the offending rows are found;
+    only those are dropped. Other failures keep the batch for the next flush.
+    `write` waits until its row is actually written; `add` does not.
+    """
+
+    def __init__(self, table: str, columns: Sequence[str]) -> None:
+        self.table = table
+        self.columns = list(columns)
+        self.pending: List[Tuple[Any, ...]] = []
+        self._acks: List[Optional[asyncio.Future]] = []
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._flushes: Set[asyncio.Task] = set()
+        self._pool: Optional[asyncpg.Pool] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, pool: asyncpg.Pool) -> None:
+        self._pool = pool
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    def add(self, record: Tuple[Any, ...], ack: Optional[asyncio.Future] = None) -> bool:
+        if len(self.pending) >= DB_BATCH_MAX_PENDING:
+            self.dropped += 1
+            logger.error("Dropping %s row: %d rows already pending", self.table, len(self.pending))
+            return False
+        self.pending.append(record)
+        self._acks.append(ack)
+        if len(self.pending) >= DB_BATCH_SIZE and not self._lock.locked():
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+        return True
+
+    async def write(self, record: Tuple[Any, ...]) -> bool:
+        """Queues the row and returns True once a flush has written it."""
+        ack = asyncio.get_running_loop().create_future()
+        if not self.add(record, ack):
+            return False
+        try:
+            return await asyncio.wait_for(asyncio.shield(ack), DB_FLUSH_INTERVAL + DB_COMMAND_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("No %s write acknowledged within the flush timeout", self.table)
+            return False
+
+    async def _copy(self, batch: List[Tuple[Any, ...]]) -> List[bool]:
+        """Writes the batch and returns, per row, whether it was accepted."""
+        try:
+            async with _acquire(self._pool) as conn:
+                await conn.copy_records_to_table(self.table, records=batch, columns=self.columns)
+            return [True] * len(batch)
+        except _ROW_ERRORS:
+            if len(batch) == 1:
+                self.rejected += 1
+                logger.exception("Dropping %s row rejected by the server: %r", self.table, batch[0])
+                return [False]
+            middle = len(batch) // 2
+            return await self._copy(batch[:middle]) + await self._copy(batch[middle:])
+
+    async def flush(self) -> None:
+        if self._pool is None:
+            return
+        async with self._lock:
+            while self.pending:
+                batch = self.pending[:DB_BATCH_SIZE]
+                try:
+                    accepted = await self._copy(batch)
+                except Exception:
+                    logger.exception("Failed to write %d %s row(s); will retry", len(batch), self.table)
+                    return
+                acks = self._acks[: len(batch)]
+                del self.pending[: len(batch)]
+                del self._acks[: len(batch)]
+                self.written += sum(accepted)
+                for ack, ok in zip(acks, accepted):
+                    if ack is not None and not ack.done():
+                        ack.set_result(ok)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(DB_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+FEEDBACK_WRITER = _BatchWriter(
+    "feedback", ("tenant", "user_id", "username", "language", "question", "answer", "created_at")
+)
+EVENT_WRITER = _BatchWriter("events", ("tenant", "user_id", "event", "payload", "created_at"))
+_WRITERS = (FEEDBACK_WRITER, EVENT_WRITER)
+
+
 async def init_db() -> Optional[asyncpg.Pool]:
     if not DATABASE_URL:
         logger.info(
@@ -23,43 +311,94 @@ async def init_db() -> Optional[asyncpg.Pool]:
         return None
 
     try:
-        return await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=5)
+        pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            command_timeout=DB_COMMAND_TIMEOUT,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            max_inactive_connection_lifetime=DB_MAX_INACTIVE_LIFETIME,
+        )
     except Exception:
         logger.exception("Failed to init database pool")
         return None
 
+    for writer in _WRITERS:
+        writer.start(pool)
+    return pool
+
+
+async def close_db(pool: Optional[asyncpg.Pool]) -> None:
+    if pool is None:
+        return
+
+    for writer in _WRITERS:
+        await writer.close()
+    try:
+        await pool.close()
+    except Exception:
+        logger.exception("Failed to close database pool")
+
 
 async def ensure_schema(pool: Optional[asyncpg.Pool]) -> None:
+    """
+    Applies pending MIGRATIONS in order. The advisory lock keeps several
+    processes (e.g. shard workers) from migrating at the same time.
+    """
     if pool is None:
         return
 
     try:
-        async with pool.acquire() as conn:
-            await conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS feedback (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT,
-                    username TEXT,
-                    language TEXT,
-                    question TEXT,
-                    answer TEXT,
-                    created_at TIMESTAMPTZ DEFAULT NOW()
-                );
-
-                CREATE TABLE IF NOT EXISTS user_state (
-                    user_id BIGINT PRIMARY KEY,
-                    free_used BOOLEAN DEFAULT FALSE,
-                    paid BOOLEAN DEFAULT FALSE,
-                    updated_at TIMESTAMPTZ DEFAULT NOW()
-                );
-                """
-            )
+        async with _acquire(pool) as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", _MIGRATION_LOCK_ID)
+                await conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        applied_at TIMESTAMPTZ DEFAULT NOW()
+                    )
+                    """
+                )
+                applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+                for version, sql in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    await conn.execute(sql)
+                    await conn.execute("INSERT INTO schema_migrations (version) VALUES ($1)", version)
+                    logger.info("Applied schema migration %d", version)
     except Exception:
         logger.exception("Failed to ensure schema")
 
 
-def _load_json_map(file_path: str) -> Dict[str, Dict[str, Any]]:
+def get_pool_metrics(pool: Optional[asyncpg.Pool]) -> Dict[str, Any]:
+    if pool is None:
+        return {"backend": "file"}
+
+    acquired = POOL_METRICS["acquired"]
+    return {
+        "backend": "postgres",
+        "size": pool.get_size(),
+        "idle": pool.get_idle_size(),
+        "min_size": pool.get_min_size(),
+        "max_size": pool.get_max_size(),
+        "acquired": int(acquired),
+        "acquire_timeouts": int(POOL_METRICS["acquire_timeouts"]),
+        "wait_avg_ms": round(POOL_METRICS["wait_total_ms"] / acquired, 3) if acquired else 0.0,
+        "wait_max_ms": round(POOL_METRICS["wait_max_ms"], 3),
+        "batches": {
+            writer.table: {
+                "pending": len(writer.pending),
+                "written": writer.written,
+                "dropped": writer.dropped,
+                "rejected": writer.rejected,
+            }
+            for writer in _WRITERS
+        },
+    }
+
+
+def _load_json_map(file_path: str, strict: bool = False) -> Dict[str, Dict[str, Any]]:
     if not os.path.exists(file_path):
         return {}
 
@@ -67,15 +406,81 @@ def _load_json_map(file_path: str) -> Dict[str, Dict[str, Any]]:
         with open(file_path, "r", encoding="utf-8") as file:
             data = json.load(file)
     except json.JSONDecodeError:
+        if strict:
+            raise
         return {}
 
     return data if isinstance(data, dict) else {}
 
 
 def _save_json_map(file_path: str, data: Dict[str, Dict[str, Any]]) -> None:
+    # Readers in other threads and processes see the old or the new file, never a partial one.
+    # One entry per line keeps the file valid JSON and lets exports stream it.
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, ensure_ascii=False, indent=2)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        file.write("{\n")
+        last = len(data) - 1
+        for index, (key, value) in enumerate(data.items()):
+            separator = "," if index < last else ""
+            file.write(f"{json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)}{separator}\n")
+        file.write("}\n")
+    os.replace(tmp_path, file_path)
+
+
+def _read_json_map_entries(handle: Any, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Reads up to `limit` entries of a map written by _save_json_map. Raises
+    JSONDecodeError on a line that is not a whole entry, e.g. in a legacy
+    indented file.
+    """
+    entries: List[Tuple[str, Dict[str, Any]]] = []
+    while len(entries) < limit:
+        line = handle.readline()
+        if not line:
+            break
+        line = line.strip().rstrip(",")
+        if line in {"", "{", "}", "{}"}:
+            continue
+        entry = json.loads("{" + line + "}")
+        entries.extend((key, value) for key, value in entry.items() if isinstance(value, dict))
+    return entries
+
+
+async def _iter_json_map(file_path: str, batch_size: int) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    if not os.path.exists(file_path):
+        return
+    handle = await STORAGE_EXECUTOR.run(open, file_path, "r", encoding="utf-8")
+    try:
+        while True:
+            try:
+                entries = await STORAGE_EXECUTOR.run(_read_json_map_entries, handle, batch_size)
+            except json.JSONDecodeError:
+                break
+            if not entries:
+                return
+            for entry in entries:
+                yield entry
+    finally:
+        handle.close()
+
+    # A file from before the line layout; the next write converts it.
+    data = await STORAGE_EXECUTOR.run(_load_json_map, file_path)
+    for entry in data.items():
+        yield entry
+
+
+def _update_json_map(file_path: str, key: str, value: Dict[str, Any]) -> None:
+    # Shard workers and storage threads share the file, so the read-merge-write
+    # runs under a file lock.
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path + ".lock", "a", encoding="utf-8") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # A corrupt file is left alone rather than replaced by a single entry.
+        data = _load_json_map(file_path, strict=True)
+        data[key] = value
+        _save_json_map(file_path, data)
 
 
 def _load_json_list(file_path: str) -> list:
@@ -91,18 +496,50 @@ def _load_json_list(file_path: str) -> list:
     return data if isinstance(data, list) else []
 
 
-def _save_json_list(file_path: str, data: list) -> None:
+def _append_json_line(file_path: str, payload: Dict[str, Any]) -> None:
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, ensure_ascii=False, indent=2)
+    with open(file_path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+
+def _read_json_lines(handle: Any, limit: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    while len(rows) < limit:
+        line = handle.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning("Skipping malformed line in %s", handle.name)
+            continue
+        if isinstance(row, dict):
+            rows.append(row)
+    return rows
+
 
+def _state_key(tenant: str, user_id: int) -> str:
+    # The default tenant keeps the original bare user id keys.
+    return str(user_id) if tenant == DEFAULT_TENANT else f"{tenant}:{user_id}"
 
-async def get_user_state(pool: Optional[asyncpg.Pool], user_id: int) -> Dict[str, bool]:
+
+def _split_state_key(key: str) -> Tuple[str, int]:
+    tenant, _, user_id = key.rpartition(":")
+    return tenant or DEFAULT_TENANT, int(user_id)
+
+
+@traced("db.get_user_state")
+async def get_user_state(
+    pool: Optional[asyncpg.Pool], user_id: int, tenant: str = DEFAULT_TENANT
+) -> Dict[str, bool]:
     if pool is None:
         file_path = data_path("user_state.json")
         try:
-            data = await asyncio.to_thread(_load_json_map, file_path)
-            record = data.get(str(user_id), {})
+            data = await STORAGE_EXECUTOR.run(_load_json_map, file_path)
+            record = data.get(_state_key(tenant, user_id), {})
             return {
                 "free_used": bool(record.get("free_used", False)),
                 "paid": bool(record.get("paid", False)),
@@ -112,11 +549,8 @@ async def get_user_state(pool: Optional[asyncpg.Pool], user_id: int) -> Dict[str
             return {"free_used": False, "paid": False}
 
     try:
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT free_used, paid FROM user_state WHERE user_id = $1",
-                user_id,
-            )
+        async with _acquire(pool) as conn:
+            row = await conn.fetchrow(STATEMENTS["get_user_state"], tenant, user_id)
             if not row:
                 return {"free_used": False, "paid": False}
             return {"free_used": bool(row["free_used"]), "paid": bool(row["paid"])}
@@ -125,40 +559,102 @@ async def get_user_state(pool: Optional[asyncpg.Pool], user_id: int) -> Dict[str
         return {"free_used": False, "paid": False}
 
 
+@traced("db.upsert_user_state")
 async def upsert_user_state(
-    pool: Optional[asyncpg.Pool], user_id: int, paid: bool, free_used: bool
+    pool: Optional[asyncpg.Pool], user_id: int, paid: bool, free_used: bool, tenant: str = DEFAULT_TENANT
 ) -> None:
     if pool is None:
         file_path = data_path("user_state.json")
+        record = {
+            "paid": bool(paid),
+            "free_used": bool(free_used),
+            "updated_at": datetime.utcnow().isoformat(),
+        }
         try:
-            data = await asyncio.to_thread(_load_json_map, file_path)
-            data[str(user_id)] = {
-                "paid": bool(paid),
-                "free_used": bool(free_used),
-                "updated_at": datetime.utcnow().isoformat(),
-            }
-            await asyncio.to_thread(_save_json_map, file_path, data)
+            await STORAGE_EXECUTOR.run(_update_json_map, file_path, _state_key(tenant, user_id), record)
         except Exception:
             logger.exception("Failed to save local user state")
         return
 
     try:
-        async with pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO user_state (user_id, free_used, paid, updated_at)
-                VALUES ($1, $2, $3, NOW())
-                ON CONFLICT (user_id)
-                DO UPDATE SET free_used = $2, paid = $3, updated_at = NOW()
-                """,
-                user_id,
-                free_used,
-                paid,
-            )
+        async with _acquire(pool) as conn:
+            await conn.execute(STATEMENTS["upsert_user_state"], tenant, user_id, free_used, paid)
     except Exception:
         logger.exception("Failed to upsert user state")
 
 
+def _last_report_path(tenant: str, user_id: int) -> str:
+    if tenant == DEFAULT_TENANT:
+        return data_path("last_reports", f"{user_id}.json")
+    return data_path("last_reports", tenant, f"{user_id}.json")
+
+
+def _load_json_file(file_path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except json.JSONDecodeError:
+        return None
+
+    return data if isinstance(data, dict) else None
+
+
+def _save_json_file(file_path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
+
+
+@traced("db.get_last_report")
+async def get_last_report(
+    pool: Optional[asyncpg.Pool], user_id: int, tenant: str = DEFAULT_TENANT
+) -> Optional[Dict[str, Any]]:
+    if pool is None:
+        try:
+            return await STORAGE_EXECUTOR.run(_load_json_file, _last_report_path(tenant, user_id))
+        except Exception:
+            logger.exception("Failed to load local report")
+            return None
+
+    try:
+        async with _acquire(pool) as conn:
+            raw = await conn.fetchval(STATEMENTS["get_last_report"], tenant, user_id)
+        if not raw:
+            return None
+        report = json.loads(raw)
+        return report if isinstance(report, dict) else None
+    except Exception:
+        logger.exception("Failed to fetch last report")
+        return None
+
+
+@traced("db.save_last_report")
+async def save_last_report(
+    pool: Optional[asyncpg.Pool], user_id: int, report: Dict[str, Any], tenant: str = DEFAULT_TENANT
+) -> bool:
+    if pool is None:
+        try:
+            await STORAGE_EXECUTOR.run(_save_json_file, _last_report_path(tenant, user_id), report)
+            return True
+        except Exception:
+            logger.exception("Failed to save local report")
+            return False
+
+    try:
+        async with _acquire(pool) as conn:
+            await conn.execute(STATEMENTS["save_last_report"], tenant, user_id, json.dumps(report, ensure_ascii=False))
+        return True
+    except Exception:
+        logger.exception("Failed to save last report")
+        return False
+
+
+@traced("db.save_feedback")
 async def save_feedback(
     pool: Optional[asyncpg.Pool],
     user_id: int,
@@ -166,10 +662,12 @@ async def save_feedback(
     language: str,
     question: Optional[str],
     answer: str,
+    tenant: str = DEFAULT_TENANT,
 ) -> bool:
     if pool is None:
-        file_path = data_path("feedback.json")
+        file_path = data_path("feedback.jsonl")
         payload = {
+            "tenant": tenant,
             "user_id": user_id,
             "username": username,
             "language": language,
@@ -178,28 +676,192 @@ async def save_feedback(
             "created_at": datetime.utcnow().isoformat(),
         }
         try:
-            data = await asyncio.to_thread(_load_json_list, file_path)
-            data.append(payload)
-            await asyncio.to_thread(_save_json_list, file_path, data)
+            await STORAGE_EXECUTOR.run(_append_json_line, file_path, payload)
             return True
         except Exception:
             logger.exception("Failed to save feedback locally")
             return False
 
-    try:
-        async with pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO feedback (user_id, username, language, question, answer)
-                VALUES ($1, $2, $3, $4, $5)
-                """,
-                user_id,
-                username,
-                language,
-                question,
-                answer,
-            )
+    return await FEEDBACK_WRITER.write(
+        (tenant, user_id, username, language, question, answer, datetime.now(timezone.utc))
+    )
+
+
+@traced("db.record_event")
+async def record_event(
+    pool: Optional[asyncpg.Pool],
+    user_id: Optional[int],
+    event: str,
+    payload: Optional[Dict[str, Any]] = None,
+    tenant: str = DEFAULT_TENANT,
+) -> None:
+    if pool is None:
+        line = {
+            "tenant": tenant,
+            "user_id": user_id,
+            "event": event,
+            "payload": payload or {},
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        try:
+            await STORAGE_EXECUTOR.run(_append_json_line, data_path("events.jsonl"), line)
+        except Exception:
+            logger.exception("Failed to save event locally")
+        return
+
+    EVENT_WRITER.add(
+        (tenant, user_id, event, json.dumps(payload or {}, ensure_ascii=False), datetime.now(timezone.utc))
+    )
+
+
+def _to_utc(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        # Local storage writes naive UTC timestamps.
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _in_range(value: Any, since: Optional[datetime], until: Optional[datetime]) -> bool:
+    if since is None and until is None:
         return True
-    except Exception:
-        logger.exception("Failed to save feedback")
+    moment = _to_utc(value)
+    if moment is None:
+        return False
+    if since is not None and moment < since:
         return False
+    if until is not None and moment >= until:
+        return False
+    return True
+
+
+async def _iter_local_feedback(batch_size: int) -> AsyncIterator[Dict[str, Any]]:
+    # feedback.json is the legacy single-array format; it is only read, never extended.
+    legacy = await STORAGE_EXECUTOR.run(_load_json_list, data_path("feedback.json"))
+    for row in legacy:
+        if isinstance(row, dict):
+            yield row
+    del legacy
+
+    file_path = data_path("feedback.jsonl")
+    if not os.path.exists(file_path):
+        return
+    handle = await STORAGE_EXECUTOR.run(open, file_path, "r", encoding="utf-8")
+    try:
+        while True:
+            rows = await STORAGE_EXECUTOR.run(_read_json_lines, handle, batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        handle.close()
+
+
+async def iter_feedback(
+    pool: Optional[asyncpg.Pool],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    language: Optional[str] = None,
+    batch_size: int = 500,
+    tenant: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields feedback rows oldest first without loading the table into memory:
+    a server-side cursor on Postgres, line-by-line reads of feedback.jsonl
+    otherwise. `since` is inclusive and `until` exclusive.
+    """
+    since = _to_utc(since) if since else None
+    until = _to_utc(until) if until else None
+
+    if pool is None:
+        async for row in _iter_local_feedback(batch_size):
+            row.setdefault("tenant", DEFAULT_TENANT)
+            if language and row.get("language") != language:
+                continue
+            if tenant and row["tenant"] != tenant:
+                continue
+            if _in_range(row.get("created_at"), since, until):
+                yield row
+        return
+
+    conditions: List[str] = []
+    args: List[Any] = []
+    if since is not None:
+        args.append(since)
+        conditions.append(f"created_at >= ${len(args)}")
+    if until is not None:
+        args.append(until)
+        conditions.append(f"created_at < ${len(args)}")
+    if language:
+        args.append(language)
+        conditions.append(f"language = ${len(args)}")
+    if tenant:
+        args.append(tenant)
+        conditions.append(f"tenant = ${len(args)}")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = (
+        "SELECT id, tenant, user_id, username, language, question, answer, created_at "
+        f"FROM feedback {where} ORDER BY created_at, id"
+    )
+
+    async with _export_connection() as conn:
+        async with conn.transaction(readonly=True):
+            async for record in conn.cursor(sql, *args, prefetch=batch_size):
+                yield dict(record)
+
+
+async def iter_user_states(
+    pool: Optional[asyncpg.Pool],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: int = 500,
+    tenant: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields user_state rows filtered by updated_at: a server-side cursor on
+    Postgres, entry-by-entry reads of user_state.json otherwise.
+    """
+    since = _to_utc(since) if since else None
+    until = _to_utc(until) if until else None
+
+    if pool is None:
+        async for key, record in _iter_json_map(data_path("user_state.json"), batch_size):
+            row_tenant, user_id = _split_state_key(key)
+            if tenant and row_tenant != tenant:
+                continue
+            if not _in_range(record.get("updated_at"), since, until):
+                continue
+            yield {
+                "tenant": row_tenant,
+                "user_id": user_id,
+                "free_used": bool(record.get("free_used", False)),
+                "paid": bool(record.get("paid", False)),
+                "updated_at": record.get("updated_at"),
+            }
+        return
+
+    conditions: List[str] = []
+    args: List[Any] = []
+    if since is not None:
+        args.append(since)
+        conditions.append(f"updated_at >= ${len(args)}")
+    if until is not None:
+        args.append(until)
+        conditions.append(f"updated_at < ${len(args)}")
+    if tenant:
+        args.append(tenant)
+        conditions.append(f"tenant = ${len(args)}")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"SELECT tenant, user_id, free_used, paid, updated_at FROM user_state {where} ORDER BY tenant, user_id"
+
+    async with _export_connection() as conn:
+        async with conn.transaction(readonly=True):
+            async for record in conn.cursor(sql, *args, prefetch=batch_size):
+                yield dict(record)
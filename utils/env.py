@@ -0,0 +1,17 @@
+import os
+
+
+def env_int(name: str, default: int, minimum: int = 0) -> int:
+    """Reads an integer setting, clamped to `minimum`; `default` if unparsable."""
+    try:
+        return max(minimum, int(os.getenv(name, str(default))))
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float, minimum: float = 0.0) -> float:
+    """Reads a float setting, clamped to `minimum`; `default` if unparsable."""
+    try:
+        return max(minimum, float(os.getenv(name, str(default))))
+    except ValueError:
+        return default
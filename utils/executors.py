@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from utils.env import env_int
+
+logger = logging.getLogger("designer_grade_bot.executors")
+
+T = TypeVar("T")
+
+
+class ExecutorOverloaded(RuntimeError):
+    """Raised when an executor's wait queue is full."""
+
+
+class BoundedExecutor:
+    """
+    A named thread pool for one kind of blocking work. At most `workers` calls
+    run at once; further callers wait on the event loop, up to `queue_limit`
+    of them, and the rest get ExecutorOverloaded. A slot stays taken until the
+    thread finishes, even if the awaiting coroutine was cancelled or timed
+    out, so abandoned calls still count against their own pool only.
+    """
+
+    def __init__(self, name: str, workers: int, queue_limit: int) -> None:
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._created = time.monotonic()
+        self._waiting = 0
+        self._active = 0
+        self._stats = {"completed": 0, "rejected": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0, "busy_seconds": 0.0}
+
+    def _ensure(self) -> asyncio.Semaphore:
+        # Created lazily so shard workers build their own pools after spawn.
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-executor")
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._loop = loop
+        return self._slots
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs fn(*args, **kwargs) in the pool with the caller's contextvars."""
+        slots = self._ensure()
+        if slots.locked() and self._waiting >= self.queue_limit:
+            self._stats["rejected"] += 1
+            raise ExecutorOverloaded(self.name)
+
+        enqueued = time.perf_counter()
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+        wait_ms = (time.perf_counter() - enqueued) * 1000
+        self._stats["wait_total_ms"] += wait_ms
+        self._stats["wait_max_ms"] = max(self._stats["wait_max_ms"], wait_ms)
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        self._active += 1
+        try:
+            future = self._pool.submit(self._call, context, fn, args, kwargs)
+        except BaseException:
+            self._release(slots)
+            raise
+        future.add_done_callback(lambda _: self._release_from_thread(loop, slots))
+        return await asyncio.wrap_future(future)
+
+    def _call(self, context: contextvars.Context, fn: Callable[..., T], args: Any, kwargs: Any) -> T:
+        started = time.perf_counter()
+        try:
+            return context.run(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._stats["busy_seconds"] += time.perf_counter() - started
+
+    def _release_from_thread(self, loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release, slots)
+        except RuntimeError:
+            # The loop is closed; nobody is waiting for a slot any more.
+            pass
+
+    def _release(self, slots: asyncio.Semaphore) -> None:
+        self._active -= 1
+        self._stats["completed"] += 1
+        slots.release()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._slots = None
+
+    def metrics(self) -> Dict[str, Any]:
+        started = self._stats["completed"] + self._active
+        uptime = max(1e-9, time.monotonic() - self._created)
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "active": self._active,
+            "queued": self._waiting,
+            "completed": self._stats["completed"],
+            "rejected": self._stats["rejected"],
+            "wait_avg_ms": round(self._stats["wait_total_ms"] / started, 3) if started else 0.0,
+            "wait_max_ms": round(self._stats["wait_max_ms"], 3),
+            "utilization": round(self._stats["busy_seconds"] / (self.workers * uptime), 4),
+        }
+
+
+# OpenAI calls block for seconds each; the LLM scheduler already bounds how
+# many are started, so this pool only has to hold them plus timed-out stragglers.
+LLM_EXECUTOR = BoundedExecutor(
+    "llm", env_int("EXECUTOR_LLM_WORKERS", 16, 1), env_int("EXECUTOR_LLM_QUEUE", 256)
+)
+# Local JSON files and the SQLite job queue: short calls that should never
+# wait behind model calls or PDF rendering.
+STORAGE_EXECUTOR = BoundedExecutor(
+    "storage", env_int("EXECUTOR_STORAGE_WORKERS", 4, 1), env_int("EXECUTOR_STORAGE_QUEUE", 1024)
+)
+# reportlab is CPU-bound and holds the GIL, so more threads do not help.
+RENDER_EXECUTOR = BoundedExecutor(
+    "render", env_int("EXECUTOR_RENDER_WORKERS", 2, 1), env_int("EXECUTOR_RENDER_QUEUE", 64)
+)
+EXECUTORS = (LLM_EXECUTOR, STORAGE_EXECUTOR, RENDER_EXECUTOR)
+
+
+def executor_metrics() -> Dict[str, Any]:
+    return {executor.name: executor.metrics() for executor in EXECUTORS}
+
+
+def shutdown_executors() -> None:
+    for executor in EXECUTORS:
+        executor.shutdown()
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import sys
+from datetime import date, datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from utils.db import close_db, init_db, iter_feedback, iter_user_states
+from utils.env import env_int
+
+logger = logging.getLogger("designer_grade_bot.export")
+
+EXPORT_FIELDS: Dict[str, List[str]] = {
+    "feedback": ["id", "tenant", "user_id", "username", "language", "question", "answer", "created_at"],
+    "user_state": ["tenant", "user_id", "free_used", "paid", "updated_at"],
+}
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+# Rows are encoded and flushed in chunks so per-row overhead stays low while
+# memory use stays constant.
+_CHUNK_ROWS = 200
+
+# Each running export holds a database connection of its own.
+EXPORT_MAX_CONCURRENCY = env_int("EXPORT_MAX_CONCURRENCY", 2, 1)
+_EXPORT_SLOTS = asyncio.Semaphore(EXPORT_MAX_CONCURRENCY)
+
+
+def export_busy() -> bool:
+    """True while EXPORT_MAX_CONCURRENCY exports are already streaming."""
+    return _EXPORT_SLOTS.locked()
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """
+    Accepts YYYY-MM-DD or a full ISO timestamp. Naive values are treated as UTC.
+    Raises ValueError on malformed input.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.strip())
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _encode_chunk(rows: List[Dict[str, Any]], fields: List[str], fmt: str) -> str:
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps({field: _plain(row.get(field)) for field in fields}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row.get(field) is None else _plain(row.get(field)) for field in fields])
+    return buffer.getvalue()
+
+
+async def stream_export(
+    pool: Any,
+    kind: str,
+    fmt: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    language: Optional[str] = None,
+    tenant: Optional[str] = None,
+) -> AsyncIterator[str]:
+    fields = EXPORT_FIELDS[kind]
+    if kind == "feedback":
+        rows = iter_feedback(pool, since=since, until=until, language=language, tenant=tenant)
+    else:
+        rows = iter_user_states(pool, since=since, until=until, tenant=tenant)
+
+    async with _EXPORT_SLOTS:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(fields)
+            yield buffer.getvalue()
+
+        chunk: List[Dict[str, Any]] = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= _CHUNK_ROWS:
+                yield _encode_chunk(chunk, fields, fmt)
+                chunk = []
+        if chunk:
+            yield _encode_chunk(chunk, fields, fmt)
+
+
+async def _run_cli(args: argparse.Namespace) -> None:
+    pool = await init_db()
+    try:
+        async for piece in stream_export(
+            pool,
+            args.kind,
+            args.format,
+            since=parse_date(args.since),
+            until=parse_date(args.until),
+            language=args.language,
+            tenant=args.tenant,
+        ):
+            sys.stdout.write(piece)
+    finally:
+        await close_db(pool)
+    sys.stdout.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export feedback or user states as CSV or NDJSON.")
+    parser.add_argument("kind", choices=sorted(EXPORT_FIELDS))
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--since", help="inclusive lower bound, YYYY-MM-DD or ISO timestamp")
+    parser.add_argument("--until", help="exclusive upper bound, YYYY-MM-DD or ISO timestamp")
+    parser.add_argument("--language", help="feedback language filter, e.g. ru or en")
+    parser.add_argument("--tenant", help="only rows of this tenant")
+    args = parser.parse_args()
+
+    try:
+        parse_date(args.since)
+        parse_date(args.until)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    asyncio.run(_run_cli(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import hmac
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.telegram import inline_reply_slot, wait_inline_reply
+
+try:
+    import orjson
+
+    _loads: Callable[[bytes], Any] = orjson.loads
+    _dumps: Callable[[Any], bytes] = orjson.dumps
+except ImportError:  # pragma: no cover - orjson is optional
+    _loads = json.loads
+
+    def _dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+logger = logging.getLogger("designer_grade_bot.webhook")
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+
+def _prebuilt(status: int, body: bytes) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    headers: List[Tuple[bytes, bytes]] = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("ascii")),
+    ]
+    return (
+        {"type": "http.response.start", "status": status, "headers": headers},
+        {"type": "http.response.body", "body": body},
+    )
+
+
+_OK = _prebuilt(200, b'{"ok":true}')
+_BAD_REQUEST = _prebuilt(400, b'{"ok":false}')
+_FORBIDDEN = _prebuilt(403, b'{"ok":false}')
+_TOO_MANY_REQUESTS = _prebuilt(429, b'{"ok":false}')
+_UNAVAILABLE = _prebuilt(503, b'{"ok":false}')
+_BY_STATUS = {200: _OK, 429: _TOO_MANY_REQUESTS, 503: _UNAVAILABLE}
+
+
+class FastWebhookMiddleware:
+    """
+    Serves POST requests to `path` and `path/<name>` at the ASGI level, ahead of
+    FastAPI routing, request parsing and response classes. Everything else is
+    passed through. `resolve(name)` returns the webhook secret for a known name
+    ("" for the bare path) or None to leave the request to the app.
+    `dispatch(update, name)` must only schedule work and return the HTTP status;
+    a 200 may carry the handler's inline reply (see utils.telegram).
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        path: str,
+        resolve: Callable[[str], Optional[str]],
+        dispatch: Callable[[Dict[str, Any], str], int],
+    ) -> None:
+        self.app = app
+        self.path = path
+        self.prefix = path + "/"
+        self.resolve = resolve
+        self.dispatch = dispatch
+
+    def _name(self, scope: Scope) -> Optional[str]:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return None
+        path = scope["path"]
+        if path == self.path:
+            return ""
+        if path.startswith(self.prefix) and "/" not in path[len(self.prefix):]:
+            return path[len(self.prefix):]
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        name = self._name(scope)
+        secret = self.resolve(name) if name is not None else None
+        if secret is None:
+            await self.app(scope, receive, send)
+            return
+
+        if secret:
+            provided = b""
+            for header, value in scope["headers"]:
+                if header == _SECRET_HEADER:
+                    provided = value
+                    break
+            if not hmac.compare_digest(provided, secret.encode("utf-8")):
+                logger.warning("Invalid Telegram webhook secret")
+                await self._respond(send, _FORBIDDEN)
+                return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        try:
+            update = _loads(body)
+        except ValueError:
+            await self._respond(send, _BAD_REQUEST)
+            return
+        if not isinstance(update, dict):
+            await self._respond(send, _BAD_REQUEST)
+            return
+
+        logger.info("Incoming webhook update_id=%s", update.get("update_id"))
+        reply = None
+        try:
+            with inline_reply_slot() as slot:
+                status = self.dispatch(update, name)
+            if status == 200:
+                reply = await wait_inline_reply(slot)
+        except Exception:
+            logger.exception("Webhook error")
+            status = 503
+        if reply is not None:
+            await self._respond(send, _prebuilt(200, _dumps(reply)))
+            return
+        await self._respond(send, _BY_STATUS.get(status, _UNAVAILABLE))
+
+    @staticmethod
+    async def _respond(send: Send, response: Tuple[Dict[str, Any], Dict[str, Any]]) -> None:
+        start, body = response
+        await send(start)
+        await send(body)
@@ -0,0 +1,449 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from utils.db import _acquire
+from utils.env import env_float, env_int
+from utils.executors import STORAGE_EXECUTOR
+from utils.paths import data_path
+from utils.tracing import start_trace
+
+logger = logging.getLogger("designer_grade_bot.jobs")
+
+
+JOB_QUEUE = os.getenv("JOB_QUEUE", "false").lower() == "true"
+JOB_WORKERS = env_int("JOB_WORKERS", 2)
+JOB_MAX_ATTEMPTS = env_int("JOB_MAX_ATTEMPTS", 5, minimum=1)
+# A claimed job becomes visible to other workers again after this long, so a
+# worker that died mid-job only delays it. It also caps one attempt's runtime.
+JOB_VISIBILITY_TIMEOUT = env_float("JOB_VISIBILITY_TIMEOUT", 300.0, minimum=1.0)
+JOB_POLL_INTERVAL = env_float("JOB_POLL_INTERVAL", 1.0, minimum=0.05)
+JOB_BACKOFF_BASE = env_float("JOB_BACKOFF_BASE", 5.0, minimum=0.1)
+JOB_BACKOFF_MAX = env_float("JOB_BACKOFF_MAX", 300.0, minimum=0.1)
+JOB_RETENTION_DAYS = env_float("JOB_RETENTION_DAYS", 7.0)
+
+HandlerFn = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+DeadFn = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Job:
+    __slots__ = ("id", "kind", "key", "payload", "attempts")
+
+    def __init__(self, job_id: int, kind: str, key: str, payload: Dict[str, Any], attempts: int) -> None:
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+
+
+_HANDLERS: Dict[str, Tuple[HandlerFn, Optional[DeadFn]]] = {}
+_STATS: Dict[str, Dict[str, int]] = {}
+
+
+def register_job(kind: str, handler: HandlerFn, on_dead: Optional[DeadFn] = None) -> None:
+    """
+    `handler(payload)` runs one attempt and may return a small JSON result;
+    raising schedules a retry. `on_dead(payload)` runs once the job has used
+    up JOB_MAX_ATTEMPTS.
+    """
+    _HANDLERS[kind] = (handler, on_dead)
+
+
+def _stats(kind: str) -> Dict[str, int]:
+    return _STATS.setdefault(kind, {"enqueued": 0, "duplicates": 0, "done": 0, "retried": 0, "dead": 0})
+
+
+def _loads(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+class _PostgresBackend:
+    name = "postgres"
+
+    def __init__(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+
+    async def enqueue(self, kind: str, key: str, payload: str) -> bool:
+        async with _acquire(self.pool) as conn:
+            job_id = await conn.fetchval(
+                "INSERT INTO jobs (kind, key, payload) VALUES ($1, $2, $3) ON CONFLICT (key) DO NOTHING RETURNING id",
+                kind,
+                key,
+                payload,
+            )
+        return job_id is not None
+
+    async def claim(self, kinds: List[str]) -> Optional[Job]:
+        async with _acquire(self.pool) as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, updated_at = NOW(),
+                    locked_until = NOW() + $2::float8 * INTERVAL '1 second'
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE kind = ANY($1::text[])
+                      AND ((status = 'queued' AND run_at <= NOW())
+                           OR (status = 'running' AND locked_until < NOW()))
+                    ORDER BY run_at, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, kind, key, payload, attempts
+                """,
+                kinds,
+                JOB_VISIBILITY_TIMEOUT,
+            )
+        if row is None:
+            return None
+        return Job(row["id"], row["kind"], row["key"], _loads(row["payload"]), row["attempts"])
+
+    async def finish(self, job: Job, status: str, result: Optional[str], error: Optional[str], delay: float) -> bool:
+        # `attempts` fences off a worker whose lease expired and was re-claimed.
+        async with _acquire(self.pool) as conn:
+            outcome = await conn.execute(
+                """
+                UPDATE jobs
+                SET status = $3, result = $4, last_error = $5, locked_until = NULL, updated_at = NOW(),
+                    run_at = NOW() + $6::float8 * INTERVAL '1 second'
+                WHERE id = $1 AND attempts = $2
+                """,
+                job.id,
+                job.attempts,
+                status,
+                result,
+                error,
+                delay,
+            )
+        return outcome != "UPDATE 0"
+
+    async def cancel(self, key: str) -> bool:
+        # Bumping `attempts` fences off a worker that is running the job now.
+        async with _acquire(self.pool) as conn:
+            outcome = await conn.execute(
+                """
+                UPDATE jobs
+                SET status = 'cancelled', attempts = attempts + 1, locked_until = NULL, updated_at = NOW()
+                WHERE key = $1 AND status IN ('queued', 'running')
+                """,
+                key,
+            )
+        return outcome != "UPDATE 0"
+
+    async def status(self, key: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        async with _acquire(self.pool) as conn:
+            row = await conn.fetchrow("SELECT status, result FROM jobs WHERE key = $1", key)
+        if row is None:
+            return None, None
+        return row["status"], _loads(row["result"])
+
+    async def purge(self, older_than: float) -> None:
+        async with _acquire(self.pool) as conn:
+            await conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'cancelled') AND updated_at < NOW() - $1::float8 * INTERVAL '1 second'",
+                older_than,
+            )
+
+
+class _SqliteBackend:
+    """
+    Local backend for DATA_DIR deployments. One connection per process behind
+    a lock; BEGIN IMMEDIATE makes claims safe across processes sharing the file.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_at REAL NOT NULL,
+                    locked_until REAL,
+                    last_error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_ready_idx ON jobs (status, run_at);
+                """
+            )
+
+    def _enqueue(self, kind: str, key: str, payload: str) -> bool:
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, key, payload, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, payload, now, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def _claim(self, kinds: List[str]) -> Optional[Job]:
+        now = time.time()
+        marks = ",".join("?" for _ in kinds)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    f"""
+                    SELECT id, kind, key, payload, attempts FROM jobs
+                    WHERE kind IN ({marks})
+                      AND ((status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until < ?))
+                    ORDER BY run_at, id
+                    LIMIT 1
+                    """,
+                    (*kinds, now, now),
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, updated_at = ? WHERE id = ?",
+                        (now + JOB_VISIBILITY_TIMEOUT, now, row[0]),
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[4] + 1)
+
+    def _finish(self, job: Job, status: str, result: Optional[str], error: Optional[str], delay: float) -> bool:
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, result = ?, last_error = ?, locked_until = NULL, updated_at = ?, run_at = ?
+                WHERE id = ? AND attempts = ?
+                """,
+                (status, result, error, now, now + delay, job.id, job.attempts),
+            )
+        return cursor.rowcount == 1
+
+    def _cancel(self, key: str) -> bool:
+        with self.lock:
+            cursor = self.conn.execute(
+                """
+                UPDATE jobs
+                SET status = 'cancelled', attempts = attempts + 1, locked_until = NULL, updated_at = ?
+                WHERE key = ? AND status IN ('queued', 'running')
+                """,
+                (time.time(), key),
+            )
+        return cursor.rowcount == 1
+
+    def _status(self, key: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        with self.lock:
+            row = self.conn.execute("SELECT status, result FROM jobs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def _purge(self, older_than: float) -> None:
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'cancelled') AND updated_at < ?", (time.time() - older_than,)
+            )
+
+    async def enqueue(self, kind: str, key: str, payload: str) -> bool:
+        return await STORAGE_EXECUTOR.run(self._enqueue, kind, key, payload)
+
+    async def claim(self, kinds: List[str]) -> Optional[Job]:
+        return await STORAGE_EXECUTOR.run(self._claim, kinds)
+
+    async def finish(self, job: Job, status: str, result: Optional[str], error: Optional[str], delay: float) -> bool:
+        return await STORAGE_EXECUTOR.run(self._finish, job, status, result, error, delay)
+
+    async def cancel(self, key: str) -> bool:
+        return await STORAGE_EXECUTOR.run(self._cancel, key)
+
+    async def status(self, key: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        return await STORAGE_EXECUTOR.run(self._status, key)
+
+    async def purge(self, older_than: float) -> None:
+        await STORAGE_EXECUTOR.run(self._purge, older_than)
+
+
+_BACKEND: Any = None
+_WAKE: Optional[asyncio.Event] = None
+
+
+def init_jobs(pool: Optional[asyncpg.Pool]) -> None:
+    """Picks the jobs table in Postgres when a pool exists, DATA_DIR/jobs.sqlite3 otherwise."""
+    global _BACKEND
+
+    if not JOB_QUEUE:
+        return
+    _BACKEND = _PostgresBackend(pool) if pool is not None else _SqliteBackend(data_path("jobs.sqlite3"))
+    logger.info("Job queue backend=%s", _BACKEND.name)
+
+
+def jobs_enabled() -> bool:
+    return _BACKEND is not None
+
+
+async def enqueue_job(kind: str, key: str, payload: Dict[str, Any]) -> bool:
+    """
+    Stores a job unless one with the same idempotency `key` already exists.
+    Returns False only when the job could not be stored.
+    """
+    if _BACKEND is None:
+        return False
+    try:
+        created = await _BACKEND.enqueue(kind, key, json.dumps(payload, ensure_ascii=False))
+    except Exception:
+        logger.exception("Failed to enqueue %s job %s", kind, key)
+        return False
+    _stats(kind)["enqueued" if created else "duplicates"] += 1
+    if created and _WAKE is not None:
+        _WAKE.set()
+    return True
+
+
+async def job_status(key: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Returns (status, result) for a job key; (None, None) if unknown or on error."""
+    if _BACKEND is None:
+        return None, None
+    try:
+        return await _BACKEND.status(key)
+    except Exception:
+        logger.exception("Failed to read job status %s", key)
+        return None, None
+
+
+async def cancel_job(key: str) -> bool:
+    """
+    Cancels a queued or running job so no worker finishes it. Returns False
+    if the job is unknown, already finished, or on error.
+    """
+    if _BACKEND is None:
+        return False
+    try:
+        return await _BACKEND.cancel(key)
+    except Exception:
+        logger.exception("Failed to cancel job %s", key)
+        return False
+
+
+def _backoff(attempts: int) -> float:
+    return random.uniform(0.5, 1.0) * min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * (2 ** (attempts - 1)))
+
+
+async def _dead_letter(job: Job, error: str) -> None:
+    if not await _BACKEND.finish(job, "dead", None, error, 0.0):
+        # Cancelled or re-claimed meanwhile; the job is no longer ours to report.
+        return
+    _stats(job.kind)["dead"] += 1
+    logger.error("Job %s %s moved to dead letters after %d attempt(s): %s", job.kind, job.key, job.attempts, error)
+    on_dead = _HANDLERS[job.kind][1]
+    if on_dead is not None:
+        try:
+            await on_dead(job.payload)
+        except Exception:
+            logger.exception("Dead-letter hook failed for %s job %s", job.kind, job.key)
+
+
+async def _execute(job: Job) -> None:
+    if job.attempts > JOB_MAX_ATTEMPTS:
+        # The last attempt's worker died without reporting back.
+        await _dead_letter(job, "visibility timeout")
+        return
+
+    handler = _HANDLERS[job.kind][0]
+    with start_trace("job", kind=job.kind, attempt=job.attempts):
+        try:
+            result = await asyncio.wait_for(handler(job.payload), JOB_VISIBILITY_TIMEOUT)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"[:500]
+            if job.attempts >= JOB_MAX_ATTEMPTS:
+                await _dead_letter(job, error)
+                return
+            delay = _backoff(job.attempts)
+            _stats(job.kind)["retried"] += 1
+            logger.warning("Job %s %s failed (%s); retry in %.1fs", job.kind, job.key, error, delay)
+            await _BACKEND.finish(job, "queued", None, error, delay)
+            return
+
+    _stats(job.kind)["done"] += 1
+    await _BACKEND.finish(job, "done", json.dumps(result, ensure_ascii=False) if result is not None else None, None, 0.0)
+
+
+class JobWorkers:
+    """
+    `concurrency` coroutines that claim and run jobs. Idle workers poll every
+    JOB_POLL_INTERVAL seconds and are woken at once by jobs enqueued in the
+    same process.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = max(1, concurrency)
+        self._tasks: List[asyncio.Task] = []
+        self._last_purge = 0.0
+
+    def start(self) -> None:
+        global _WAKE
+
+        _WAKE = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(index)) for index in range(self.concurrency)]
+        logger.info("Started %d job worker(s) for %s", self.concurrency, ", ".join(sorted(_HANDLERS)))
+
+    async def _maybe_purge(self) -> None:
+        if not JOB_RETENTION_DAYS or time.monotonic() - self._last_purge < 3600:
+            return
+        self._last_purge = time.monotonic()
+        await _BACKEND.purge(JOB_RETENTION_DAYS * 86400)
+
+    async def _run(self, index: int) -> None:
+        kinds = sorted(_HANDLERS)
+        while True:
+            try:
+                _WAKE.clear()
+                job = await _BACKEND.claim(kinds)
+                if job is None:
+                    if index == 0:
+                        await self._maybe_purge()
+                    try:
+                        await asyncio.wait_for(_WAKE.wait(), JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await _execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker %d failed; backing off", index)
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def stop(self) -> None:
+        # Jobs in flight stay claimed and are picked up again after the
+        # visibility timeout.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def job_metrics() -> Dict[str, Any]:
+    return {
+        "backend": _BACKEND.name if _BACKEND is not None else None,
+        "kinds": {kind: dict(stats) for kind, stats in _STATS.items()},
+    }
@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import openai
+from openai import OpenAI
+
+from utils.env import env_float, env_int
+from utils.executors import LLM_EXECUTOR, ExecutorOverloaded
+from utils.llm_cache import LLM_CACHE, LLMCacheMiss
+from utils.llm_scheduler import LLM_MAX_CONCURRENCY, LLM_SCHEDULER
+from utils.tenants import count as count_for_tenant, current_tenant
+
+logger = logging.getLogger("designer_grade_bot.llm")
+
+
+LLM_CALL_TIMEOUT = env_float("LLM_CALL_TIMEOUT", 60.0, minimum=1.0)
+LLM_MAX_RETRIES = env_int("LLM_MAX_RETRIES", 2)
+LLM_BACKOFF_BASE = env_float("LLM_BACKOFF_BASE", 0.5, minimum=0.01)
+LLM_BACKOFF_MAX = env_float("LLM_BACKOFF_MAX", 8.0, minimum=0.01)
+LLM_MIN_CONCURRENCY = min(LLM_MAX_CONCURRENCY, env_int("LLM_MIN_CONCURRENCY", 1, minimum=1))
+# Calls slower than this count as a congestion signal for the adaptive limit.
+LLM_LATENCY_TARGET = env_float("LLM_LATENCY_TARGET", 20.0, minimum=0.1)
+LLM_BREAKER_FAILURES = env_int("LLM_BREAKER_FAILURES", 5, minimum=1)
+LLM_BREAKER_COOLDOWN = env_float("LLM_BREAKER_COOLDOWN", 30.0, minimum=1.0)
+# Routes a tenant's calls to the same provider cache, since they share a prompt prefix.
+LLM_PROMPT_CACHE_KEY = os.getenv("LLM_PROMPT_CACHE_KEY", "true").lower() == "true"
+
+# Shared by every engine; retries are handled here, not by the SDK.
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=LLM_CALL_TIMEOUT, max_retries=0)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while the circuit breaker is open."""
+
+
+class _AdaptiveLimit:
+    """
+    AIMD concurrency limit applied to the LLM scheduler: +1/limit per healthy
+    call, x0.7 on overload (at most once per second so one burst of failures
+    counts as one signal).
+    """
+
+    decrease_factor = 0.7
+
+    def __init__(self, minimum: int, maximum: int) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self._last_decrease = 0.0
+
+    def _apply(self) -> None:
+        LLM_SCHEDULER.set_capacity(int(self.limit))
+
+    def on_success(self, latency: float) -> None:
+        if latency > LLM_LATENCY_TARGET:
+            self.on_overload()
+            return
+        self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+        self._apply()
+
+    def on_overload(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        self._apply()
+
+
+class _CircuitBreaker:
+    """
+    closed -> open after LLM_BREAKER_FAILURES consecutive failures; open ->
+    half_open after the cooldown, letting a single probe through; the probe's
+    outcome closes or reopens the circuit. A probe that is cancelled or runs
+    past LLM_CALL_TIMEOUT gives its turn to the next caller.
+    """
+
+    def __init__(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started = 0.0
+        self.opened_count = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN:
+            self.state = "half_open"
+            self.probe_in_flight = False
+        if self.state != "half_open":
+            return False
+        if self.probe_in_flight and time.monotonic() - self.probe_started < LLM_CALL_TIMEOUT:
+            return False
+        self.probe_in_flight = True
+        self.probe_started = time.monotonic()
+        return True
+
+    def release_probe(self) -> None:
+        """Frees the probe slot of a call that ended without an outcome."""
+        if self.state == "half_open":
+            self.probe_in_flight = False
+
+    def available(self) -> bool:
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN
+        return True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= LLM_BREAKER_FAILURES:
+            if self.state != "open":
+                logger.warning("LLM circuit breaker opened after %d failure(s)", self.failures)
+                self.opened_count += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+
+LIMITER = _AdaptiveLimit(LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY)
+BREAKER = _CircuitBreaker()
+_STATS: Dict[str, Dict[str, float]] = {}
+
+
+def _stats(engine: str) -> Dict[str, float]:
+    return _STATS.setdefault(
+        engine,
+        {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "rejected": 0,
+            "latency_total_ms": 0.0,
+            "input_tokens": 0,
+            "cached_tokens": 0,
+            "cached_calls": 0,
+            "latency_cached_total_ms": 0.0,
+        },
+    )
+
+
+def _usage(response: Any) -> Tuple[int, int]:
+    """Returns (input tokens, of them served from the provider's prompt cache)."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "input_tokens_details", None)
+    return int(getattr(usage, "input_tokens", 0) or 0), int(getattr(details, "cached_tokens", 0) or 0)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue
+    return None
+
+
+def _classify(exc: Exception) -> Tuple[bool, bool]:
+    """Returns (retryable, overload signal) for an exception from the SDK."""
+    if isinstance(exc, (asyncio.TimeoutError, openai.APITimeoutError, ExecutorOverloaded)):
+        # A full LLM executor means calls are hanging upstream.
+        return True, True
+    if isinstance(exc, openai.APIConnectionError):
+        return True, False
+    if isinstance(exc, openai.APIStatusError):
+        status = exc.status_code
+        if status == 429 or status >= 500:
+            return True, True
+        return False, False
+    return False, False
+
+
+def _backoff(attempt: int, retry_after: Optional[float]) -> float:
+    # Full jitter keeps clients that failed together from retrying together.
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX))
+    return delay
+
+
+def llm_available() -> bool:
+    return BREAKER.available()
+
+
+async def complete(engine: str, model: str, prompt: str, temperature: float) -> str:
+    """
+    Runs one Responses API call for `engine` under the priority scheduler,
+    with jittered retries on 429/5xx/timeouts and the circuit breaker.
+    Raises CircuitOpenError immediately while the upstream is considered down.
+    Answers are served from and stored in the response cache when it is
+    enabled for the engine; in replay mode a miss raises LLMCacheMiss.
+    """
+    stats = _stats(engine)
+    cache_key = LLM_CACHE.key(engine, model, prompt, temperature) if LLM_CACHE.enabled_for(engine) else None
+    if cache_key is not None:
+        cached = await LLM_CACHE.get(engine, cache_key)
+        if cached is not None:
+            return cached
+        if LLM_CACHE.replaying:
+            raise LLMCacheMiss(engine)
+
+    extra: Dict[str, Any] = {}
+    if LLM_PROMPT_CACHE_KEY:
+        extra["prompt_cache_key"] = f"designer-grade-bot:{current_tenant().id}"
+
+    def _call_openai() -> Tuple[str, int, int]:
+        response = client.responses.create(
+            model=model,
+            input=prompt,
+            temperature=temperature,
+            **extra,
+        )
+        return (response.output_text, *_usage(response))
+
+    if not BREAKER.available():
+        # Fail fast instead of queueing for a slot that would be rejected anyway.
+        stats["rejected"] += 1
+        raise CircuitOpenError(engine)
+
+    attempt = 0
+    while True:
+        # Each attempt takes its own slot, so a backoff sleep does not hold
+        # concurrency that other callers could use meanwhile.
+        async with LLM_SCHEDULER.slot():
+            if not BREAKER.allow():
+                stats["rejected"] += 1
+                raise CircuitOpenError(engine)
+
+            probe = BREAKER.state == "half_open"
+            stats["calls"] += 1
+            count_for_tenant("llm_calls")
+            started = time.monotonic()
+            try:
+                text, input_tokens, cached_tokens = await asyncio.wait_for(
+                    LLM_EXECUTOR.run(_call_openai), LLM_CALL_TIMEOUT
+                )
+            except asyncio.CancelledError:
+                # The caller gave up (a superseded turn, a job timeout): no verdict.
+                if probe:
+                    BREAKER.release_probe()
+                raise
+            except Exception as exc:
+                stats["failures"] += 1
+                retryable, overload = _classify(exc)
+                if overload:
+                    LIMITER.on_overload()
+                if retryable:
+                    BREAKER.record_failure()
+                else:
+                    # The upstream answered; the request itself was bad.
+                    BREAKER.record_success()
+                if BREAKER.state == "open":
+                    stats["rejected"] += 1
+                    raise CircuitOpenError(engine) from exc
+                if not retryable or attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = _backoff(attempt, _retry_after(exc))
+                attempt += 1
+                stats["retries"] += 1
+                logger.warning("LLM %s call failed (%s); retry %d in %.2fs", engine, type(exc).__name__, attempt, delay)
+            else:
+                latency = time.monotonic() - started
+                stats["latency_total_ms"] += latency * 1000
+                stats["input_tokens"] += input_tokens
+                stats["cached_tokens"] += cached_tokens
+                if cached_tokens:
+                    stats["cached_calls"] += 1
+                    stats["latency_cached_total_ms"] += latency * 1000
+                logger.debug(
+                    "LLM %s call: %d input tokens, %d cached, %.0f ms",
+                    engine,
+                    input_tokens,
+                    cached_tokens,
+                    latency * 1000,
+                )
+                LIMITER.on_success(latency)
+                BREAKER.record_success()
+                if cache_key is not None:
+                    await LLM_CACHE.put(engine, cache_key, text)
+                return text
+        await asyncio.sleep(delay)
+
+
+def llm_metrics() -> Dict[str, Any]:
+    engines = {}
+    for engine, stats in _STATS.items():
+        succeeded = stats["calls"] - stats["failures"]
+        cached = stats["cached_calls"]
+        uncached = succeeded - cached
+        engines[engine] = {
+            "calls": int(stats["calls"]),
+            "failures": int(stats["failures"]),
+            "retries": int(stats["retries"]),
+            "rejected": int(stats["rejected"]),
+            "latency_avg_ms": round(stats["latency_total_ms"] / succeeded, 3) if succeeded > 0 else 0.0,
+            "input_tokens": int(stats["input_tokens"]),
+            "cached_tokens": int(stats["cached_tokens"]),
+            "cached_ratio": round(stats["cached_tokens"] / stats["input_tokens"], 4) if stats["input_tokens"] else 0.0,
+            # Calls that hit the prompt cache against those that did not.
+            "latency_avg_cached_ms": round(stats["latency_cached_total_ms"] / cached, 3) if cached else 0.0,
+            "latency_avg_uncached_ms": (
+                round((stats["latency_total_ms"] - stats["latency_cached_total_ms"]) / uncached, 3) if uncached > 0 else 0.0
+            ),
+        }
+    return {
+        "concurrency_limit": round(LIMITER.limit, 2),
+        "breaker": {"state": BREAKER.state, "failures": BREAKER.failures, "opened": BREAKER.opened_count},
+        "engines": engines,
+    }
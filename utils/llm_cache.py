@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.env import env_int
+from utils.executors import STORAGE_EXECUTOR
+from utils.paths import data_path
+
+logger = logging.getLogger("designer_grade_bot.llm_cache")
+
+
+# off: no cache; on: read and write for LLM_CACHE_ENGINES; record: call the
+# model for every engine and store all answers; replay: answer every engine
+# from the cache only and fail on a miss, for offline deterministic runs.
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "on").lower()
+if LLM_CACHE_MODE not in {"off", "on", "record", "replay"}:
+    LLM_CACHE_MODE = "off"
+# Interview questions are sampled at a higher temperature and are left out by default.
+LLM_CACHE_ENGINES = {
+    engine.strip() for engine in os.getenv("LLM_CACHE_ENGINES", "grade,feedback").split(",") if engine.strip()
+}
+# Defaults to DATA_DIR/llm_cache.sqlite3; point it at a fixture file for replay.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+LLM_CACHE_TTL = env_int("LLM_CACHE_TTL", 86400)
+LLM_CACHE_MAX_MB = env_int("LLM_CACHE_MAX_MB", 64, 1)
+LLM_CACHE_MEMORY_ITEMS = env_int("LLM_CACHE_MEMORY_ITEMS", 256)
+
+# Eviction trims the store to this share of the cap, so it does not run on every write.
+_EVICT_TO = 0.9
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay mode for a prompt that was never recorded."""
+
+
+def _temperature_bucket(temperature: float) -> str:
+    return f"{round(temperature, 1):.1f}"
+
+
+class LLMCache:
+    """
+    Content-addressed store of model answers: the key is a SHA-256 of engine,
+    model, temperature bucket and prompt. Values are zlib-compressed in a
+    SQLite file (shared by every process using DATA_DIR) behind a small
+    in-memory LRU. Least recently used rows are evicted over the size cap.
+    """
+
+    def __init__(self, mode: str, engines: set, path: str, ttl: int, max_bytes: int, memory_items: int) -> None:
+        self.mode = mode
+        self.engines = engines
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def enabled_for(self, engine: str) -> bool:
+        if self.mode in {"record", "replay"}:
+            return True
+        return self.mode == "on" and engine in self.engines
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(engine: str, model: str, prompt: str, temperature: float) -> str:
+        material = json.dumps([engine, model, _temperature_bucket(temperature), prompt], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _count(self, engine: str, name: str) -> None:
+        stats = self._stats.setdefault(engine, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0})
+        stats[name] += 1
+
+    def _fresh(self, created_at: float) -> bool:
+        # Recorded answers never expire while replaying.
+        return self.replaying or not self.ttl or time.time() - created_at < self.ttl
+
+    def _remember(self, key: str, text: str, created_at: float) -> None:
+        if not self.memory_items:
+            return
+        self._memory[key] = (text, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            path = self.path or data_path("llm_cache.sqlite3")
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    engine TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS llm_cache_accessed_idx ON llm_cache (accessed_at);
+                """
+            )
+            self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def _read(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode("utf-8"), row[1]
+
+    def _write(self, key: str, engine: str, text: str) -> None:
+        value = zlib.compress(text.encode("utf-8"), 6)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            previous = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, engine, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, engine, value, len(value), now, now),
+            )
+            self._bytes += len(value) - (previous[0] if previous else 0)
+            if self._bytes > self.max_bytes and self.mode != "record":
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        # Other processes write to the same file, so start from the real total.
+        self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        target = self.max_bytes * _EVICT_TO
+        removed = 0
+        while self._bytes > target:
+            rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at LIMIT 100").fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if self._bytes <= target:
+                    break
+                victims.append((key,))
+                self._bytes -= size
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+            removed += len(victims)
+        logger.info("LLM cache evicted %d entries, %d bytes left", removed, self._bytes)
+
+    async def get(self, engine: str, key: str) -> Optional[str]:
+        """Returns the cached answer or None; not consulted while recording."""
+        if self.mode == "record":
+            return None
+        cached = self._memory.get(key)
+        if cached is not None and self._fresh(cached[1]):
+            self._memory.move_to_end(key)
+            self._count(engine, "memory_hits")
+            return cached[0]
+        try:
+            stored = await STORAGE_EXECUTOR.run(self._read, key)
+        except Exception:
+            logger.exception("LLM cache read failed")
+            stored = None
+        if stored is not None and self._fresh(stored[1]):
+            self._remember(key, stored[0], stored[1])
+            self._count(engine, "disk_hits")
+            return stored[0]
+        self._count(engine, "misses")
+        return None
+
+    async def put(self, engine: str, key: str, text: str) -> None:
+        if self.replaying or not text:
+            return
+        self._remember(key, text, time.time())
+        try:
+            await STORAGE_EXECUTOR.run(self._write, key, engine, text)
+            self._count(engine, "stores")
+        except Exception:
+            logger.exception("LLM cache write failed")
+
+    def metrics(self) -> Dict[str, Any]:
+        engines = {}
+        for engine, stats in self._stats.items():
+            hits = stats["memory_hits"] + stats["disk_hits"]
+            lookups = hits + stats["misses"]
+            engines[engine] = dict(stats, hit_rate=round(hits / lookups, 4) if lookups else 0.0)
+        return {
+            "mode": self.mode,
+            "engines_enabled": sorted(self.engines) if self.mode == "on" else "all",
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._bytes,
+            "engines": engines,
+        }
+
+
+LLM_CACHE = LLMCache(
+    LLM_CACHE_MODE,
+    LLM_CACHE_ENGINES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_MB * 1024 * 1024,
+    LLM_CACHE_MEMORY_ITEMS,
+)
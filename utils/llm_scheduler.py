@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from utils.env import env_float, env_int
+
+logger = logging.getLogger("designer_grade_bot.llm_scheduler")
+
+# Highest priority first. Weights decide the share of free slots each class
+# gets while several classes are queued.
+PRIORITY_WEIGHTS: Dict[str, float] = {
+    "grade_paid": 8.0,
+    "interview": 4.0,
+    "new_interview": 2.0,
+    "feedback": 1.0,
+    "prefetch": 0.5,
+}
+DEFAULT_PRIORITY = "interview"
+
+LLM_MAX_CONCURRENCY = env_int("LLM_MAX_CONCURRENCY", 8, 1)
+
+# Seconds of queueing that are worth one unit of virtual time, i.e. one
+# request of the lowest-weight class. Keeps low classes from starving.
+LLM_AGING_SECONDS = env_float("LLM_AGING_SECONDS", 10.0, 0.1)
+
+_PRIORITY: ContextVar[str] = ContextVar("llm_priority", default=DEFAULT_PRIORITY)
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Marks LLM calls made inside the block with a priority class."""
+    if priority not in PRIORITY_WEIGHTS:
+        priority = DEFAULT_PRIORITY
+    token = _PRIORITY.set(priority)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("priority", "finish", "enqueued", "future")
+
+    def __init__(self, priority: str, finish: float, future: "asyncio.Future[None]") -> None:
+        self.priority = priority
+        self.finish = finish
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class LLMScheduler:
+    """
+    Weighted fair queuing over a fixed number of concurrent LLM calls. Each
+    queued request gets a virtual finish time of max(now, class tail) + 1/weight;
+    the waiter with the smallest finish time, minus an aging credit for time
+    already spent in the queue, gets the next free slot.
+    """
+
+    def __init__(self, capacity: int, weights: Dict[str, float]) -> None:
+        self._capacity = capacity
+        self._weights = weights
+        self._active = 0
+        self._waiters: List[_Waiter] = []
+        self._virtual_time = 0.0
+        self._class_tail = {priority: 0.0 for priority in weights}
+        self._stats = {
+            priority: {"started": 0, "cancelled": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0}
+            for priority in weights
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def set_capacity(self, capacity: int) -> None:
+        self._capacity = max(1, capacity)
+        self._wake()
+
+    def _record_start(self, priority: str, waited: float) -> None:
+        stats = self._stats[priority]
+        waited_ms = waited * 1000
+        stats["started"] += 1
+        stats["wait_total_ms"] += waited_ms
+        stats["wait_max_ms"] = max(stats["wait_max_ms"], waited_ms)
+
+    def _wake(self) -> None:
+        while self._active < self._capacity and self._waiters:
+            now = time.monotonic()
+            waiter = min(
+                self._waiters,
+                key=lambda item: item.finish - (now - item.enqueued) / LLM_AGING_SECONDS,
+            )
+            self._waiters.remove(waiter)
+            if waiter.future.done():
+                continue
+            self._virtual_time = max(self._virtual_time, waiter.finish)
+            self._active += 1
+            self._record_start(waiter.priority, now - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None) -> AsyncIterator[None]:
+        priority = priority or _PRIORITY.get()
+        if priority not in self._weights:
+            priority = DEFAULT_PRIORITY
+
+        if self._active < self._capacity and not self._waiters:
+            self._active += 1
+            self._record_start(priority, 0.0)
+        else:
+            finish = max(self._virtual_time, self._class_tail[priority]) + 1.0 / self._weights[priority]
+            self._class_tail[priority] = finish
+            waiter = _Waiter(priority, finish, asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.future.done() and not waiter.future.cancelled():
+                    # The slot was granted just before cancellation; hand it on.
+                    self._active -= 1
+                    self._wake()
+                self._stats[priority]["cancelled"] += 1
+                raise
+
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._wake()
+
+    def metrics(self) -> Dict[str, Any]:
+        queued = {priority: 0 for priority in self._weights}
+        for waiter in self._waiters:
+            queued[waiter.priority] += 1
+        classes = {}
+        for priority, stats in self._stats.items():
+            started = stats["started"]
+            classes[priority] = {
+                "queued": queued[priority],
+                "started": int(started),
+                "cancelled": int(stats["cancelled"]),
+                "wait_avg_ms": round(stats["wait_total_ms"] / started, 3) if started else 0.0,
+                "wait_max_ms": round(stats["wait_max_ms"], 3),
+            }
+        return {"capacity": self._capacity, "active": self._active, "classes": classes}
+
+
+LLM_SCHEDULER = LLMScheduler(LLM_MAX_CONCURRENCY, PRIORITY_WEIGHTS)
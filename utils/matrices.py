@@ -1,12 +1,17 @@
 import json
 import logging
 import os
-from typing import List
+from typing import List, Optional, Tuple
 
+from utils.env import env_int
 from utils.paths import data_path
+from utils.retrieval import MatrixIndex, build_index
 
 logger = logging.getLogger("designer_grade_bot.matrices")
 
+MATRIX_RETRIEVAL = os.getenv("MATRIX_RETRIEVAL", "true").lower() == "true"
+MATRIX_TOP_K = env_int("MATRIX_TOP_K", 6, 1)
+
 
 def _matrix_folders() -> List[str]:
     primary = data_path("matrices")
@@ -18,19 +23,17 @@ def _matrix_folders() -> List[str]:
     return [primary, bundled]
 
 
-def load_competency_context() -> str:
+def _read_matrix_files(folder: str = "") -> Tuple[str, List[Tuple[str, str]]]:
     """
-    Loads all files from data/matrices and concatenates them into a short context
-    string for the model. Supports JSON or plain text.
+    Returns the first matrix folder that has readable files, together with
+    (file name, raw text) pairs in name order. An explicit `folder` is used
+    on its own, without the default fallbacks.
     """
-    chunks: List[str] = []
-    used_folder = ""
-
-    for folder in _matrix_folders():
+    for folder in [folder] if folder else _matrix_folders():
         if not os.path.isdir(folder):
             continue
 
-        local_chunks: List[str] = []
+        files: List[Tuple[str, str]] = []
         for name in sorted(os.listdir(folder)):
             path = os.path.join(folder, name)
             if not os.path.isfile(path):
@@ -38,21 +41,31 @@ def load_competency_context() -> str:
             try:
                 with open(path, "r", encoding="utf-8") as file:
                     raw = file.read().strip()
-                if not raw:
-                    continue
-                try:
-                    data = json.loads(raw)
-                    pretty = json.dumps(data, ensure_ascii=False, indent=2)
-                    local_chunks.append(f"--- {name} ---\n{pretty}")
-                except json.JSONDecodeError:
-                    local_chunks.append(f"--- {name} ---\n{raw}")
+                if raw:
+                    files.append((name, raw))
             except Exception:
                 logger.exception("Failed to load matrix %s", name)
 
-        if local_chunks:
-            chunks = local_chunks
-            used_folder = folder
-            break
+        if files:
+            return folder, files
+
+    return "", []
+
+
+def load_competency_context(folder: str = "") -> str:
+    """
+    Loads all files from data/matrices (or `folder`) and concatenates them into
+    a short context string for the model. Supports JSON or plain text.
+    """
+    used_folder, files = _read_matrix_files(folder)
+    chunks: List[str] = []
+    for name, raw in files:
+        try:
+            data = json.loads(raw)
+            pretty = json.dumps(data, ensure_ascii=False, indent=2)
+            chunks.append(f"--- {name} ---\n{pretty}")
+        except json.JSONDecodeError:
+            chunks.append(f"--- {name} ---\n{raw}")
 
     if not chunks:
         logger.info("No matrices found; using default rubric")
@@ -65,3 +78,18 @@ def load_competency_context() -> str:
     if len(context) > 8000:
         context = context[:8000] + "\n[truncated]"
     return context
+
+
+def load_matrix_index(folder: str = "") -> Optional[MatrixIndex]:
+    """
+    Builds the BM25 index used to pick the matrix sections relevant to the
+    current answers. Returns None when retrieval is disabled or no matrices exist.
+    """
+    if not MATRIX_RETRIEVAL:
+        return None
+
+    used_folder, files = _read_matrix_files(folder)
+    index = build_index(files)
+    if index is not None:
+        logger.info("Indexed %d matrix chunk(s) from %s", len(index), used_folder)
+    return index
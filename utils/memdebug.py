@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from utils.env import env_float
+
+logger = logging.getLogger("designer_grade_bot.memory")
+
+MEMORY_SAMPLE_INTERVAL = env_float("MEMORY_SAMPLE_INTERVAL", 60.0)
+MEMORY_ALERT_MB = env_float("MEMORY_ALERT_MB", 0.0)
+
+_SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144)
+_HISTORY_BUCKETS = (0, 5, 10, 20, 50)
+_SAMPLES: Deque[Dict[str, Any]] = deque(maxlen=120)
+_previous_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak rather than current RSS, but better than nothing off Linux.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _json_bytes(value: Any) -> int:
+    if not value:
+        return 0
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except RuntimeError:
+        # Sized off the event loop while a handler was changing the session.
+        return 0
+
+
+def session_size(session: Dict[str, Any]) -> Dict[str, int]:
+    history = session.get("history") or []
+    text_bytes = sum(len(str(item.get("content", "")).encode("utf-8")) for item in history)
+    report_bytes = _json_bytes(session.get("last_report"))
+    assessment_bytes = _json_bytes(session.get("assessment"))
+    return {
+        "history_len": len(history),
+        "text_bytes": text_bytes,
+        "report_bytes": report_bytes,
+        "assessment_bytes": assessment_bytes,
+        "total_bytes": text_bytes + report_bytes + assessment_bytes,
+    }
+
+
+def _bucket_label(value: int, bounds: tuple, unit: str = "") -> str:
+    for bound in bounds:
+        if value <= bound:
+            return f"<={bound}{unit}"
+    return f">{bounds[-1]}{unit}"
+
+
+def session_report(sessions: Dict[Any, Dict[str, Any]], top: int = 10) -> Dict[str, Any]:
+    """
+    Sizes every session. Text is measured as UTF-8 bytes of history contents and
+    JSON bytes of last_report/assessment, not Python object overhead. Takes
+    time proportional to the total session size; run it in a thread.
+    """
+    size_histogram: Dict[str, int] = {}
+    history_histogram: Dict[str, int] = {}
+    totals = {"history_len": 0, "text_bytes": 0, "report_bytes": 0, "assessment_bytes": 0, "total_bytes": 0}
+    sized: List[Dict[str, Any]] = []
+
+    for key, session in list(sessions.items()):
+        size = session_size(session)
+        for field in totals:
+            totals[field] += size[field]
+        size_label = _bucket_label(size["total_bytes"], _SIZE_BUCKETS, "B")
+        size_histogram[size_label] = size_histogram.get(size_label, 0) + 1
+        history_label = _bucket_label(size["history_len"], _HISTORY_BUCKETS)
+        history_histogram[history_label] = history_histogram.get(history_label, 0) + 1
+        sized.append(dict(size, user=str(key), state=session.get("state")))
+
+    sized.sort(key=lambda item: item["total_bytes"], reverse=True)
+    return {
+        "count": len(sessions),
+        "totals": totals,
+        "size_histogram": size_histogram,
+        "history_len_histogram": history_histogram,
+        "largest": sized[:top],
+    }
+
+
+def tracemalloc_status() -> Dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    current, peak = tracemalloc.get_traced_memory()
+    return {"tracing": True, "current_bytes": current, "peak_bytes": peak, "frames": tracemalloc.get_traceback_limit()}
+
+
+def take_snapshot_diff(top: int = 20, frames: int = 1) -> Dict[str, Any]:
+    """
+    First call starts tracemalloc and stores a baseline snapshot; each later
+    call diffs against the previous snapshot, so repeated calls show growth
+    between them.
+    """
+    global _previous_snapshot
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, frames))
+        _previous_snapshot = tracemalloc.take_snapshot()
+        return {"started": True, "frames": max(1, frames), "diff": []}
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+    )
+    previous = _previous_snapshot
+    _previous_snapshot = snapshot
+    if previous is None:
+        return {"started": False, "diff": []}
+
+    key_type = "traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno"
+    diff = []
+    for stat in snapshot.compare_to(previous, key_type)[:top]:
+        diff.append(
+            {
+                "where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+        )
+    return {"started": False, "diff": diff}
+
+
+def stop_tracing() -> None:
+    global _previous_snapshot
+
+    _previous_snapshot = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def recent_samples() -> List[Dict[str, Any]]:
+    return list(_SAMPLES)
+
+
+def _sample(sessions: Dict[Any, Dict[str, Any]]) -> Dict[str, Any]:
+    sample: Dict[str, Any] = {"at": int(time.time()), "rss_bytes": rss_bytes(), "sessions": len(sessions)}
+    if tracemalloc.is_tracing():
+        sample["traced_bytes"] = tracemalloc.get_traced_memory()[0]
+    return sample
+
+
+async def run_memory_sampler(get_sessions: Callable[[], Dict[Any, Dict[str, Any]]]) -> None:
+    """
+    Records RSS and session count every MEMORY_SAMPLE_INTERVAL seconds. Each
+    sample is logged on the designer_grade_bot.memory logger; crossing
+    MEMORY_ALERT_MB logs a WARNING for log-based alerting.
+    """
+    while True:
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+        try:
+            sample = _sample(get_sessions())
+            _SAMPLES.append(sample)
+            rss_mb = sample["rss_bytes"] / (1024 * 1024)
+            if MEMORY_ALERT_MB and rss_mb > MEMORY_ALERT_MB:
+                logger.warning(
+                    "Memory alert rss_mb=%.1f limit_mb=%.1f sessions=%d", rss_mb, MEMORY_ALERT_MB, sample["sessions"]
+                )
+            else:
+                logger.info("Memory sample rss_mb=%.1f sessions=%d", rss_mb, sample["sessions"])
+        except Exception:
+            logger.exception("Memory sampling failed")
+
+
+def start_memory_sampler(get_sessions: Callable[[], Dict[Any, Dict[str, Any]]]) -> Optional[asyncio.Task]:
+    if MEMORY_SAMPLE_INTERVAL <= 0:
+        return None
+    return asyncio.create_task(run_memory_sampler(get_sessions))
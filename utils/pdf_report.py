@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import os
 from typing import Any, Dict, List
@@ -7,6 +6,9 @@ from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 
+from utils.executors import RENDER_EXECUTOR
+from utils.tracing import traced
+
 logger = logging.getLogger("designer_grade_bot.pdf")
 
 
@@ -130,9 +132,10 @@ def _build_pdf(report: Dict[str, Any], user_name: str, file_path: str) -> str:
     return file_path
 
 
+@traced("pdf.generate_report")
 async def generate_pdf_report(report: Dict[str, Any], user_name: str, file_path: str) -> str:
     try:
-        return await asyncio.to_thread(_build_pdf, report, user_name, file_path)
+        return await RENDER_EXECUTOR.run(_build_pdf, report, user_name, file_path)
     except Exception:
         logger.exception("Failed to generate PDF report")
         return ""
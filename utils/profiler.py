@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import FrameType
+from typing import Any, Deque, Dict, List, Optional
+
+from utils.env import env_float
+
+logger = logging.getLogger("designer_grade_bot.profiler")
+
+PROFILE_MAX_SECONDS = env_float("PROFILE_MAX_SECONDS", 60.0, 1.0)
+
+# A stall of the event loop longer than this is logged with its stack; 0 disables.
+LOOP_LAG_THRESHOLD_MS = env_float("LOOP_LAG_THRESHOLD_MS", 250.0)
+
+_MAX_DEPTH = 64
+_STALLS: Deque[Dict[str, Any]] = deque(maxlen=50)
+_PROFILE_LOCK = threading.Lock()
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # Shorten to the package-relative path for readable flamegraphs.
+    for marker in ("/site-packages/", "/lib/python"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = os.path.relpath(filename) if os.path.isabs(filename) else filename
+    return f"{code.co_name} ({filename}:{frame.f_lineno})".replace(";", ":")
+
+
+def _stack(frame: Optional[FrameType]) -> List[str]:
+    labels: List[str] = []
+    while frame is not None and len(labels) < _MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _task_label(loop: Optional[asyncio.AbstractEventLoop]) -> Optional[str]:
+    if loop is None:
+        return None
+    try:
+        task = asyncio.current_task(loop)
+    except RuntimeError:
+        return None
+    if task is None:
+        return None
+    coro = task.get_coro()
+    name = getattr(coro, "__qualname__", None) or task.get_name()
+    return f"task:{name}"
+
+
+def profile(
+    seconds: float,
+    interval: float,
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+    loop_thread: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Samples the stacks of all threads every `interval` seconds for `seconds`
+    and returns collapsed stacks ("thread;frame;frame count" per line), the
+    input format of flamegraph.pl and speedscope. Samples of the event loop
+    thread are prefixed with the running task, if any. Blocking: run it in a
+    thread. Returns None when another profile is already running.
+    """
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        return None
+
+    own = threading.get_ident()
+    counts: Counter = Counter()
+    samples = 0
+    started = time.perf_counter()
+    deadline = started + min(seconds, PROFILE_MAX_SECONDS)
+    try:
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                root = [names.get(ident, f"thread-{ident}")]
+                if ident == loop_thread:
+                    task = _task_label(loop)
+                    if task:
+                        root.append(task)
+                counts[";".join(root + _stack(frame))] += 1
+            samples += 1
+            time.sleep(interval)
+    finally:
+        _PROFILE_LOCK.release()
+
+    lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+    return {
+        "collapsed": "\n".join(lines) + "\n",
+        "samples": samples,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+class LoopLagMonitor:
+    """
+    A coroutine ticks every interval; a watchdog thread that sees no tick for
+    longer than the threshold grabs the loop thread's stack while it is still
+    blocked and logs it once per stall.
+    """
+
+    def __init__(self, threshold: float) -> None:
+        self._threshold = threshold
+        self._interval = max(0.01, threshold / 4)
+        self._last_tick = time.monotonic()
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self._interval
+            await asyncio.sleep(self._interval)
+            now = time.monotonic()
+            self.max_lag = max(self.max_lag, now - expected)
+            self._last_tick = now
+
+    def _watch(self) -> None:
+        captured_for = 0.0
+        stall: Optional[Dict[str, Any]] = None
+        while not self._stop.wait(self._interval):
+            last_tick = self._last_tick
+            if stall is not None and last_tick != captured_for:
+                # The loop is back: record how long the stall really lasted.
+                stall["blocked_ms"] = round((last_tick - captured_for - self._interval) * 1000, 1)
+                stall = None
+            blocked = time.monotonic() - last_tick - self._interval
+            if blocked < self._threshold or captured_for == last_tick:
+                continue
+            captured_for = last_tick
+            stack = _stack(sys._current_frames().get(self._loop_thread))
+            self.stalls += 1
+            stall = {"at": int(time.time()), "blocked_ms": round(blocked * 1000, 1), "stack": ";".join(stack)}
+            _STALLS.append(stall)
+            logger.warning(
+                "Event loop blocked for %.0f ms so far at:\n  %s", blocked * 1000, "\n  ".join(reversed(stack[-15:]))
+            )
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self._threshold * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+        }
+
+
+_MONITOR: Optional[LoopLagMonitor] = None
+
+
+def start_loop_lag_monitor() -> Optional[LoopLagMonitor]:
+    global _MONITOR
+
+    if LOOP_LAG_THRESHOLD_MS <= 0 or _MONITOR is not None:
+        return _MONITOR
+    _MONITOR = LoopLagMonitor(LOOP_LAG_THRESHOLD_MS / 1000)
+    _MONITOR.start()
+    return _MONITOR
+
+
+def stop_loop_lag_monitor() -> None:
+    global _MONITOR
+
+    if _MONITOR is not None:
+        _MONITOR.stop()
+        _MONITOR = None
+
+
+def loop_lag_report() -> Dict[str, Any]:
+    return {
+        "monitor": _MONITOR.metrics() if _MONITOR is not None else None,
+        "stalls": list(_STALLS),
+    }
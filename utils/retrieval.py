@@ -0,0 +1,200 @@
+import json
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Crude prefix stemming: good enough to match "metrics"/"metric" and Russian
+# case endings without a morphology dependency.
+_STEM_LENGTH = 6
+_MAX_SECTION_CHARS = 1200
+
+Chunk = Dict[str, Any]
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if len(token) < 2 or token.isdigit():
+            continue
+        tokens.append(token[:_STEM_LENGTH])
+    return tokens
+
+
+def _bullets(items: Iterable[Any]) -> str:
+    return "\n".join(f"- {item}" for item in items)
+
+
+def _chunk(chunk_id: str, text: str, pinned: bool = False) -> Chunk:
+    return {"id": chunk_id, "text": text.strip(), "pinned": pinned}
+
+
+def _chunks_from_matrix(name: str, data: Dict[str, Any]) -> List[Chunk]:
+    """
+    Splits a structured matrix (levels + competencies) into two pinned chunks:
+    the overview and a compact competency x level summary. The summary already
+    lists every expectation, so the matrix adds nothing to retrieve per query.
+    """
+    chunks: List[Chunk] = []
+    levels = data.get("levels") or []
+    competencies = data.get("competencies") or []
+
+    overview: List[str] = [f"--- {name} ---"]
+    meta = data.get("meta") or {}
+    if meta.get("grade_scale"):
+        overview.append("Grade scale: " + ", ".join(meta["grade_scale"]))
+    for level in levels:
+        overview.append(
+            f"{level.get('title_en', level.get('id'))} / {level.get('title_ru', '')}: "
+            f"{level.get('scope_en', '')} / {level.get('scope_ru', '')}"
+        )
+    if competencies:
+        overview.append(
+            "Competencies: "
+            + "; ".join(f"{item.get('title_en', item.get('id'))} / {item.get('title_ru', '')}" for item in competencies)
+        )
+    rules = data.get("grading_rules") or {}
+    for language in sorted(rules):
+        overview.append(f"Grading rules ({language}):\n{_bullets(rules[language])}")
+    specializations = data.get("specializations") or {}
+    for language in sorted(specializations):
+        overview.append(f"Specializations ({language}): " + ", ".join(specializations[language]))
+    chunks.append(_chunk(f"{name}#overview", "\n".join(overview), pinned=True))
+
+    level_titles = {level.get("id"): level.get("title_en", level.get("id")) for level in levels}
+    # One line per competency with its ids, English expectations only.
+    summary: List[str] = ["Expectations by competency and level [ids]:"]
+    for competency in competencies:
+        expectations = competency.get("expectations") or {}
+        levels_text = []
+        for level_id, by_language in expectations.items():
+            items = by_language.get("en") or next(iter(by_language.values()), [])
+            levels_text.append(f"{level_titles.get(level_id, level_id)} [{level_id}]: " + "; ".join(items))
+        summary.append(
+            f"{competency.get('title_en', competency.get('id'))} [{competency.get('id')}] — " + " | ".join(levels_text)
+        )
+    if competencies:
+        chunks.append(_chunk(f"{name}#summary", "\n".join(summary), pinned=True))
+    return chunks
+
+
+def _chunks_from_text(name: str, raw: str) -> List[Chunk]:
+    chunks: List[Chunk] = []
+    sections: List[Tuple[str, List[str]]] = []
+    heading = name
+    body: List[str] = []
+    for line in raw.splitlines():
+        if line.startswith("#"):
+            if body:
+                sections.append((heading, body))
+            heading = line.lstrip("#").strip()
+            body = []
+            continue
+        if line.strip():
+            body.append(line)
+    if body:
+        sections.append((heading, body))
+
+    for index, (title, lines) in enumerate(sections):
+        text = f"{title}\n" + "\n".join(lines)
+        for part, start in enumerate(range(0, len(text), _MAX_SECTION_CHARS)):
+            chunks.append(_chunk(f"{name}#{index}.{part}", text[start : start + _MAX_SECTION_CHARS]))
+    return chunks
+
+
+def build_chunks(files: List[Tuple[str, str]]) -> List[Chunk]:
+    chunks: List[Chunk] = []
+    for name, raw in files:
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            chunks.extend(_chunks_from_text(name, raw))
+            continue
+        if isinstance(data, dict) and (data.get("competencies") or data.get("levels")):
+            chunks.extend(_chunks_from_matrix(name, data))
+        else:
+            pretty = json.dumps(data, ensure_ascii=False, indent=2)
+            chunks.extend(_chunks_from_text(name, pretty))
+    return chunks
+
+
+class MatrixIndex:
+    """
+    Okapi BM25 over matrix chunks. Built once at startup; queries only touch
+    the postings of the query terms.
+    """
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, chunks: List[Chunk]) -> None:
+        self.chunks = chunks
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        for index, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            self._lengths.append(sum(counts.values()))
+            for token, frequency in counts.items():
+                self._postings.setdefault(token, []).append((index, frequency))
+
+        total = len(chunks)
+        self._avg_length = (sum(self._lengths) / total) if total else 0.0
+        self._idf = {
+            token: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, top_k: int) -> List[Chunk]:
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for index, frequency in self._postings[token]:
+                norm = 1 - self.b + self.b * self._lengths[index] / (self._avg_length or 1.0)
+                scores[index] = scores.get(index, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        ranked = sorted(
+            (index for index in scores if not self.chunks[index]["pinned"]),
+            key=lambda index: (-scores[index], index),
+        )
+        return [self.chunks[index] for index in ranked[:top_k]]
+
+    def static_context(self, max_chars: int = 12000) -> str:
+        """
+        The pinned chunks in file order. They do not depend on the query, so
+        they render to the same bytes on every call and can sit in the
+        provider's cached prompt prefix.
+        """
+        return self._join((chunk for chunk in self.chunks if chunk["pinned"]), max_chars)
+
+    def context_for(self, query: str, top_k: int, max_chars: int = 8000) -> str:
+        """
+        The top_k matches for the query in original file order, so equal
+        selections always render to the same text. Pinned chunks are left to
+        static_context().
+        """
+        if not query.strip():
+            return ""
+        selected = {id(chunk) for chunk in self.search(query, top_k)}
+        return self._join((chunk for chunk in self.chunks if id(chunk) in selected), max_chars)
+
+    @staticmethod
+    def _join(chunks: Iterable[Chunk], max_chars: int) -> str:
+        parts: List[str] = []
+        size = 0
+        for chunk in chunks:
+            if size + len(chunk["text"]) > max_chars:
+                continue
+            parts.append(chunk["text"])
+            size += len(chunk["text"]) + 2
+        return "\n\n".join(parts)
+
+
+def build_index(files: List[Tuple[str, str]]) -> Optional[MatrixIndex]:
+    chunks = build_chunks(files)
+    return MatrixIndex(chunks) if chunks else None
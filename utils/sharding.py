@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from utils.env import env_float, env_int
+
+logger = logging.getLogger("designer_grade_bot.sharding")
+
+SHARD_WORKERS = env_int("SHARD_WORKERS", 0)
+SHARD_QUEUE_SIZE = env_int("SHARD_QUEUE_SIZE", 10000, 1)
+SHARD_HEALTH_INTERVAL = env_float("SHARD_HEALTH_INTERVAL", 5.0, 0.5)
+SHARD_HEARTBEAT_TIMEOUT = env_float("SHARD_HEARTBEAT_TIMEOUT", 30.0, 2.0)
+
+# Workers block on the queue for at most this long, so heartbeats stay fresh
+# even when there is no traffic.
+_QUEUE_POLL_SECONDS = 1.0
+
+InitFn = Callable[[], Awaitable[None]]
+HandlerFn = Callable[[Any], Awaitable[None]]
+
+
+def shard_for(user_id: Optional[int], shards: int) -> int:
+    """
+    Maps a Telegram user id to a worker index. Telegram ids are integers, so a
+    plain modulo is stable across processes and restarts.
+    """
+    if shards <= 1 or user_id is None:
+        return 0
+    try:
+        return int(user_id) % shards
+    except (TypeError, ValueError):
+        return 0
+
+
+def _worker_main(index: int, updates: Any, heartbeats: Any, progress: Any, init: InitFn, handler: HandlerFn) -> None:
+    try:
+        asyncio.run(_worker_loop(index, updates, heartbeats, progress, init, handler))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(
+    index: int, updates: Any, heartbeats: Any, progress: Any, init: InitFn, handler: HandlerFn
+) -> None:
+    await init()
+    logger.info("Shard worker %d started pid=%s", index, os.getpid())
+
+    tasks: Set[asyncio.Task] = set()
+    while True:
+        heartbeats[index] = time.time()
+        try:
+            item = await asyncio.to_thread(updates.get, True, _QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        progress[index] = time.time()
+        if item is None:
+            break
+        task = asyncio.create_task(handler(item))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    logger.info("Shard worker %d stopped", index)
+
+
+class ShardPool:
+    """
+    Owns N worker processes, each with its own event loop and in-memory session
+    store. Updates are routed by user id, so every user is always served by the
+    same process while that process is alive.
+    """
+
+    def __init__(self, workers: int, init: InitFn, handler: HandlerFn) -> None:
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = workers
+        self._init = init
+        self._handler = handler
+        self._queues = [self._ctx.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(workers)]
+        self._heartbeats = self._ctx.Array("d", workers, lock=False)
+        # When each worker last took an update off its queue.
+        self._progress = self._ctx.Array("d", workers, lock=False)
+        self._processes: List[Optional[multiprocessing.process.BaseProcess]] = [None] * workers
+        self._restarts = [0] * workers
+        self._dropped = [0] * workers
+        self._supervisor: Optional[asyncio.Task] = None
+
+    def _spawn(self, index: int) -> None:
+        self._heartbeats[index] = time.time()
+        self._progress[index] = time.time()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self._queues[index], self._heartbeats, self._progress, self._init, self._handler),
+            name=f"shard-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self) -> None:
+        for index in range(self._workers):
+            self._spawn(index)
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info("Started %d shard worker(s)", self._workers)
+
+    def dispatch(self, user_id: Optional[int], item: Any) -> bool:
+        """Queues a picklable `item` for the handler of the user's worker."""
+        index = shard_for(user_id, self._workers)
+        try:
+            self._queues[index].put_nowait(item)
+            return True
+        except queue.Full:
+            self._dropped[index] += 1
+            logger.warning("Shard %d queue is full; update for user_id=%s rejected", index, user_id)
+            return False
+
+    def _queued(self, index: int) -> Optional[int]:
+        try:
+            return self._queues[index].qsize()
+        except NotImplementedError:
+            return None
+
+    def _stalled(self, index: int, now: float) -> bool:
+        """Updates are waiting but the worker has taken none for the heartbeat timeout."""
+        return bool(self._queued(index)) and now - self._progress[index] > SHARD_HEARTBEAT_TIMEOUT
+
+    def _replace_queue(self, index: int) -> None:
+        # A worker killed inside get() never releases the queue's read lock, so
+        # its successor could not read from it; move what is readable over.
+        old = self._queues[index]
+        fresh = self._ctx.Queue(maxsize=SHARD_QUEUE_SIZE)
+        moved = 0
+        while True:
+            try:
+                item = old.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            try:
+                fresh.put_nowait(item)
+                moved += 1
+            except queue.Full:
+                break
+        self._queues[index] = fresh
+        old.close()
+        old.cancel_join_thread()
+        if moved:
+            logger.info("Moved %d queued update(s) to the new queue of shard %d", moved, index)
+
+    def _check(self) -> None:
+        now = time.time()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            stale = now - self._heartbeats[index] > SHARD_HEARTBEAT_TIMEOUT
+            stalled = self._stalled(index, now)
+            if process.is_alive() and not stale and not stalled:
+                continue
+            if process.is_alive():
+                logger.error(
+                    "Shard worker %d pid=%s is %s; terminating",
+                    index,
+                    process.pid,
+                    "not consuming its queue" if stalled else "unresponsive",
+                )
+                process.terminate()
+                process.join(timeout=5)
+            else:
+                logger.error("Shard worker %d pid=%s exited with code=%s", index, process.pid, process.exitcode)
+            self._restarts[index] += 1
+            self._replace_queue(index)
+            self._spawn(index)
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(SHARD_HEALTH_INTERVAL)
+            try:
+                self._check()
+            except Exception:
+                logger.exception("Shard health check failed")
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        result = []
+        for index, process in enumerate(self._processes):
+            result.append(
+                {
+                    "index": index,
+                    "pid": process.pid if process else None,
+                    "alive": bool(process and process.is_alive()),
+                    "heartbeat_age": round(now - self._heartbeats[index], 2),
+                    "queued": self._queued(index),
+                    "stalled": self._stalled(index, now),
+                    "restarts": self._restarts[index],
+                    "dropped": self._dropped[index],
+                }
+            )
+        return result
+
+    def healthy(self) -> bool:
+        return all(
+            item["alive"] and item["heartbeat_age"] <= SHARD_HEARTBEAT_TIMEOUT and not item["stalled"]
+            for item in self.status()
+        )
+
+    async def stop(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        for updates in self._queues:
+            try:
+                updates.put_nowait(None)
+            except queue.Full:
+                pass
+        for process in self._processes:
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, 10)
+            if process.is_alive():
+                process.terminate()
@@ -1,31 +1,155 @@
+import asyncio
 import logging
-from typing import Any, Dict, Optional
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
 
 import httpx
 
+from utils.env import env_int
+from utils.tracing import traced
+
 logger = logging.getLogger("designer_grade_bot.telegram")
 
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+# How long a webhook response waits for a handler's inline reply; 0 disables.
+INLINE_REPLY_BUDGET_MS = env_int("INLINE_REPLY_BUDGET_MS", 250)
+
+# One connection pool for every bot token served by the process.
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _client() -> httpx.AsyncClient:
+    global _CLIENT
+
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(
+            timeout=15.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _CLIENT
+
+
+async def close_client() -> None:
+    global _CLIENT
+
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
+class _ReplySlot:
+    __slots__ = ("future", "accepted")
+
+    def __init__(self) -> None:
+        self.future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        self.accepted = False
+
+
+_REPLY_SLOT: ContextVar[Optional[_ReplySlot]] = ContextVar("inline_reply_slot", default=None)
+_STATS = {"inline_replies": 0, "inline_timeouts": 0, "inline_released": 0}
+
+
+@contextmanager
+def inline_reply_slot() -> Iterator[Optional[_ReplySlot]]:
+    """
+    Opens a slot for one Bot API call to be returned in the webhook response.
+    Tasks created inside the block inherit it; see accept_inline_reply().
+    """
+    if not INLINE_REPLY_BUDGET_MS:
+        yield None
+        return
+    slot = _ReplySlot()
+    token = _REPLY_SLOT.set(slot)
+    try:
+        yield slot
+    finally:
+        _REPLY_SLOT.reset(token)
+
+
+def accept_inline_reply() -> None:
+    """Marks the open slot as handed to an in-process handler worth waiting for."""
+    slot = _REPLY_SLOT.get()
+    if slot is not None:
+        slot.accepted = True
 
-async def send_message(token: str, chat_id: int, text: str, reply_markup: Optional[Dict[str, Any]] = None) -> bool:
+
+def release_inline_reply() -> None:
+    """
+    Gives up the inline reply, so the webhook is answered right away. Called
+    on slow paths and when the handler finishes without claiming the slot.
+    """
+    slot = _REPLY_SLOT.get()
+    if slot is not None and not slot.future.done():
+        slot.future.cancel()
+        _STATS["inline_released"] += 1
+
+
+async def wait_inline_reply(slot: Optional[_ReplySlot]) -> Optional[Dict[str, Any]]:
+    """Returns the Bot API method for the webhook response, or None to answer plainly."""
+    if slot is None or not slot.accepted:
+        return None
+    done, _ = await asyncio.wait({slot.future}, timeout=INLINE_REPLY_BUDGET_MS / 1000)
+    if not done:
+        # Too slow: the handler's message goes out as a regular request.
+        slot.future.cancel()
+        _STATS["inline_timeouts"] += 1
+        return None
+    if slot.future.cancelled():
+        return None
+    return slot.future.result()
+
+
+def _claim_inline_reply(payload: Dict[str, Any]) -> bool:
+    slot = _REPLY_SLOT.get()
+    if slot is None or slot.future.done():
+        return False
+    slot.future.set_result(payload)
+    _STATS["inline_replies"] += 1
+    return True
+
+
+def telegram_metrics() -> Dict[str, Any]:
+    return dict(_STATS, inline_budget_ms=INLINE_REPLY_BUDGET_MS)
+
+
+@traced("telegram.send_message")
+async def send_message(
+    token: str,
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[Dict[str, Any]] = None,
+    inline: bool = False,
+) -> bool:
+    """
+    Sends a message. With `inline=True` the message is returned in the webhook
+    response instead when the update's reply slot is still open; use it only
+    for a handler's single, final message, since Telegram gives no delivery
+    result for inline replies.
+    """
     if not token or chat_id is None:
         logger.error("Missing Telegram token or chat_id")
         return False
 
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload: Dict[str, Any] = {"chat_id": chat_id, "text": text}
     if reply_markup:
         payload["reply_markup"] = reply_markup
+    if inline and _claim_inline_reply(dict(payload, method="sendMessage")):
+        return True
+    release_inline_reply()
 
+    url = f"{TELEGRAM_API_BASE}/bot{token}/sendMessage"
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
+        response = await _client().post(url, json=payload)
+        response.raise_for_status()
         return True
     except Exception:
         logger.exception("Failed to send message")
         return False
 
 
+@traced("telegram.send_document")
 async def send_document(
     token: str,
     chat_id: int,
@@ -36,7 +160,8 @@ async def send_document(
         logger.error("Missing Telegram token or chat_id")
         return False
 
-    url = f"https://api.telegram.org/bot{token}/sendDocument"
+    release_inline_reply()
+    url = f"{TELEGRAM_API_BASE}/bot{token}/sendDocument"
 
     try:
         with open(file_path, "rb") as file_handle:
@@ -45,29 +170,28 @@ async def send_document(
             if caption:
                 data["caption"] = caption
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, data=data, files=files)
-                response.raise_for_status()
+            response = await _client().post(url, data=data, files=files, timeout=30.0)
+            response.raise_for_status()
         return True
     except Exception:
         logger.exception("Failed to send document")
         return False
 
 
+@traced("telegram.set_webhook")
 async def set_webhook(token: str, url: str, secret_token: str = "") -> bool:
     if not token or not url:
         logger.error("Missing Telegram token or webhook url")
         return False
 
-    endpoint = f"https://api.telegram.org/bot{token}/setWebhook"
+    endpoint = f"{TELEGRAM_API_BASE}/bot{token}/setWebhook"
     payload: Dict[str, Any] = {"url": url}
     if secret_token:
         payload["secret_token"] = secret_token
 
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(endpoint, json=payload)
-            response.raise_for_status()
+        response = await _client().post(endpoint, json=payload)
+        response.raise_for_status()
         return True
     except Exception:
         logger.exception("Failed to set webhook")
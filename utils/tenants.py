@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("designer_grade_bot.tenants")
+
+DEFAULT_TENANT = "default"
+TENANTS_FILE = os.getenv("TENANTS_FILE", "")
+
+
+class Tenant:
+    """
+    One bot served by this process: its Telegram credentials, default
+    language, matrix folder and update quota. `context` and `index` are filled
+    in by the runtime once the tenant's matrices are loaded.
+    """
+
+    __slots__ = (
+        "id",
+        "token",
+        "webhook_secret",
+        "language",
+        "matrices_dir",
+        "updates_per_minute",
+        "context",
+        "index",
+        "stats",
+        "_tokens",
+        "_refilled_at",
+    )
+
+    def __init__(
+        self,
+        tenant_id: str,
+        token: str,
+        webhook_secret: str = "",
+        language: str = "ru",
+        matrices_dir: str = "",
+        updates_per_minute: int = 0,
+    ) -> None:
+        self.id = tenant_id
+        self.token = token
+        self.webhook_secret = webhook_secret
+        self.language = language if language in {"ru", "en"} else "ru"
+        self.matrices_dir = matrices_dir
+        self.updates_per_minute = max(0, updates_per_minute)
+        self.context = ""
+        self.index: Any = None
+        self.stats: Dict[str, int] = {"updates": 0, "throttled": 0, "rejected": 0, "sessions": 0, "llm_calls": 0}
+        self._tokens = float(self.updates_per_minute)
+        self._refilled_at = time.monotonic()
+
+    def admit(self) -> bool:
+        """Token bucket over updates_per_minute; 0 means unlimited."""
+        if not self.updates_per_minute:
+            return True
+        now = time.monotonic()
+        capacity = float(self.updates_per_minute)
+        self._tokens = min(capacity, self._tokens + (now - self._refilled_at) * capacity / 60.0)
+        self._refilled_at = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def webhook_path(self) -> str:
+        return "/webhook" if self.id == DEFAULT_TENANT else f"/webhook/{self.id}"
+
+
+def _secret(config: Dict[str, Any], key: str) -> str:
+    # Secrets may be inline or, preferably, read from the named env variable.
+    env_name = config.get(f"{key}_env")
+    if env_name:
+        return os.getenv(str(env_name), "")
+    return str(config.get(key) or "")
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _tenant_from_config(tenant_id: str, config: Dict[str, Any]) -> Tenant:
+    return Tenant(
+        tenant_id,
+        token=_secret(config, "token"),
+        webhook_secret=_secret(config, "webhook_secret"),
+        language=str(config.get("language") or "ru"),
+        matrices_dir=str(config.get("matrices_dir") or ""),
+        updates_per_minute=_int(config.get("updates_per_minute")),
+    )
+
+
+def _load_registry() -> Dict[str, Tenant]:
+    registry = {
+        DEFAULT_TENANT: Tenant(
+            DEFAULT_TENANT,
+            token=os.getenv("TELEGRAM_BOT_TOKEN", ""),
+            webhook_secret=os.getenv("TELEGRAM_WEBHOOK_SECRET", ""),
+            updates_per_minute=_int(os.getenv("TENANT_UPDATES_PER_MINUTE", "0")),
+        )
+    }
+    if not TENANTS_FILE:
+        return registry
+
+    try:
+        with open(TENANTS_FILE, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except Exception:
+        logger.exception("Failed to load tenants from %s", TENANTS_FILE)
+        return registry
+    if not isinstance(data, dict):
+        logger.error("Tenants file %s must contain a JSON object", TENANTS_FILE)
+        return registry
+
+    for tenant_id, config in data.items():
+        if not isinstance(config, dict) or not tenant_id.replace("-", "").replace("_", "").isalnum():
+            logger.error("Skipping invalid tenant entry %r", tenant_id)
+            continue
+        registry[tenant_id] = _tenant_from_config(tenant_id, config)
+    logger.info("Loaded %d tenant(s) from %s", len(registry), TENANTS_FILE)
+    return registry
+
+
+TENANTS: Dict[str, Tenant] = _load_registry()
+_CURRENT_TENANT: ContextVar[Tenant] = ContextVar("current_tenant", default=TENANTS[DEFAULT_TENANT])
+
+
+def get_tenant(tenant_id: str) -> Optional[Tenant]:
+    return TENANTS.get(tenant_id or DEFAULT_TENANT)
+
+
+def all_tenants() -> List[Tenant]:
+    return list(TENANTS.values())
+
+
+def current_tenant() -> Tenant:
+    return _CURRENT_TENANT.get()
+
+
+@contextmanager
+def use_tenant(tenant: Tenant) -> Iterator[Tenant]:
+    """Makes `tenant` current for the code inside the block, including tasks it creates."""
+    token = _CURRENT_TENANT.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _CURRENT_TENANT.reset(token)
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Adds to a counter of the current tenant."""
+    stats = _CURRENT_TENANT.get().stats
+    stats[name] = stats.get(name, 0) + amount
+
+
+def tenant_metrics() -> Dict[str, Any]:
+    return {
+        tenant.id: dict(tenant.stats, updates_per_minute=tenant.updates_per_minute)
+        for tenant in TENANTS.values()
+    }
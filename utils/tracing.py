@@ -0,0 +1,217 @@
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import httpx
+
+from utils.env import env_float
+
+logger = logging.getLogger("designer_grade_bot.tracing")
+
+# none | file | otlp
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(os.getenv("DATA_DIR", "data"), "traces.jsonl"))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SAMPLE_RATE = min(1.0, env_float("TRACE_SAMPLE_RATE", 0.1))
+
+SERVICE_NAME = "designer-grade-bot"
+_MAX_QUEUED_SPANS = 10000
+_FLUSH_INTERVAL = 1.0
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+_CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(spans: List[Span]) -> Dict[str, Any]:
+    otlp_spans = []
+    for span in spans:
+        item: Dict[str, Any] = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            item["parentSpanId"] = span.parent_id
+        otlp_spans.append(item)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "designer_grade_bot"}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+class _Exporter:
+    """
+    Finished spans go through a bounded queue to one daemon thread, so the
+    request path never does I/O for tracing.
+    """
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=_MAX_QUEUED_SPANS)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _drain(self) -> List[Span]:
+        spans: List[Span] = []
+        try:
+            spans.append(self._queue.get(timeout=_FLUSH_INTERVAL))
+            while len(spans) < 512:
+                spans.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return spans
+
+    def _run(self) -> None:
+        client = httpx.Client(timeout=5.0) if TRACE_EXPORTER == "otlp" else None
+        while True:
+            spans = self._drain()
+            if not spans:
+                continue
+            try:
+                if client is not None:
+                    client.post(TRACE_OTLP_ENDPOINT, json=_otlp_payload(spans)).raise_for_status()
+                else:
+                    os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+                    with open(TRACE_FILE, "a", encoding="utf-8") as file:
+                        for span in spans:
+                            file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+            except Exception:
+                logger.exception("Failed to export %d span(s)", len(spans))
+
+
+_EXPORTER = _Exporter()
+
+
+def tracing_enabled() -> bool:
+    return TRACE_EXPORTER in {"file", "otlp"} and TRACE_SAMPLE_RATE > 0
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT_SPAN.get()
+
+
+@contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _CURRENT_SPAN.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = type(exc).__name__
+        raise
+    finally:
+        _CURRENT_SPAN.reset(token)
+        span.end_ns = time.time_ns()
+        _EXPORTER.submit(span)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Opens a root span, subject to sampling. Unsampled traces cost one random()
+    call; every nested span() inside them is a no-op.
+    """
+    if not tracing_enabled() or random.random() >= TRACE_SAMPLE_RATE:
+        yield None
+        return
+    with _activate(Span(f"{random.getrandbits(128):032x}", None, name, attributes)) as span:
+        yield span
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    parent = _CURRENT_SPAN.get()
+    if parent is None:
+        yield None
+        return
+    with _activate(Span(parent.trace_id, parent.span_id, name, attributes)) as child:
+        yield child
+
+
+T = TypeVar("T")
+
+
+def traced(name: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Wraps a coroutine function in a child span of the current trace."""
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            if _CURRENT_SPAN.get() is None:
+                return await func(*args, **kwargs)
+            with span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
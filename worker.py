@@ -0,0 +1,40 @@
+"""
+Runs the durable job queue (grading, PDF rendering and delivery) outside the
+web process:
+
+    JOB_QUEUE=true JOB_WORKERS=4 python worker.py
+
+Run the web process with JOB_WORKERS=0 to leave all jobs to these workers.
+"""
+
+import asyncio
+import logging
+import signal
+
+import main
+from utils.jobs import JOB_WORKERS, JobWorkers, jobs_enabled
+
+logger = logging.getLogger("designer_grade_bot.worker")
+
+
+async def run() -> None:
+    await main.init_runtime(warm=False)
+    if not jobs_enabled():
+        logger.error("JOB_QUEUE is not enabled; nothing to run")
+        await main.on_shutdown()
+        return
+
+    workers = JobWorkers(max(1, JOB_WORKERS))
+    workers.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+    await workers.stop()
+    await main.on_shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())